@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ajuste de curvas de crecimiento (logística y Gompertz) a los acumulados de confirmados y
+fallecidos de todas las filas del cubo a la vez.
+
+Se ajusta la última ola: el crecimiento de los acumulados en los últimos días, normalizado
+a [0, 1] en cada fila. Todas las filas y métricas se resuelven juntas con un
+Levenberg-Marquardt vectorizado con NumPy: en cada iteración un único sistema 3x3 por
+fila (np.linalg.solve sobre la pila de sistemas) y cada fila acepta o rechaza su paso y
+ajusta su amortiguación por separado. Sin bucles en Python por fila.
+
+Parámetros de cada fila (en unidades normalizadas, con el tiempo en ventanas y el 0 en
+el último día): log K (asíntota), log r (velocidad) y t0 (punto de inflexión):
+  - logística: K / (1 + exp(-r (t - t0)))
+  - Gompertz: K exp(-exp(-r (t - t0)))
+"""
+import time
+
+import numpy as np
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+MODELOS = ('logistico', 'gompertz')
+METRICAS_AJUSTE = (0, 1) # Confirmados y fallecidos
+DIAS_AJUSTE = 90 # Días de la ventana ajustada
+DIAS_PROYECCION = 30 # Días proyectados después del último dato
+MINIMO_CASOS = 50 # Crecimiento mínimo en la ventana para ajustar una fila
+ITERACIONES = 50
+TOLERANCIA = 1e-8 # Mejora relativa del error por debajo de la cual una fila ha convergido
+AMORTIGUACION_MAXIMA = 1e8
+LIMITE_EXPONENTE = 50.0
+# Límites de los parámetros: asíntota hasta 20 veces el crecimiento de la ventana, velocidad
+# e inflexión dentro de unas pocas ventanas
+LIMITES_PARAMETROS = (np.array([np.log(0.5), np.log(0.1), -5.0]), np.array([np.log(20.0), np.log(500.0), 5.0]))
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def evalua(modelo, parametros, tiempo):
+    """
+    Valores (fila, día) de un modelo con parámetros (fila, 3) y su jacobiano (fila, día,
+    parámetro) respecto a log K, log r y t0
+    """
+    asintota = np.exp(parametros[:, 0:1])
+    velocidad = np.exp(parametros[:, 1:2])
+    z = np.clip(velocidad * (tiempo - parametros[:, 2:3]), -LIMITE_EXPONENTE, LIMITE_EXPONENTE)
+    if modelo == 'logistico':
+        sigmoide = 1.0 / (1.0 + np.exp(-z))
+        valores = asintota * sigmoide
+        derivada = valores * (1.0 - sigmoide) # d valores / d z
+    else:
+        exponencial = np.exp(-z)
+        valores = asintota * np.exp(-exponencial)
+        derivada = valores * exponencial
+    jacobiano = np.stack([valores, derivada * z, -derivada * velocidad * np.ones_like(z)], axis=2)
+    return valores, jacobiano
+
+def iniciales(modelo, y, tiempo):
+    """Parámetros iniciales: asíntota algo por encima del último valor e inflexión donde se cruza"""
+    cruce = 0.5 if modelo == 'logistico' else np.exp(-1.0)
+    parametros = np.empty((len(y), 3))
+    parametros[:, 0] = np.log(1.2)
+    parametros[:, 1] = np.log(10.0)
+    parametros[:, 2] = tiempo[np.argmax(y >= cruce, axis=1)]
+    return parametros
+
+def ajusta_lote(modelo, y, tiempo, iteraciones=ITERACIONES):
+    """
+    Ajusta por mínimos cuadrados un modelo a cada fila de y (fila, día), normalizada a
+    [0, 1]. Devuelve los parámetros (fila, 3) y el error cuadrático medio de cada fila
+    """
+    parametros = iniciales(modelo, y, tiempo)
+    valores, jacobiano = evalua(modelo, parametros, tiempo)
+    coste = ((valores - y) ** 2).sum(axis=1)
+    amortiguacion = np.full(len(y), 1e-2)
+    identidad = np.eye(3)
+    # Sólo se siguen iterando las filas que no han convergido
+    activas = np.arange(len(y))
+    for _ in range(iteraciones):
+        if not len(activas):
+            break
+        traspuesto = jacobiano[activas].transpose(0, 2, 1)
+        normal = np.matmul(traspuesto, jacobiano[activas])
+        gradiente = np.matmul(traspuesto, (valores[activas] - y[activas])[:, :, None])[:, :, 0]
+        diagonal = normal[:, [0, 1, 2], [0, 1, 2]]
+        sistema = normal + (amortiguacion[activas, None] * diagonal + 1e-9)[:, :, None] * identidad
+        paso = np.linalg.solve(sistema, -gradiente[:, :, None])[:, :, 0]
+        candidatos = np.clip(parametros[activas] + paso, *LIMITES_PARAMETROS)
+        valores_nuevos, jacobiano_nuevo = evalua(modelo, candidatos, tiempo)
+        coste_nuevo = ((valores_nuevos - y[activas]) ** 2).sum(axis=1)
+        mejora = coste_nuevo < coste[activas]
+        convergidas = np.where(mejora, coste[activas] - coste_nuevo <= TOLERANCIA * coste[activas],
+                               amortiguacion[activas] >= AMORTIGUACION_MAXIMA)
+        filas = activas[mejora]
+        parametros[filas], valores[filas], jacobiano[filas], coste[filas] = \
+            candidatos[mejora], valores_nuevos[mejora], jacobiano_nuevo[mejora], coste_nuevo[mejora]
+        amortiguacion[activas] = np.where(mejora, amortiguacion[activas] / 3.0, amortiguacion[activas] * 3.0)
+        activas = activas[~convergidas]
+    return parametros, np.sqrt(coste / y.shape[1])
+
+
+class AjustesCurvas(object):
+    """
+    Ajustes de la última ola de confirmados y fallecidos de todas las filas del cubo:
+      - parametros: float64 (modelo, métrica, fila, parámetro), NaN en las filas sin ajuste
+      - error: float64 (modelo, métrica, fila) con el error cuadrático medio normalizado
+      - base, escala: float64 (métrica, fila) con el acumulado al empezar la ventana y su
+        crecimiento en ella, para pasar de valores normalizados a casos
+      - dias: datetime64[D] de la ventana y de la proyección
+    """
+    def __init__(self, parametros, error, base, escala, dias, dias_ajustados, segundos):
+        self.parametros = parametros
+        self.error = error
+        self.base = base
+        self.escala = escala
+        self.dias = dias
+        self.dias_ajustados = dias_ajustados
+        self.segundos = segundos
+
+    @classmethod
+    def calcula(cls, cubo, dias=DIAS_AJUSTE, proyeccion=DIAS_PROYECCION, iteraciones=ITERACIONES, filas=None):
+        """
+        Ajusta todas las filas del cubo. Con `filas` sólo esas, y los resultados se
+        indexan por su posición en la lista
+        """
+        inicio_calculo = time.perf_counter()
+        total_dias = cubo.valores.shape[2]
+        filas = np.arange(cubo.valores.shape[1]) if filas is None else np.asarray(filas, dtype=np.intp)
+        ventana = cubo.valores[np.ix_(METRICAS_AJUSTE, filas, np.arange(max(total_dias - dias, 0), total_dias))]
+        ventana = ventana.astype(np.float64)
+        dias = ventana.shape[2]
+        base, escala = ventana[:, :, 0], ventana[:, :, -1] - ventana[:, :, 0]
+        validas = escala >= MINIMO_CASOS
+        y = (ventana[validas] - base[validas][:, None]) / escala[validas][:, None]
+        tiempo = (np.arange(dias) - (dias - 1)) / float(max(dias, 1))
+
+        forma = (len(MODELOS),) + escala.shape
+        parametros = np.full(forma + (3,), np.nan)
+        error = np.full(forma, np.nan)
+        for posicion, modelo in enumerate(MODELOS):
+            if len(y) and dias > 1:
+                parametros[posicion][validas], error[posicion][validas] = ajusta_lote(modelo, y, tiempo, iteraciones)
+        ultimo = cubo.dias[-1] if len(cubo.dias) else np.datetime64('today', 'D')
+        dias_curva = ultimo + np.arange(-(dias - 1), proyeccion + 1)
+        return cls(parametros, error, base, escala, dias_curva, dias, time.perf_counter() - inicio_calculo)
+
+    @property
+    def fin_proyeccion(self):
+        return self.dias[-1].astype(object)
+
+    def mejor_modelo(self, metrica, fila):
+        """Modelo con menor error para la fila (None si no se ha ajustado)"""
+        errores = self.error[:, METRICAS_AJUSTE.index(metrica), fila]
+        if np.isnan(errores).all():
+            return None
+        return MODELOS[int(np.nanargmin(errores))]
+
+    def curva(self, modelo, metrica, fila):
+        """(días, casos acumulados) de la curva ajustada en la ventana y la proyección, o None"""
+        posicion_metrica = METRICAS_AJUSTE.index(metrica)
+        parametros = self.parametros[MODELOS.index(modelo), posicion_metrica, fila]
+        if np.isnan(parametros).any():
+            return None
+        tiempo = (np.arange(len(self.dias)) - (self.dias_ajustados - 1)) / float(self.dias_ajustados)
+        valores = evalua(modelo, parametros[None, :], tiempo)[0][0]
+        return self.dias, self.base[posicion_metrica, fila] + self.escala[posicion_metrica, fila] * valores
+
+    def resumen(self):
+        return {'modelos': list(MODELOS), 'dias_ajustados': self.dias_ajustados,
+                'dias_proyectados': len(self.dias) - self.dias_ajustados,
+                'series_ajustadas': int((~np.isnan(self.error[0])).sum()),
+                'segundos': round(self.segundos, 4)}
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Almacén local de snapshots de las series temporales de la JHU.
+
+Cada snapshot es un directorio con un fichero .npy por columna (formato columnar
+binario, cargable con mmap) y un manifiesto JSON con la fecha de los datos y el hash
+de los ficheros. El fichero ULTIMO apunta a la versión más reciente.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+FORMATO_SNAPSHOT = 1
+COLUMNAS_CLAVE = ['Province/State', 'Country/Region']
+COLUMNAS_COORDENADAS = ['Lat', 'Long']
+FICHERO_MANIFIESTO = 'manifiesto.json'
+FICHERO_ULTIMO = 'ULTIMO'
+VERSIONES_CONSERVADAS = 5
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def fecha_jhu_a_iso(fecha):
+    """Convierte una columna de fecha de la JHU ('3/15/20') a formato ISO ('2020-03-15')"""
+    return datetime.strptime(fecha, '%m/%d/%y').strftime('%Y-%m-%d')
+
+def hash_fichero(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as fichero:
+        for bloque in iter(lambda: fichero.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def hash_conjunto(hashes):
+    """Hash del snapshot completo a partir de los hashes de sus ficheros"""
+    sha = hashlib.sha256()
+    for nombre in sorted(hashes):
+        sha.update('{0}:{1}\n'.format(nombre, hashes[nombre]).encode('utf-8'))
+    return sha.hexdigest()
+
+def descompone_serie(df):
+    """
+    Separa un dataframe con el formato ancho de la JHU en arrays columnares:
+    claves de texto, coordenadas, nombres de fecha y matriz de valores
+    """
+    fechas = [columna for columna in df.columns
+              if columna not in COLUMNAS_CLAVE + COLUMNAS_COORDENADAS]
+    return {
+        'estados': df['Province/State'].fillna('').astype(str).to_numpy(dtype=str),
+        'paises': df['Country/Region'].astype(str).to_numpy(dtype=str),
+        'coordenadas': df[COLUMNAS_COORDENADAS].to_numpy(dtype=np.float64),
+        'fechas': np.array(fechas, dtype=str),
+        'valores': np.ascontiguousarray(df[fechas].fillna(0).to_numpy()),
+    }
+
+def compone_serie(columnas):
+    """Reconstruye el dataframe ancho de la JHU a partir de sus arrays columnares"""
+    df = pd.DataFrame(columnas['valores'], columns=columnas['fechas'].tolist())
+    estados = pd.Series(columnas['estados'].tolist(), dtype=object).replace('', np.nan)
+    df.insert(0, 'Province/State', estados)
+    df.insert(1, 'Country/Region', pd.Series(columnas['paises'].tolist(), dtype=object))
+    df.insert(2, 'Lat', columnas['coordenadas'][:, 0])
+    df.insert(3, 'Long', columnas['coordenadas'][:, 1])
+    return df
+
+
+# *********************************************************************************************************
+# --------------------------- ALMACÉN DE SNAPSHOTS --------------------------------------------------------
+# *********************************************************************************************************
+class AlmacenSnapshots(object):
+    """
+    Almacén versionado de las series parseadas en un directorio local
+    """
+    def __init__(self, directorio, versiones_conservadas=VERSIONES_CONSERVADAS):
+        self.directorio = directorio
+        self.versiones_conservadas = versiones_conservadas
+
+    def _ruta(self, *partes):
+        return os.path.join(self.directorio, *partes)
+
+    def guarda(self, series, metadatos=None):
+        """
+        Guarda un diccionario {nombre: dataframe} como nuevo snapshot y lo marca como
+        el último. Los metadatos se añaden al manifiesto. Devuelve el manifiesto escrito.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self._ruta('.tmp-{0}-{1}'.format(os.getpid(), time.time()))
+        os.makedirs(temporal)
+        hashes = {}
+        fechas_datos = []
+        for nombre, df in series.items():
+            for columna, array in descompone_serie(df).items():
+                fichero = '{0}_{1}.npy'.format(nombre, columna)
+                np.save(os.path.join(temporal, fichero), array, allow_pickle=False)
+                hashes[fichero] = hash_fichero(os.path.join(temporal, fichero))
+                if columna == 'fechas' and len(array):
+                    fechas_datos.append(fecha_jhu_a_iso(array[-1]))
+        hash_total = hash_conjunto(hashes)
+        fecha_datos = min(fechas_datos) if fechas_datos else ''
+        manifiesto = {
+            'formato': FORMATO_SNAPSHOT,
+            'version': '{0}-{1}'.format(fecha_datos, hash_total[:12]),
+            'fecha_datos': fecha_datos,
+            'creado': time.time(),
+            'series': list(series),
+            'ficheros': hashes,
+            'hash': hash_total}
+        manifiesto.update(metadatos or {})
+        self._escribe_manifiesto(temporal, manifiesto)
+
+        destino = self._ruta(manifiesto['version'])
+        try:
+            os.rename(temporal, destino)
+        except OSError:
+            # Mismos datos que un snapshot existente (o que otro proceso acaba de guardar):
+            # sólo se refresca la fecha de creación
+            shutil.rmtree(temporal, ignore_errors=True)
+            if not os.path.isdir(destino):
+                raise
+            self._escribe_manifiesto(destino, manifiesto)
+        self._marca_ultimo(manifiesto['version'])
+        self._purga()
+        return manifiesto
+
+    def _escribe_manifiesto(self, directorio, manifiesto):
+        # Fichero temporal y os.replace: quien lea el manifiesto ve el anterior o el nuevo entero
+        temporal = os.path.join(directorio, '.{0}.{1}'.format(FICHERO_MANIFIESTO, os.getpid()))
+        with open(temporal, 'w') as fichero:
+            json.dump(manifiesto, fichero, indent=1)
+        os.replace(temporal, os.path.join(directorio, FICHERO_MANIFIESTO))
+
+    def _marca_ultimo(self, version):
+        temporal = self._ruta('.{0}.{1}'.format(FICHERO_ULTIMO, os.getpid()))
+        with open(temporal, 'w') as fichero:
+            fichero.write(version)
+        os.replace(temporal, self._ruta(FICHERO_ULTIMO))
+
+    def _purga(self):
+        versiones = self.versiones()
+        for version in versiones[self.versiones_conservadas:]:
+            shutil.rmtree(self._ruta(version), ignore_errors=True)
+
+    def versiones(self):
+        """Versiones disponibles, de la más reciente a la más antigua"""
+        if not os.path.isdir(self.directorio):
+            return []
+        versiones = []
+        for nombre in os.listdir(self.directorio):
+            ruta = self._ruta(nombre, FICHERO_MANIFIESTO)
+            if not nombre.startswith('.') and os.path.isfile(ruta):
+                versiones.append((os.path.getmtime(ruta), nombre))
+        return [nombre for _, nombre in sorted(versiones, reverse=True)]
+
+    def ultima_version(self):
+        try:
+            with open(self._ruta(FICHERO_ULTIMO)) as fichero:
+                return fichero.read().strip() or None
+        except (IOError, OSError):
+            versiones = self.versiones()
+            return versiones[0] if versiones else None
+
+    def manifiesto(self, version):
+        with open(self._ruta(version, FICHERO_MANIFIESTO)) as fichero:
+            return json.load(fichero)
+
+    def valida(self, version):
+        """Comprueba que el snapshot existe y que sus ficheros coinciden con el manifiesto"""
+        try:
+            manifiesto = self.manifiesto(version)
+        except (IOError, OSError, ValueError):
+            return False
+        if manifiesto.get('formato') != FORMATO_SNAPSHOT:
+            return False
+        for fichero, hash_esperado in manifiesto['ficheros'].items():
+            ruta = self._ruta(version, fichero)
+            if not os.path.isfile(ruta) or hash_fichero(ruta) != hash_esperado:
+                return False
+        return hash_conjunto(manifiesto['ficheros']) == manifiesto['hash']
+
+    def carga(self, version, mmap=True):
+        """
+        Carga un snapshot y devuelve ({nombre: dataframe}, manifiesto). Con mmap los
+        valores se mapean en memoria en lugar de leerse.
+        """
+        manifiesto = self.manifiesto(version)
+        series = {}
+        for nombre in manifiesto['series']:
+            columnas = {}
+            for columna in ['estados', 'paises', 'coordenadas', 'fechas', 'valores']:
+                ruta = self._ruta(version, '{0}_{1}.npy'.format(nombre, columna))
+                columnas[columna] = np.load(ruta, mmap_mode='r' if mmap else None,
+                                            allow_pickle=False)
+            series[nombre] = compone_serie(columnas)
+        return series, manifiesto
+
+    def carga_ultimo(self, edad_maxima=None, mmap=True):
+        """
+        Carga el último snapshot válido. Si se indica edad_maxima (segundos) se
+        descartan los snapshots creados hace más tiempo. Devuelve None si no hay
+        ninguno utilizable.
+        """
+        candidatas = [self.ultima_version()] + self.versiones()
+        vistas = set()
+        for version in candidatas:
+            if version is None or version in vistas:
+                continue
+            vistas.add(version)
+            if not self.valida(version):
+                continue
+            manifiesto = self.manifiesto(version)
+            if edad_maxima is not None and time.time() - manifiesto['creado'] > edad_maxima:
+                continue
+            return self.carga(version, mmap=mmap)
+        return None
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+API de datos de sólo lectura sobre el servidor Flask del dashboard.
+
+    /api/v1/series?country=Spain&country=Hubei|China&metric=confirmados&from=2020-03-01&to=2020-04-01
+    /api/v1/summary
+    /api/v1/us/summary?state=California (con las series por condado de EE. UU. activadas)
+
+Devuelven JSON compacto o, con format=csv, CSV generado por filas sin construir nunca
+el fichero completo en memoria. Las respuestas llevan un ETag fuerte que depende de la
+versión de los datos y de la consulta, y Cache-Control público para que una CDN
+pueda servirlas; una petición con If-None-Match vigente recibe un 304 sin calcular nada.
+"""
+import csv
+import hashlib
+import io
+import json
+
+import flask
+import numpy as np
+
+from condados import METRICAS_CONDADOS
+from cubo import METRICAS
+from metricas import METRICAS_DERIVADAS
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+PREFIJO_API = '/api/v1'
+MAX_AGE_API = 300 # Segundos que una CDN o el navegador pueden reutilizar una respuesta
+FILAS_BLOQUE_CSV = 64 # Filas del CSV por cada bloque enviado
+ALIAS_METRICAS = {'confirmed': 'confirmados', 'deaths': 'fallecidos', 'recovered': 'recuperados',
+                  'new': 'nuevos', 'avg7': 'media7', 'cfr': 'letalidad', 'growth': 'crecimiento',
+                  'doubling': 'duplicacion'}
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+class ErrorConsulta(ValueError):
+    """Parámetro de consulta no válido (respuesta 400)"""
+    codigo = 400
+
+
+class ErrorNoDisponible(ErrorConsulta):
+    """Datos que este despliegue no sirve (respuesta 404)"""
+    codigo = 404
+
+
+def etag_consulta(version, ruta, argumentos):
+    """
+    ETag de una consulta: versión de los datos, ruta y parámetros ordenados por nombre
+    (los valores repetidos conservan su orden, que es el de la respuesta)
+    """
+    parametros = sorted(argumentos.lists())
+    contenido = json.dumps([version, ruta, parametros]).encode('utf-8')
+    return hashlib.sha256(contenido).hexdigest()[:24]
+
+def lee_metricas(argumentos):
+    metricas = [ALIAS_METRICAS.get(metrica, metrica) for metrica in argumentos.getlist('metric')] or list(METRICAS)
+    desconocidas = [metrica for metrica in metricas if metrica not in METRICAS + METRICAS_DERIVADAS]
+    if desconocidas:
+        raise ErrorConsulta('Métrica desconocida: {0}. Disponibles: {1}'.format(
+            ', '.join(desconocidas), ', '.join(METRICAS + METRICAS_DERIVADAS)))
+    return metricas
+
+def lee_localizaciones(argumentos, estado):
+    """Claves pedidas (países o 'estado|país'); sin ninguna, todos los países"""
+    claves = argumentos.getlist('country') or estado.cubo.paises.tolist()
+    desconocidas = [clave for clave in claves if clave not in estado.indice_localizaciones]
+    if desconocidas:
+        raise ErrorConsulta('Localización desconocida: {0}'.format(', '.join(desconocidas)))
+    return claves
+
+def lee_rango(argumentos, dias):
+    """Posiciones [inicio, fin) de los días entre from y to (ISO, ambos incluidos)"""
+    try:
+        desde = np.datetime64(argumentos['from'], 'D') if argumentos.get('from') else dias[0]
+        hasta = np.datetime64(argumentos['to'], 'D') if argumentos.get('to') else dias[-1]
+    except ValueError:
+        raise ErrorConsulta('Fecha no válida: use el formato AAAA-MM-DD')
+    return int(np.searchsorted(dias, desde, side='left')), int(np.searchsorted(dias, hasta, side='right'))
+
+def serie_metrica(estado, metrica, fila, inicio, fin):
+    """
+    Serie de una métrica (de la JHU o derivada) como lista, con None donde no hay valor.
+    'nuevos' y 'media7' son los de casos confirmados
+    """
+    if metrica in METRICAS:
+        return estado.cubo.valores[METRICAS.index(metrica), fila, inicio:fin].tolist()
+    if metrica in ('nuevos', 'media7'):
+        serie = estado.metricas.serie(metrica, fila)[0, inicio:fin]
+    else:
+        serie = estado.metricas.serie(metrica, fila)[inicio:fin]
+    if serie.dtype.kind != 'f':
+        return serie.tolist()
+    return [None if valor != valor else valor for valor in np.round(serie.astype(np.float64), 4).tolist()]
+
+def filas_csv(cabecera, filas):
+    """Genera el CSV por bloques de FILAS_BLOQUE_CSV filas"""
+    bufer = io.StringIO()
+    escritor = csv.writer(bufer, lineterminator='\n')
+    escritor.writerow(cabecera)
+    for numero, fila in enumerate(filas, 1):
+        escritor.writerow(['' if valor is None else valor for valor in fila])
+        if numero % FILAS_BLOQUE_CSV == 0:
+            yield bufer.getvalue()
+            bufer.seek(0)
+            bufer.truncate()
+    yield bufer.getvalue()
+
+def respuesta_json(contenido):
+    return flask.Response(json.dumps(contenido, separators=(',', ':'), ensure_ascii=False),
+                          mimetype='application/json')
+
+def respuesta_csv(cabecera, filas, nombre):
+    respuesta = flask.Response(filas_csv(cabecera, filas), mimetype='text/csv')
+    respuesta.headers['Content-Disposition'] = 'attachment; filename={0}.csv'.format(nombre)
+    return respuesta
+
+
+def registra_api(server, obtiene_estado, sin_datos=None, max_age=MAX_AGE_API):
+    """
+    Añade al servidor Flask las rutas de la API. obtiene_estado() devuelve el estado
+    del dashboard servido (cubo, métricas derivadas e índice de localizaciones), o None
+    mientras se cargan los datos; entonces se responde con sin_datos().
+    """
+    def responde(construye, version=lambda estado: estado.version):
+        """
+        ETag, 304 y cabeceras de caché comunes; construye(estado, argumentos) da la
+        respuesta y version(estado) la versión de los datos que usa
+        """
+        estado = obtiene_estado()
+        if estado is None and sin_datos is not None:
+            return sin_datos()
+        argumentos = flask.request.args
+        etag = etag_consulta(version(estado), flask.request.path, argumentos)
+        if flask.request.if_none_match.contains(etag):
+            respuesta = flask.Response(status=304)
+        else:
+            try:
+                respuesta = construye(estado, argumentos)
+            except ErrorConsulta as error:
+                respuesta = flask.jsonify(error=str(error))
+                respuesta.status_code = error.codigo
+                return respuesta
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'public, max-age={0}'.format(max_age)
+        respuesta.headers['X-Version-Datos'] = estado.version
+        return respuesta
+
+    def series(estado, argumentos):
+        metricas = lee_metricas(argumentos)
+        claves = lee_localizaciones(argumentos, estado)
+        inicio, fin = lee_rango(argumentos, estado.cubo.dias)
+        fechas = [str(dia) for dia in estado.cubo.dias[inicio:fin]]
+        filas = [(clave, estado.indice_localizaciones[clave]) for clave in claves]
+        if argumentos.get('format') == 'csv':
+            # Una fila por (localización, métrica) con una columna por fecha, como los CSV de la JHU
+            return respuesta_csv(['localizacion', 'metrica'] + fechas,
+                                 ([clave, metrica] + serie_metrica(estado, metrica, fila, inicio, fin)
+                                  for clave, fila in filas for metrica in metricas),
+                                 'series-{0}'.format(estado.version))
+        return respuesta_json({'version': estado.version, 'fechas': fechas,
+                               'series': {clave: {metrica: serie_metrica(estado, metrica, fila, inicio, fin)
+                                                  for metrica in metricas} for clave, fila in filas}})
+
+    def resumen(estado, argumentos):
+        cubo = estado.cubo
+        ultimo = cubo.valores[:, :, -1]
+        nuevos = estado.metricas.nuevos[:, :, -1]
+        filas = [(clave, estado.indice_localizaciones[clave]) for clave in cubo.paises.tolist()]
+        cabecera = list(METRICAS) + ['nuevos_' + metrica for metrica in METRICAS]
+        valores = lambda fila: ultimo[:, fila].tolist() + nuevos[:, fila].tolist()
+        if argumentos.get('format') == 'csv':
+            return respuesta_csv(['localizacion'] + cabecera,
+                                 ([clave] + valores(fila) for clave, fila in filas + [('Global', cubo.fila_total)]),
+                                 'resumen-{0}'.format(estado.version))
+        return respuesta_json({'version': estado.version, 'fecha': str(cubo.dias[-1]), 'campos': cabecera,
+                               'global': valores(cubo.fila_total),
+                               'paises': {clave: valores(fila) for clave, fila in filas}})
+
+    def resumen_eeuu(estado, argumentos):
+        """
+        Agregado de cada estado de EE. UU. y del país o, con state, de cada condado del
+        estado y del estado (del cubo de condados: los estados son sus 'países')
+        """
+        ingesta = getattr(estado, 'condados', None)
+        if ingesta is None:
+            raise ErrorNoDisponible('Las series por condado de EE. UU. no están activadas')
+        cubo = ingesta.cubo
+        pedido = argumentos.get('state')
+        if pedido is None:
+            filas = [(nombre, '', fila) for nombre, fila in zip(cubo.paises.tolist(), cubo.fila_pais.tolist())]
+            total, campo = cubo.fila_total, 'estados'
+        elif pedido in cubo.indice_paises:
+            codigo = cubo.indice_paises[pedido]
+            filas = [(cubo.estados[fila], ingesta.fips[fila], fila)
+                     for fila in range(cubo.inicio_pais[codigo], cubo.fin_pais[codigo])]
+            total, campo = int(cubo.fila_pais[codigo]), 'condados'
+        else:
+            raise ErrorConsulta('Estado desconocido: {0}'.format(pedido))
+        ultimo = cubo.valores[:, :, -1].astype(np.int64)
+        nuevos = ultimo - (cubo.valores[:, :, -2] if len(cubo.fechas) > 1 else 0)
+        cabecera = list(METRICAS_CONDADOS) + ['nuevos_' + metrica for metrica in METRICAS_CONDADOS]
+        valores = lambda fila: ultimo[:, fila].tolist() + nuevos[:, fila].tolist()
+        if argumentos.get('format') == 'csv':
+            return respuesta_csv(['localizacion', 'fips'] + cabecera,
+                                 ([nombre, fips] + valores(fila) for nombre, fips, fila in filas),
+                                 'eeuu-{0}'.format(ingesta.version))
+        return respuesta_json({'version': ingesta.version, 'fecha': str(cubo.dias[-1]), 'campos': cabecera,
+                               'total': valores(total),
+                               campo: {nombre: valores(fila) for nombre, _, fila in filas},
+                               'fips': {nombre: fips for nombre, fips, _ in filas if fips}})
+
+    server.add_url_rule(PREFIJO_API + '/series', 'api_series', lambda: responde(series))
+    server.add_url_rule(PREFIJO_API + '/summary', 'api_resumen', lambda: responde(resumen))
+    server.add_url_rule(PREFIJO_API + '/us/summary', 'api_resumen_eeuu', lambda: responde(
+        resumen_eeuu, lambda estado: getattr(getattr(estado, 'condados', None), 'version', estado.version)))
+    return server
@@ -4,15 +4,44 @@
 # *********************************************************************************************************
 # --------------------------- IMPORTO LIBRERÍAS -----------------------------------------------------------
 # *********************************************************************************************************
+import time
+INICIO_IMPORTACION = time.time()
+from arranque import ARRANQUE_RAPIDO, difiere_importaciones, carga_diferidos
+if ARRANQUE_RAPIDO:
+    # pandas y numpy no se cargan hasta que el primer refresco construye los datos
+    difiere_importaciones()
 import pandas as pd # Preprocesamiento de datos
 import numpy as np 
 import dash # Dashboard
+import flask
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
-import plotly.express as px
-from datetime import datetime, timedelta
+import plotly.io as pio
+import os
+import hashlib
+from datetime import datetime
+from almacen import AlmacenSnapshots
+from ingesta import es_url, ingesta_concurrente
+from refresco import RefrescoPeriodico
+from plano import PlanoCompartido
+from cubo import METRICAS, CuboSeries, SEPARADOR_LOCALIZACION
+from condados import lee_condados
+from cache import CacheLRU, CacheVersionada, instala_cache_respuestas, serializa_componentes
+from estaticos import PublicadorEstaticos
+from recursos import IGNORA_ASSETS, IGNORA_VENDOR, publica_paquetes, vendorizados
+from submuestreo import indices_traza, ventana_relayout_fechas
+from metricas import MetricasDerivadas
+from rangos import IndiceRangos
+from ranking import PUESTOS_RANKING, TITULOS_METRICAS, RankingPaises
+from ajustes import METRICAS_AJUSTE, MODELOS, AjustesCurvas
+from cambios import compara_cubos, huellas_filas
+from api import registra_api
+from instrumentacion import Registro, instala_instrumentacion
+from mapa_global import NIVEL_DETALLE, VistaMapa, figura_mapa, ventana_relayout
+from mapa_espania import carga_topologia, genera_html, lee_valores, RUTA_VALORES
 
 
 # *********************************************************************************************************
@@ -22,10 +51,49 @@ TAMANIO_LETRA_KPIS=18
 URL="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv"
 URL_FALLECIMIENTOS="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv"
 URL_RECUPERADOS="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv"
+URLS_SERIES = {'confirmados': URL, 'fallecidos': URL_FALLECIMIENTOS, 'recuperados': URL_RECUPERADOS}
+URL_CONDADOS="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv"
+URL_FALLECIMIENTOS_CONDADOS="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_US.csv"
+URLS_CONDADOS = {'confirmados': URL_CONDADOS, 'fallecidos': URL_FALLECIMIENTOS_CONDADOS}
+# Directorio local con los CSV de la JHU (mismo nombre de fichero que en las URLs) para trabajar sin conexión
+DIR_CSV = os.environ.get('COVID_DIR_CSV')
+# Directorio del almacén de snapshots y antigüedad máxima (en horas) de un snapshot para usarlo al arrancar
+DIR_SNAPSHOTS = os.environ.get('COVID_DIR_SNAPSHOTS', 'snapshots')
+EDAD_MAXIMA_SNAPSHOT = float(os.environ.get('COVID_EDAD_MAXIMA_SNAPSHOT', 6)) * 3600
+# Última copia buena de cada CSV descargado, timeout por intento (segundos) y reintentos por feed
+DIR_CACHE_CSV = os.environ.get('COVID_DIR_CACHE_CSV', 'cache_csv')
+TIMEOUT_DESCARGA = float(os.environ.get('COVID_TIMEOUT_DESCARGA', 20))
+REINTENTOS_DESCARGA = int(os.environ.get('COVID_REINTENTOS_DESCARGA', 2))
+NOMBRES_SERIES = {'confirmados': 'Confirmados', 'fallecidos': 'Fallecidos', 'recuperados': 'Recuperados'}
+# Con COVID_CONDADOS_EEUU=1 se leen también las series por condado de EE. UU., por bloques de
+# filas con COVID_MEMORIA_BLOQUE_CONDADOS MB de memoria de trabajo por bloque
+CONDADOS_EEUU = os.environ.get('COVID_CONDADOS_EEUU') == '1'
+MEMORIA_BLOQUE_CONDADOS = float(os.environ.get('COVID_MEMORIA_BLOQUE_CONDADOS', 16)) * 2 ** 20
+# Segundos entre refrescos de los datos en segundo plano (0 desactiva el refresco)
+INTERVALO_REFRESCO = float(os.environ.get('COVID_INTERVALO_REFRESCO', 3600))
+# Plano de datos compartido entre trabajadores de gunicorn (desactivado si no hay directorio)
+DIR_PLANO = os.environ.get('COVID_DIR_PLANO')
+INTERVALO_PLANO = float(os.environ.get('COVID_INTERVALO_PLANO', 30))
+# Con gunicorn --preload el refresco se arranca en cada trabajador tras el fork (gunicorn.conf.py)
+REFRESCO_EN_TRABAJADORES = os.environ.get('COVID_REFRESCO_EN_TRABAJADORES') == '1'
+# Con COVID_PESTANIAS_EN_CLIENTE=1 el contenido de todas las pestañas viaja con la página en
+# un dcc.Store y el cambio de pestaña se resuelve en el navegador (assets/pestanias.js)
+PESTANIAS_EN_CLIENTE = os.environ.get('COVID_PESTANIAS_EN_CLIENTE') == '1'
+# Directorio donde el perfilador por muestreo escribe los perfiles de las peticiones con la
+# cabecera X-Perfil o el parámetro ?perfil (sin directorio el perfilador está desactivado)
+DIR_PERFILES = os.environ.get('COVID_DIR_PERFILES')
+# Directorio donde se publican los ficheros estáticos con huella y sus variantes comprimidas
+DIR_ESTATICOS = os.environ.get('COVID_DIR_ESTATICOS', 'estaticos')
+# Con COVID_RECURSOS_EXTERNOS=1 la hoja de estilo se pide a su CDN y Dash incluye por separado
+# los CSS y JS de assets/, en lugar de servir los paquetes propios con huella (recursos.py).
+# Sin la variable se usan los paquetes si están los ficheros de assets/vendor; con 0 se
+# exigen (si falta alguno no se arranca)
+RECURSOS_EXTERNOS = os.environ.get('COVID_RECURSOS_EXTERNOS', '0' if vendorizados() else '1') == '1'
+RUTA_VALORES_CCAA = os.environ.get('COVID_CSV_CCAA', RUTA_VALORES)
 CORTE_PAISES_MENOS_INFECTADOS = 100
 CORTE_PAISES_MAS_INFECTADOS = 30000
 PLANTILLA = 'ggplot2'
-DIA_ACTUALIZACION = datetime.strftime(datetime.now() - timedelta(1), '%-d del %-m de %Y')
+PLANTILLA_FIGURAS = pio.templates[PLANTILLA].to_plotly_json() # Plantilla resuelta para figuras como diccionario
 ESTILO_DASHBOARD = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 ESTILO_PESTANIAS = {'height': '50px'}
 ESTILO_PESTANIA = {'borderBottom': '1px solid #d6d6d6','padding': '10px','fontWeight': 'bold','font-size':'20px'}
@@ -43,6 +111,35 @@ PATOLOGIAS = ['Enfermedades cardiovasculares', 'Diabetes','Hipertensión',
               'Enfermedades respiratorias crónicas', 'Cáncer', 
               'Sin patologías previas']
 RATIOS_PATOLOGIAS = [13.2, 9.2, 8.4, 8.0, 7.6, 2.9]
+# Gráficas de tendencia: id -> (localización en el estado, título del eje y)
+GRAFICAS_TENDENCIA = {'example-scatter': ('hubei', 'Población acumulada (en miles)'),
+                      'example-scatter2': ('italy', 'Población acumulada'),
+                      'example-scatter3': ('esp', 'Población acumulada')}
+TRAZAS_TENDENCIA = [('Casos confirmados', 'rgba(152, 0, 0, .8)'), ('Fallecimientos', 'rgb(231, 99, 250)'),
+                    ('Casos sanados', 'rgb(17, 157, 255)')]
+# Vistas de las gráficas de tendencia: (valor, etiqueta, título del eje y). Los acumulados
+# usan el título de la gráfica; el resto son métricas derivadas (metricas.py)
+VISTAS_TENDENCIA = [('acumulados', 'Acumulados', None),
+                    ('nuevos', 'Nuevos diarios', 'Casos diarios'),
+                    ('media7', 'Media 7 días', 'Casos diarios (media de 7 días)'),
+                    ('letalidad', 'Letalidad', 'Fallecidos / confirmados (%)'),
+                    ('crecimiento', 'Crecimiento diario', 'Crecimiento diario de confirmados (%)'),
+                    ('duplicacion', 'Tiempo de duplicación', 'Días para duplicar los confirmados')]
+# Curvas ajustadas superpuestas a los acumulados: se ve la de menor error y la otra se
+# puede activar en la leyenda
+NOMBRES_MODELOS = {'logistico': 'ajuste logístico', 'gompertz': 'ajuste de Gompertz'}
+LOCALIZACIONES_TENDENCIA = {'paises': ['US', 'Italy', 'Spain'], 'estados': ['Hubei']}
+PESTANIAS = ['pestania-china', 'pestania-espania', 'pestania-out-china', 
+             'pestania-edad-patologias', 'pestania-consejos', 'pestania-analisis', 'pestania-paises']
+# Países de los que depende el contenido de cada pestaña (None: de todos). Una pestaña
+# sólo se reconstruye si el cambio de los datos afecta a alguno de sus países
+DEPENDENCIAS_PESTANIAS = {'pestania-china': ['China'], 'pestania-espania': ['Spain'], 
+                          'pestania-out-china': None, 'pestania-edad-patologias': [], 
+                          'pestania-consejos': [], 'pestania-analisis': [], 'pestania-paises': None}
+# Localización inicial del desplegable de la pestaña por país y figuras que se guardan
+# (las más usadas) en su caché LRU
+LOCALIZACION_POR_DEFECTO = 'Spain'
+TAMANIO_CACHE_FIGURAS = int(os.environ.get('COVID_TAMANIO_CACHE_FIGURAS', 512))
 
 # *********************************************************************************************************
 # --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
@@ -52,43 +149,109 @@ def a_tiempo_unix(dt):
     epoch =  datetime.utcfromtimestamp(0)
     return (dt - epoch).total_seconds() * 1000
 
-# Funciones para filtrar el dataframe original por localizaciones
-def devuelve_dfs_localizacion_pais(df, localizacion, flag_not=False):
+# Funciones para obtener las series de una localización. Son vistas del cubo de datos
+def devuelve_dfs_localizacion_pais(cubo, localizacion, flag_not=False):
     if flag_not:
-        df_conf = df[df['Country/Region']!=localizacion].reset_index(drop=True)
-        df_fall = df_fallecidos[df_fallecidos['Country/Region']!=localizacion].reset_index(drop=True)
-        df_recup = df_recuperados[df_recuperados['Country/Region']!=localizacion].reset_index(drop=True)
-    else:
-        df_conf = df[df['Country/Region']==localizacion].reset_index(drop=True)
-        df_fall = df_fallecidos[df_fallecidos['Country/Region']==localizacion].reset_index(drop=True)
-        df_recup = df_recuperados[df_recuperados['Country/Region']==localizacion].reset_index(drop=True)
-    df_conf.loc['fecha_infecciones'] = df_conf.sum()
-    df_fall.loc['fecha_infecciones'] = df_fall.sum()
-    df_recup.loc['fecha_infecciones'] = df_recup.sum()
-    return df_conf, df_fall, df_recup
-
-def devuelve_dfs_localizacion_estado(df, localizacion):
-    df_conf = df[df['State']==localizacion].reset_index(drop=True)
-    df_fall = df_fallecidos[df_fallecidos['State']==localizacion].reset_index(drop=True)
-    df_recup = df_recuperados[df_recuperados['State']==localizacion].reset_index(drop=True)
-    return df_conf, df_fall, df_recup 
-
-def devuelve_evol_local(lista_df_localizacion, y, pais=False):
-    if pais:
-        y_conf = [lista_df_localizacion[0].copy().loc['fecha_infecciones'][str(d)] for d in y]
-        y_fall = [lista_df_localizacion[1].copy().loc['fecha_infecciones'][str(d)] for d in y]
-        y_recup=[lista_df_localizacion[2].copy().loc['fecha_infecciones'][str(d)] for d in y]
-    else:
-        y_conf=[lista_df_localizacion[0].copy()[str(d)].item() for d in y]
-        y_fall=[lista_df_localizacion[1].copy()[str(d)].item() for d in y]
-        y_recup=[lista_df_localizacion[2].copy()[str(d)].item() for d in y]
-    return y_conf, y_fall, y_recup
+        return tuple(cubo.serie_sin_pais(localizacion))
+    return tuple(cubo.serie_pais(localizacion))
+
+def devuelve_dfs_localizacion_estado(cubo, localizacion):
+    return tuple(cubo.serie_estado(localizacion))
+
+def calculo_metricas_totales(serie_conf, serie_fall, serie_recup):
+    return int(serie_conf[-1]), int(serie_fall[-1]), int(serie_recup[-1])
+
+# Funciones de lectura de datos
+def devuelve_origen_csv(url):
+    """Devuelve la ruta local equivalente a la URL si se trabaja sin conexión"""
+    if DIR_CSV:
+        return os.path.join(DIR_CSV, url.rsplit('/', 1)[-1])
+    return url
+
+def lee_series_jhu(usa_snapshot=True):
+    """
+    Devuelve las series de confirmados, fallecidos y recuperados, la lista de series
+    obsoletas y la versión de los datos. Con usa_snapshot se usa el último snapshot
+    local si es válido, reciente y completo; si no, se descargan los CSV en paralelo y
+    se guarda un snapshot nuevo. Si la descarga falla sin copia local se recurre a
+    cualquier snapshot válido.
+    """
+    almacen = AlmacenSnapshots(DIR_SNAPSHOTS)
+    snapshot = almacen.carga_ultimo(edad_maxima=EDAD_MAXIMA_SNAPSHOT) if usa_snapshot else None
+    if snapshot is not None and not snapshot[1].get('obsoletas'):
+        return snapshot[0], [], snapshot[1]['version']
+    try:
+        resultados = ingesta_concurrente(
+            {nombre: devuelve_origen_csv(url) for nombre, url in URLS_SERIES.items()},
+            DIR_CACHE_CSV, timeout=TIMEOUT_DESCARGA, reintentos=REINTENTOS_DESCARGA)
+        series = {}
+        for nombre, resultado in resultados.items():
+            HISTOGRAMA_DESCARGA.observa(resultado.segundos, serie=nombre, estado=resultado.estado)
+            inicio = time.time()
+            series[nombre] = pd.read_csv(resultado.ruta)
+            HISTOGRAMA_LECTURA.observa(time.time() - inicio, serie=nombre)
+    except Exception:
+        snapshot = snapshot or almacen.carga_ultimo()
+        if snapshot is None:
+            raise
+        return snapshot[0], list(snapshot[0]), snapshot[1]['version']
+    obsoletas = [nombre for nombre, resultado in resultados.items() if resultado.obsoleto]
+    try:
+        version = almacen.guarda(series, metadatos={'obsoletas': obsoletas})['version']
+    except (IOError, OSError):
+        # Sin permisos de escritura se sigue con los datos leídos
+        version = 'sin-snapshot-{0}'.format(int(time.time()))
+    return series, obsoletas, version
+
+def lee_condados_eeuu(anterior=None):
+    """
+    Descarga y lee por bloques las series por condado de EE. UU. (con COVID_CONDADOS_EEUU=1).
+    Se descargan como mucho cada INTERVALO_REFRESCO segundos y, con plano compartido,
+    sólo en el líder: los demás trabajadores leen los CSV que el líder deja en
+    DIR_CACHE_CSV. Si los CSV son los mismos que los del estado anterior se reutiliza su
+    ingesta; si fallan se conserva la anterior. Devuelve (ingesta o None, error o None)
+    """
+    if not CONDADOS_EEUU:
+        return None, None
+    previa = anterior.condados if anterior is not None else None
+    descarga = PLANO is None or PLANO.es_lider()
+    if descarga and previa is not None and time.time() - previa.comprobado < INTERVALO_REFRESCO:
+        return previa, anterior.error_condados
+    comprobado = time.time()
+    origenes = {nombre: devuelve_origen_csv(url) for nombre, url in URLS_CONDADOS.items()}
+    try:
+        if descarga:
+            resultados = ingesta_concurrente({'condados_' + nombre: origen for nombre, origen in origenes.items()},
+                                             DIR_CACHE_CSV, timeout=TIMEOUT_DESCARGA, reintentos=REINTENTOS_DESCARGA)
+            rutas = {nombre: resultados['condados_' + nombre].ruta for nombre in URLS_CONDADOS}
+        else:
+            rutas = {nombre: os.path.join(DIR_CACHE_CSV, 'condados_{0}.csv'.format(nombre)) if es_url(origen)
+                     else origen for nombre, origen in origenes.items()}
+            if not all(os.path.isfile(ruta) for ruta in rutas.values()):
+                # El líder aún no los ha descargado
+                return previa, None
+        huella = repr(sorted((nombre, os.path.getsize(ruta), os.path.getmtime(ruta)) for nombre, ruta in rutas.items()))
+        if previa is not None and previa.huella == huella:
+            previa.comprobado = comprobado
+            return previa, None
+        ingesta = lee_condados(rutas, memoria_bloque=MEMORIA_BLOQUE_CONDADOS)
+    except Exception as error:
+        return previa, str(error)
+    HISTOGRAMA_CONDADOS.observa(ingesta.segundos)
+    ingesta.huella = huella
+    ingesta.comprobado = comprobado
+    ingesta.version = hashlib.sha256(huella.encode('utf-8')).hexdigest()[:12]
+    return ingesta, None
 
-def calculo_metricas_totales(df_conf, df_fall, df_recup):
-    confirmados_totales = df_conf.loc['fecha_infecciones',:]['casos_totales']
-    fallecidos_totales = df_fall.loc['fecha_infecciones',:]['casos_totales']
-    recuperados_totales = df_recup.loc['fecha_infecciones',:]['casos_totales']
-    return confirmados_totales, fallecidos_totales, recuperados_totales
+def render_aviso_obsoletas(obsoletas):
+    """
+    Aviso en la cabecera cuando alguna serie no se ha podido actualizar
+    """
+    if not obsoletas:
+        return html.Div()
+    return html.Div(children='''Aviso: no se han podido actualizar los datos de {0}. Se muestra la última copia disponible'''.format(
+                        ', '.join(NOMBRES_SERIES.get(nombre, nombre) for nombre in obsoletas)),
+                    style = {'font-size':16,'font-family': "Helvetica Neue", 'color':'orange'})
 
 def render_footer():
     """
@@ -133,7 +296,7 @@ def devuelve_figura_con_kpis(confirmados, fallecidos, recuperados):
         title = {"text": "Recuperados", "font":{"size":TAMANIO_LETRA_KPIS}}))
     figura_aux.add_trace(go.Indicator(
         mode = "number",
-        value = recuperados/(recuperados+fallecidos),
+        value = recuperados/(recuperados+fallecidos) if recuperados+fallecidos else 0,
         number={"font":{"size":50, "color":'black'}},
         domain = {'row': 1, 'column': 3},
         title = {"text": "Tasa de recuperación", "font":{"size":TAMANIO_LETRA_KPIS}}))
@@ -142,6 +305,10 @@ def devuelve_figura_con_kpis(confirmados, fallecidos, recuperados):
         height=100)
     return figura_aux
 
+def devuelve_figura_barras(x, y, **layout):
+    return go.Figure(data=[go.Bar(x=x, y=y, text=y, textposition='auto',)],
+                     layout=go.Layout(height=600,margin=dict(t=10), template=PLANTILLA, **layout))
+
 def devuelve_figura_con_kpis_doble(confirmados, fallecidos, recuperados):
     figura_aux = go.Figure()
     figura_aux.add_trace(go.Indicator(
@@ -185,178 +352,713 @@ def devuelve_figura_con_kpis_doble(confirmados, fallecidos, recuperados):
         height=200, width=800,margin=dict(t=20, b=0, l=5, r=5))
     return figura_aux
 
+def texto_rango(indice_rangos, inicio, fin):
+    """Descripción del rango de fechas elegido en el deslizador"""
+    desde, hasta = [indice_rangos.dias[posicion].astype(datetime).strftime('%-d/%-m/%Y') for posicion in (inicio, fin)]
+    return 'Kpis y casos por región del {0} al {1} ({2} días)'.format(desde, hasta, fin - inicio + 1)
+
+def etiqueta_localizacion(clave):
+    """'Hubei|China' -> 'Hubei (China)'; los países se quedan igual"""
+    if SEPARADOR_LOCALIZACION not in clave:
+        return clave
+    return '{0} ({1})'.format(*clave.split(SEPARADOR_LOCALIZACION))
+
+def series_tendencia(estado, fila, vista):
+    """
+    Trazas (nombre, color, serie) de una vista de la tendencia de una fila del cubo
+    """
+    if vista == 'acumulados':
+        serie = estado.cubo.valores[:, fila]
+    else:
+        serie = estado.metricas.serie(vista, fila)
+    if serie.dtype.kind == 'f':
+        # Se redondea para no enviar los decimales espurios de float32
+        serie = np.round(serie.astype(np.float64), 2)
+    if serie.ndim == 2:
+        return [(nombre, color, fila) for (nombre, color), fila in zip(TRAZAS_TENDENCIA, serie)]
+    etiqueta = [etiqueta for valor, etiqueta, _ in VISTAS_TENDENCIA if valor == vista][0]
+    return [(etiqueta, TRAZAS_TENDENCIA[0][1], serie)]
+
+def trazas_ajuste(ajustes, fila):
+    """
+    Curvas ajustadas de confirmados y fallecidos de una fila del cubo, con su proyección
+    """
+    trazas = []
+    for metrica, (nombre, color) in zip(METRICAS_AJUSTE, TRAZAS_TENDENCIA):
+        mejor = ajustes.mejor_modelo(metrica, fila)
+        for modelo in MODELOS:
+            curva = ajustes.curva(modelo, metrica, fila)
+            if curva is None:
+                continue
+            dias, valores = curva
+            trazas.append({'type': 'scatter', 'x': dias, 'y': np.round(valores), 'mode': 'lines',
+                           'name': '{0} ({1})'.format(nombre, NOMBRES_MODELOS[modelo]),
+                           'line': {'color': color, 'dash': 'dash'},
+                           'visible': True if modelo == mejor else 'legendonly'})
+    return trazas
+
+def devuelve_figura_tendencia(estado, localizacion, titulo_eje_y, ventana=None, vista='acumulados'):
+    """
+    Tendencia de una de las localizaciones fijas ('hubei', 'italy', 'esp')
+    """
+    return figura_tendencia(estado, estado.filas_tendencia[localizacion], titulo_eje_y, ventana, vista, 
+                            localizacion)
+
+def figura_tendencia(estado, fila, titulo_eje_y, ventana=None, vista='acumulados', revision=''):
+    """
+    Tendencia de una fila del cubo en la vista indicada (acumulados o una métrica
+    derivada) con un número acotado de puntos por traza y, si se indica, la ventana
+    visible a resolución completa. `revision` identifica la gráfica para conservar el
+    zoom del usuario mientras no cambie
+    """
+    dias = estado.cubo.dias
+    x = dias.astype(np.int64)
+    trazas = []
+    for nombre, color, serie in series_tendencia(estado, fila, vista):
+        # Los días sin valor (NaN) no deben decidir qué puntos se eligen
+        indices = indices_traza(x, np.nan_to_num(serie), ventana)
+        trazas.append({'type': 'scatter', 'x': dias[indices], 'y': serie[indices], 'name': nombre, 
+                       'mode': 'lines+markers', 'marker': {'color': color}})
+    fin_eje = datetime.now()
+    if vista == 'acumulados':
+        trazas += trazas_ajuste(estado.ajustes, fila)
+        fin_eje = max(fin_eje, datetime.combine(estado.ajustes.fin_proyeccion, datetime.min.time()))
+    titulo_vista = [titulo for valor, _, titulo in VISTAS_TENDENCIA if valor == vista][0]
+    # Figura como diccionario con la plantilla ya resuelta: es el mismo JSON que con
+    # go.Figure, sin validar cada propiedad ni copiar la plantilla en cada llamada
+    return {'data': trazas,
+            'layout': {'margin': {'t': 10}, 'height': 600, 
+                       'xaxis': {'range': [a_tiempo_unix(datetime(2020, 1, 21)), a_tiempo_unix(fin_eje)]},
+                       'template': PLANTILLA_FIGURAS, 'yaxis': {'title': {'text': titulo_vista or titulo_eje_y}},
+                       # Al cambiar de vista se vuelve a la escala por defecto
+                       'uirevision': '{0}-{1}'.format(revision, vista)}}
+
+def selector_vista_tendencia(id_grafica):
+    """Selector de la vista de una gráfica de tendencia"""
+    return dcc.RadioItems(id=id_grafica + '-vista', value='acumulados',
+                          options=[{'label': etiqueta, 'value': valor} for valor, etiqueta, _ in VISTAS_TENDENCIA],
+                          labelStyle={'display': 'inline-block', 'margin-right': '15px'},
+                          style={'textAlign': 'center', 'font-family': "Helvetica Neue"})
+
 # *********************************************************************************************************
 # --------------------------- GENERACIÓN DEL SERVIDOR CON DASH --------------------------------------------
 # *********************************************************************************************************
 # Genero servidor dash
 # Las apps hechas con Dash son aplicaciones web. Dash usa flask como framework web.
-app = dash.Dash(__name__, external_stylesheets = ESTILO_DASHBOARD)
+# Ficheros estáticos con huella, servidos con caché inmutable y variantes precomprimidas
+ESTATICOS = PublicadorEstaticos(DIR_ESTATICOS)
+if RECURSOS_EXTERNOS:
+    app = dash.Dash(__name__, external_stylesheets = ESTILO_DASHBOARD, assets_ignore=IGNORA_VENDOR)
+else:
+    # Un paquete CSS y otro JS propios con huella: la página no depende de CDNs de terceros.
+    # Con COVID_RECURSOS_EXTERNOS=0 y algún fichero de assets/vendor sin descargar no se
+    # arranca (recursos.ErrorRecursos)
+    PAQUETES = publica_paquetes(ESTATICOS)
+    app = dash.Dash(__name__, external_stylesheets=PAQUETES['css'], external_scripts=PAQUETES['js'],
+                    assets_ignore=IGNORA_ASSETS)
 app.title = 'Infecciones por el coronavirus'
 server = app.server # Flask app 
 
+# Métricas de Prometheus en /metrics, cabecera Server-Timing y perfilador opcional. Los
+# callbacks de pestañas se miden por separado para cada pestaña
+REGISTRO = Registro()
+instala_instrumentacion(server, REGISTRO, salidas=app.callback_map,
+                        valores_por_salida={'contenido-pestanias.children': PESTANIAS}, dir_perfiles=DIR_PERFILES)
+HISTOGRAMA_REFRESCO = REGISTRO.histograma('covid_refresco_segundos', 'Duración de cada refresco de los datos',
+                                          ['resultado'])
+HISTOGRAMA_DESCARGA = REGISTRO.histograma('covid_ingesta_descarga_segundos', 
+                                          'Tiempo de descarga de cada feed de la JHU', ['serie', 'estado'])
+HISTOGRAMA_LECTURA = REGISTRO.histograma('covid_ingesta_lectura_segundos', 
+                                         'Tiempo de lectura del CSV de cada feed de la JHU', ['serie'])
+HISTOGRAMA_CONDADOS = REGISTRO.histograma('covid_condados_ingesta_segundos',
+                                          'Tiempo de la ingesta por bloques de las series por condado')
+HISTOGRAMA_AJUSTES = REGISTRO.histograma('covid_ajustes_segundos', 
+                                         'Tiempo del ajuste de las curvas de todas las filas en cada refresco')
+
+ESTATICOS.registra(server)
+TOPOLOGIA_ESPANIA = carga_topologia()
+
 # *********************************************************************************************************
 # --------------------------- LECTURA Y PREPARACIÓN DE DATOS ----------------------------------------------
 # *********************************************************************************************************
-df=pd.read_csv(URL)
-df_fallecidos=pd.read_csv(URL_FALLECIMIENTOS)
-df_recuperados=pd.read_csv(URL_RECUPERADOS)
-
-# Defino la variable 
-df['casos_totales'] = df[df.columns[-1]]
-df_recuperados['casos_totales'] = df_recuperados[df_recuperados.columns[-1]]
-df_fallecidos['casos_totales'] = df_fallecidos[df_fallecidos.columns[-1]]
-
-# Renombro columnas
-df.rename(columns = {'Province/State':'State'}, inplace = True)
-df_fallecidos.rename(columns = {'Province/State':'State'}, inplace = True)
-df_recuperados.rename(columns = {'Province/State':'State'}, inplace = True)
-
-confirmados_totales = df['casos_totales'].sum()
-fallecidos_totales = df_fallecidos['casos_totales'].sum()
-recuperados_totales = df_recuperados['casos_totales'].sum()
-
-# Análisis de Hubei
-df_H, df_H_fall, df_H_recup = devuelve_dfs_localizacion_estado(df, 'Hubei')
-# Obtengo infecciones de USA
-df_USA, df_USA_fall, df_USA_recup = devuelve_dfs_localizacion_pais(df, 'US')
-# Obtengo infecciones de España
-df_ITALY, df_ITALY_fall, df_ITALY_recup = devuelve_dfs_localizacion_pais(df, 'Italy')
-# Obtengo infecciones de China
-df_CHINA, df_CHINA_d, df_CHINA_r = devuelve_dfs_localizacion_pais(df, 'China')
-confirmados_china_totales, fallecidos_china_totales, recuperados_china_totales = calculo_metricas_totales(df_CHINA, df_CHINA_d, df_CHINA_r)
-# Obtengo infecciones de España
-df_ESP, df_ESP_d, df_ESP_r = devuelve_dfs_localizacion_pais(df, 'Spain')
-confirmados_esp_totales, fallecidos_esp_totales, recuperados_esp_totales = calculo_metricas_totales(df_ESP, df_ESP_d, df_ESP_r)
-# Obtengo infecciones de fuera de China
-df_OTROS, df_OTROS_d, df_OTROS_r =  devuelve_dfs_localizacion_pais(df, 'China', flag_not=True)
-confirmados_otros_totales, fallecidos_otros_totales, recuperados_otros_totales = calculo_metricas_totales(df_OTROS, df_OTROS_d, df_OTROS_r)
-
-
-df_agrupado=df.groupby(['Country/Region']).sum()
-df_agrupado.reset_index(inplace=True)
-
-# Países más infectados después de China
-df_mas_infectados = df_agrupado.loc[(df_agrupado['casos_totales']>CORTE_PAISES_MAS_INFECTADOS) 
-                                    & (df_agrupado['Country/Region']!='China')]
-df_mas_infectados.reset_index(inplace=True)
-# Países menos infectados
-df_menos_infectados = df_agrupado.loc[(df_agrupado['casos_totales']<CORTE_PAISES_MENOS_INFECTADOS)]
-df_menos_infectados.reset_index(inplace=True)
-# China
-df_china=df.loc[df['Country/Region']=='China']
-df_china.reset_index(inplace=True)
-
-# Escalas para las series temporales
-x = pd.date_range(start = "2020-01-22", end = datetime.now(), freq = "D")
-x = [pd.to_datetime(date, format='%Y-%m-%d').date() for date in x]
-
-y_index = pd.date_range(start = datetime.strftime(datetime(2020, 1, 22),'%-m/%-d/%y'), 
-                        end = df.columns[-2], freq = "D")
-y_index = [datetime.strftime(date,'%-m/%-d/%y') for date in y_index]
-
-# Evolución para Hubei
-y_hubei, y_hubei_d, y_hubei_r = devuelve_evol_local([df_H, df_H_fall, df_H_recup], y_index, pais=False)
-# Evolución para USA
-y_usa, y_usa_d, y_usa_r = devuelve_evol_local([df_USA, df_USA_fall, df_USA_recup], y_index, pais=True)
-# Evolución para Italia
-y_italy, y_italy_d, y_italy_r = devuelve_evol_local([df_ITALY, df_ITALY_fall, df_ITALY_recup], y_index, pais=True)
-# Evolución para España
-y_esp, y_esp_d, y_esp_r = devuelve_evol_local([df_ESP, df_ESP_d, df_ESP_r], y_index, pais=True)
-
-
-figura_kpis = devuelve_figura_con_kpis_doble([confirmados_totales, confirmados_esp_totales], 
-                                             [fallecidos_totales,fallecidos_esp_totales], 
-                                             [recuperados_totales,recuperados_esp_totales])
-
-figura_kpis_china = devuelve_figura_con_kpis(confirmados_china_totales, 
-                                             fallecidos_china_totales, 
-                                             recuperados_china_totales)
-
-figura_kpis_esp = devuelve_figura_con_kpis(confirmados_esp_totales, 
-                                             fallecidos_esp_totales, 
-                                             recuperados_esp_totales)
-
-figura_kpis_otros = devuelve_figura_con_kpis(confirmados_otros_totales, 
-                                             fallecidos_otros_totales, 
-                                             recuperados_otros_totales)
+class EstadoDashboard(object):
+    """
+    Contenedor de todos los datos y figuras precalculados a partir de una versión de los datos
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def publica_mapa_espania():
+    """
+    Genera el mapa de España con los últimos valores por comunidad autónoma y lo publica.
+    Devuelve su URL y la fecha de los datos.
+    """
+    valores, fecha = lee_valores(RUTA_VALORES_CCAA)
+    url = ESTATICOS.publica_contenido('infectados_espania.html', 
+                                      genera_html(TOPOLOGIA_ESPANIA, valores, fecha).encode('utf-8'))
+    if fecha:
+        fecha = datetime.strftime(datetime.strptime(fecha, '%Y-%m-%d'), '%-d del %-m de %Y')
+    return url, fecha
+
+def fuente_datos(usa_snapshot=False):
+    """
+    Devuelve (versión, series obsoletas, construye_cubo). El cubo sólo se construye si
+    la versión es nueva. Con plano compartido, si la generación actual está al día o
+    este proceso no es el líder, se mapea esa generación en lugar de leer las series;
+    el líder lee las series cuando toca y publica el cubo como generación nueva.
+    """
+    actual = None
+    if PLANO is not None:
+        actual = PLANO.actual()
+        # Un ACTUAL de otra versión de la aplicación puede no tener los campos opcionales
+        al_dia = actual is not None and time.time() - actual.get('comprobado', 0) < INTERVALO_REFRESCO
+        if actual is not None and (al_dia or not PLANO.es_lider()):
+            return actual['version'], actual.get('series_obsoletas', []), lambda: PLANO.carga(actual['generacion'])
+
+    series, series_obsoletas, version = lee_series_jhu(usa_snapshot=usa_snapshot)
+    if actual is not None and actual['version'] == version:
+        PLANO.marca_comprobado({'series_obsoletas': series_obsoletas})
+        return version, series_obsoletas, lambda: PLANO.carga(actual['generacion'])
+
+    def construye_cubo():
+        cubo = CuboSeries.desde_series(series)
+        if PLANO is not None:
+            cubo = PLANO.publica(cubo, version, {'series_obsoletas': series_obsoletas})
+        return cubo
+    return version, series_obsoletas, construye_cubo
+
+def devuelve_versiones_pestanias(anterior, cambios, version_contenido, url_mapa_espania):
+    """
+    Versión de cada pestaña: la anterior si los cambios de los datos no afectan a sus
+    países (ni al mapa, en la de España); si no, la versión del contenido nuevo
+    """
+    versiones = {}
+    for tab in PESTANIAS:
+        conserva = anterior is not None and cambios is not None \
+            and not cambios.afecta(DEPENDENCIAS_PESTANIAS[tab]) \
+            and (tab != 'pestania-espania' or anterior.url_mapa_espania == url_mapa_espania)
+        versiones[tab] = anterior.versiones_pestanias[tab] if conserva else version_contenido
+    return versiones
+
+def devuelve_versiones_paises(anterior, cambios, paises, version):
+    """
+    Versión de los datos de cada país: la anterior si los cambios de los datos no le
+    afectan; si no, la versión nueva. Las figuras de la caché LRU se indexan por ellas
+    """
+    versiones = {}
+    for pais in paises:
+        conserva = anterior is not None and cambios is not None \
+            and pais in anterior.versiones_paises and not cambios.afecta([pais])
+        versiones[pais] = anterior.versiones_paises[pais] if conserva else version
+    return versiones
+
+def construye_estado(anterior=None, usa_snapshot=False):
+    """
+    Lee los datos y construye el estado completo del dashboard. Si la versión de los
+    datos no ha cambiado se devuelve el estado anterior.
+    """
+    carga_diferidos()
+    version, series_obsoletas, construye_cubo = fuente_datos(usa_snapshot=usa_snapshot)
+    url_mapa_espania, fecha_mapa_espania = publica_mapa_espania()
+    condados, error_condados = lee_condados_eeuu(anterior)
+    if anterior is not None and anterior.version == version \
+            and anterior.series_obsoletas == series_obsoletas \
+            and anterior.url_mapa_espania == url_mapa_espania \
+            and anterior.condados is condados:
+        return anterior
+    cubo = construye_cubo()
+    fecha_datos = datetime.strptime(cubo.fechas[-1], '%m/%d/%y')
+
+    # Totales globales (último día del agregado global)
+    confirmados_totales, fallecidos_totales, recuperados_totales = calculo_metricas_totales(*cubo.total)
+
+    # Obtengo infecciones de China
+    serie_CHINA, serie_CHINA_d, serie_CHINA_r = devuelve_dfs_localizacion_pais(cubo, 'China')
+    confirmados_china_totales, fallecidos_china_totales, recuperados_china_totales = calculo_metricas_totales(serie_CHINA, serie_CHINA_d, serie_CHINA_r)
+    # Obtengo infecciones de España
+    serie_ESP, serie_ESP_d, serie_ESP_r = devuelve_dfs_localizacion_pais(cubo, 'Spain')
+    confirmados_esp_totales, fallecidos_esp_totales, recuperados_esp_totales = calculo_metricas_totales(serie_ESP, serie_ESP_d, serie_ESP_r)
+    # Obtengo infecciones de fuera de China
+    serie_OTROS, serie_OTROS_d, serie_OTROS_r =  devuelve_dfs_localizacion_pais(cubo, 'China', flag_not=True)
+    confirmados_otros_totales, fallecidos_otros_totales, recuperados_otros_totales = calculo_metricas_totales(serie_OTROS, serie_OTROS_d, serie_OTROS_r)
+
+    # Casos totales por país (último día del agregado por país)
+    df_agrupado = pd.DataFrame({'Country/Region': cubo.paises, 
+                                'casos_totales': cubo.ultimo_por_pais(0)})
+
+    # Países más infectados después de China
+    df_mas_infectados = df_agrupado.loc[(df_agrupado['casos_totales']>CORTE_PAISES_MAS_INFECTADOS) 
+                                        & (df_agrupado['Country/Region']!='China')]
+    df_mas_infectados.reset_index(inplace=True)
+    # Países menos infectados
+    df_menos_infectados = df_agrupado.loc[(df_agrupado['casos_totales']<CORTE_PAISES_MENOS_INFECTADOS)]
+    df_menos_infectados.reset_index(inplace=True)
+    # Regiones (para el mapa) y estados de China
+    df_regiones = pd.DataFrame({'State': pd.Series(cubo.estados).replace('', np.nan), 
+                                'Country/Region': cubo.paises_region,
+                                'Lat': cubo.coordenadas[:, 0], 'Long': cubo.coordenadas[:, 1],
+                                'casos_totales': cubo.regiones[0, :, -1]})
+    df_china=df_regiones.loc[df_regiones['Country/Region']=='China']
+    df_china.reset_index(inplace=True)
+    # Países con más casos de cada día y métrica, para la carrera de barras
+    ranking = RankingPaises.calcula(cubo)
+    # Curvas logística y de Gompertz de la última ola de todas las filas, en un único lote
+    ajustes = AjustesCurvas.calcula(cubo)
+    HISTOGRAMA_AJUSTES.observa(ajustes.segundos)
+    # Mapa principal: vista filtrada una única vez y figura inicial con las regiones agrupadas
+    vista_mapa = VistaMapa.desde_cubo(cubo)
+    figura_mapa_principal = figura_mapa(vista_mapa.puntos(0), PLANTILLA)
+
+    # Filas del cubo de USA, Italia, España y Hubei, para las gráficas de tendencia fijas
+    filas_tendencia = dict(zip(['usa', 'italy', 'esp', 'hubei'], 
+                               cubo.filas_localizaciones(**LOCALIZACIONES_TENDENCIA).tolist()))
+    # Índice de todos los países y regiones con estado, para el desplegable de localizaciones
+    indice_localizaciones = cubo.localizaciones()
+    opciones_localizaciones = [{'label': etiqueta_localizacion(clave), 'value': clave} 
+                               for clave in sorted(indice_localizaciones)]
+    # Índice de rangos de fechas (los acumulados del cubo ya son sumas prefijas) y filas del
+    # cubo de las figuras de kpis y de barras que se recalculan al elegir un rango
+    indice_rangos = IndiceRangos(cubo)
+    filas_rangos = {'total': cubo.fila_total, 'china': int(cubo.fila_pais[cubo.indice_paises['China']]),
+                    'esp': filas_tendencia['esp'], 'estados_china': df_china['index'].to_numpy(dtype=np.intp),
+                    'paises': cubo.fila_pais[df_mas_infectados['index'].to_numpy(dtype=np.intp)]}
+
+    # Cambios respecto a la versión anterior: celdas revisadas, regiones nuevas o
+    # renombradas y anomalías. Las métricas derivadas sólo se calculan para los días
+    # nuevos y las filas revisadas
+    cambios = compara_cubos(anterior.cubo, cubo, anterior.huellas) if anterior is not None else None
+    huellas = cambios.huellas if cambios is not None else huellas_filas(cubo.regiones)
+    metricas = MetricasDerivadas.actualiza(anterior.metricas if anterior is not None else None, cubo, cambios)
+    version_contenido = '{0}/{1}'.format(version, url_mapa_espania.rsplit('/', 1)[-1])
+    versiones_pestanias = devuelve_versiones_pestanias(anterior, cambios, version_contenido, url_mapa_espania)
+    versiones_paises = devuelve_versiones_paises(anterior, cambios, cubo.paises.tolist(), version)
+
+
+    figura_kpis = devuelve_figura_con_kpis_doble([confirmados_totales, confirmados_esp_totales], 
+                                                 [fallecidos_totales,fallecidos_esp_totales], 
+                                                 [recuperados_totales,recuperados_esp_totales])
+
+    figura_kpis_china = devuelve_figura_con_kpis(confirmados_china_totales, 
+                                                 fallecidos_china_totales, 
+                                                 recuperados_china_totales)
+
+    figura_kpis_esp = devuelve_figura_con_kpis(confirmados_esp_totales, 
+                                                 fallecidos_esp_totales, 
+                                                 recuperados_esp_totales)
+
+    figura_kpis_otros = devuelve_figura_con_kpis(confirmados_otros_totales, 
+                                                 fallecidos_otros_totales, 
+                                                 recuperados_otros_totales)
+
+    return EstadoDashboard(
+        version=version, series_obsoletas=series_obsoletas, construido=time.time(),
+        url_mapa_espania=url_mapa_espania, fecha_mapa_espania=fecha_mapa_espania,
+        # Las pestañas cacheadas dependen de los datos y del mapa publicado
+        version_contenido=version_contenido, versiones_pestanias=versiones_pestanias,
+        versiones_paises=versiones_paises,
+        cambios=cambios, huellas=huellas,
+        dia_actualizacion=datetime.strftime(fecha_datos, '%-d del %-m de %Y'),
+        cubo=cubo, df_regiones=df_regiones, df_agrupado=df_agrupado, df_mas_infectados=df_mas_infectados,
+        df_menos_infectados=df_menos_infectados, df_china=df_china, ranking=ranking,
+        vista_mapa=vista_mapa, figura_mapa_principal=figura_mapa_principal,
+        metricas=metricas, ajustes=ajustes, filas_tendencia=filas_tendencia,
+        indice_localizaciones=indice_localizaciones, opciones_localizaciones=opciones_localizaciones,
+        indice_rangos=indice_rangos, marcas_rangos=indice_rangos.marcas(), filas_rangos=filas_rangos,
+        figura_kpis=figura_kpis, figura_kpis_china=figura_kpis_china,
+        figura_kpis_esp=figura_kpis_esp, figura_kpis_otros=figura_kpis_otros,
+        # Series por condado de EE. UU. (None si no están activadas)
+        condados=condados, error_condados=error_condados)
+
+# El estado se construye al arrancar y después se reconstruye en segundo plano y se
+# publica de forma atómica: cada callback lee REFRESCO.estado una única vez al empezar
+PLANO = PlanoCompartido(DIR_PLANO) if DIR_PLANO else None
+# Con plano compartido los procesos comprueban a menudo si hay una generación nueva;
+# sólo el líder vuelve a leer los datos, cada INTERVALO_REFRESCO segundos
+REFRESCO = RefrescoPeriodico(construye_estado, INTERVALO_PLANO if PLANO is not None and INTERVALO_REFRESCO > 0
+                                                else INTERVALO_REFRESCO,
+                             al_refrescar=lambda segundos, publicado: HISTOGRAMA_REFRESCO.observa(
+                                 segundos, resultado='nuevo' if publicado else 'sin_cambios'))
+
+def primer_refresco():
+    """Construye y publica el primer estado del proceso (del último snapshot si está al día)"""
+    REFRESCO.refresca(usa_snapshot=True)
+    ESTATICOS.limpia()
+
+# En arranque rápido el primer refresco se hace en segundo plano (arranca_refresco) y
+# mientras tanto se sirve la plantilla de espera
+if not ARRANQUE_RAPIDO:
+    primer_refresco()
+    if PLANO is not None:
+        # Si este es el maestro de gunicorn, el cerrojo no puede heredarse en los trabajadores
+        PLANO.suelta_liderazgo()
+
+def sin_datos():
+    """Respuesta 503 de los endpoints de datos mientras el primer refresco no ha terminado"""
+    respuesta = flask.jsonify(error='Los datos se están cargando')
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = '5'
+    return respuesta
+
+@server.route('/listo')
+def listo():
+    """
+    Comprobación de disponibilidad: 200 cuando hay datos que servir, 503 mientras se
+    cargan. Incluye los tiempos de arranque del proceso. El primer estado se publica
+    antes de calentar las cachés de pestañas: `pestanias_listas` indica si ya lo están
+    """
+    estado = REFRESCO.estado
+    respuesta = flask.jsonify(listo=estado is not None, arranque_rapido=ARRANQUE_RAPIDO, proceso=os.getpid(),
+                              importacion=DURACION_IMPORTACION,
+                              datos_listos=None if REFRESCO.primera_publicacion is None 
+                                           else REFRESCO.primera_publicacion - INICIO_IMPORTACION,
+                              pestanias_listas=REFRESCO.primer_calentamiento is not None,
+                              calentamiento_listo=None if REFRESCO.primer_calentamiento is None
+                                                  else REFRESCO.primer_calentamiento - INICIO_IMPORTACION,
+                              error_refresco=None if REFRESCO.ultimo_error is None else str(REFRESCO.ultimo_error))
+    respuesta.status_code = 200 if estado is not None else 503
+    return respuesta
+
+@server.route('/version-datos')
+def version_datos():
+    """
+    Versión de los datos servidos y momento del último refresco
+    """
+    estado = REFRESCO.estado
+    if estado is None:
+        return sin_datos()
+    return flask.jsonify(version=estado.version, 
+                         dia_actualizacion=estado.dia_actualizacion,
+                         series_obsoletas=estado.series_obsoletas,
+                         construido=estado.construido,
+                         proceso=os.getpid(),
+                         lider_plano=None if PLANO is None else PLANO.lider,
+                         ultimo_refresco=REFRESCO.ultimo_refresco,
+                         duracion_refresco=REFRESCO.duracion_refresco,
+                         error_refresco=None if REFRESCO.ultimo_error is None else str(REFRESCO.ultimo_error),
+                         ajustes=estado.ajustes.resumen(),
+                         condados=None if estado.condados is None else estado.condados.resumen(),
+                         error_condados=estado.error_condados)
+
+# API de datos de sólo lectura (JSON y CSV) con ETag por versión de los datos
+registra_api(server, lambda: REFRESCO.estado, sin_datos)
+
+@server.route('/cambios-datos')
+def cambios_datos():
+    """
+    Cambios de la versión servida respecto a la anterior: fechas nuevas, celdas
+    revisadas por región y métrica, regiones nuevas, eliminadas o renombradas,
+    anomalías y lo que se ha tenido que recalcular
+    """
+    estado = REFRESCO.estado
+    if estado is None:
+        return sin_datos()
+    if estado.cambios is None:
+        return flask.jsonify(version=estado.version, cambios=None)
+    return flask.jsonify(version=estado.version, cambios=estado.cambios.resumen(),
+                         filas_metricas_recalculadas=estado.metricas.filas_recalculadas,
+                         dias_metricas_calculados=estado.metricas.dias_calculados,
+                         versiones_pestanias=estado.versiones_pestanias)
 
 # *********************************************************************************************************
 # --------------------------- PLANTILLA PRINCIPAL DE DASH -------------------------------------------------
 # *********************************************************************************************************
-app.layout = html.Div([
-    # Inserto títulos
-    html.Div([
+def render_calentamiento():
+    """
+    Plantilla ligera mientras se cargan los datos en el arranque rápido: comprueba cada
+    segundo si ya hay estado y entonces recarga la página
+    """
+    return html.Div([
+        html.Div([
+            html.Br(),
+            html.H1(children='Dashboard de seguimiento del coronavirus'),
+            html.Div(children='''Cargando los datos, la página se actualizará en unos segundos...''',
+                     style = {'font-size':16,'font-family': "Helvetica Neue"}),
+            html.Br(),
+            ],style = {'textAlign':'center','font-family': "Helvetica Neue", 
+                       'background-color': '#1e1e1e', 'width': '100%','color':'#ffffff'}),
+        dcc.Interval(id='intervalo-calentamiento', interval=1000),
+        dcc.Location(id='recarga-calentamiento', refresh=True)])
+
+def render_layout():
+    """
+    Plantilla principal. Se evalúa en cada carga de página para mostrar siempre el último estado
+    """
+    estado = REFRESCO.estado
+    if estado is None:
+        return render_calentamiento()
+    return html.Div([
+        # Inserto títulos
+        html.Div([
+            html.Br(),
+            html.H1(children='Dashboard de seguimiento del coronavirus'),
+            html.Div(children=''''''),
+            html.Div(children='''Visualizaciones del incremento de infectados desde el 22 de enero de 2020''',
+                     style = {'font-size':16,'font-family': "Helvetica Neue"}),
+            html.Div(children='''Datos actualizados a día {0}'''.format(estado.dia_actualizacion),
+                     style = {'font-size':16,'font-family': "Helvetica Neue"}),
+            render_aviso_obsoletas(estado.series_obsoletas),
+            html.Br(),
+            ],style = {'textAlign':'center','font-family': "Helvetica Neue", 
+                       'background-color': '#1e1e1e', 'width': '100%','color':'#ffffff'}),
+        # Inserto el deslizador del rango de fechas de los kpis y las gráficas de barras
         html.Br(),
-        html.H1(children='Dashboard de seguimiento del coronavirus'),
-        html.Div(children=''''''),
-        html.Div(children='''Visualizaciones del incremento de infectados desde el 22 de enero de 2020''',
-                 style = {'font-size':16,'font-family': "Helvetica Neue"}),
-        html.Div(children='''Datos actualizados a día {0}'''.format(DIA_ACTUALIZACION),
-                 style = {'font-size':16,'font-family': "Helvetica Neue"}),
+        html.Div([
+            html.Div(id='texto-rango-fechas', children=texto_rango(estado.indice_rangos, 0, estado.indice_rangos.ultimo),
+                     style = {'textAlign':'center','font-size':16,'font-family': "Helvetica Neue"}),
+            dcc.RangeSlider(id='rango-fechas', min=0, max=estado.indice_rangos.ultimo, allowCross=False,
+                            value=[0, estado.indice_rangos.ultimo], marks=estado.marcas_rangos)],
+            style = {'width': '80%', 'margin': 'auto'}),
+        # Inserto figura con kpis
         html.Br(),
-        ],style = {'textAlign':'center','font-family': "Helvetica Neue", 
-                   'background-color': '#1e1e1e', 'width': '100%','color':'#ffffff'}),
-    # Inserto figura con kpis
-    html.Br(),
-    html.Div([
-    dcc.Graph(id='kpis',figure=figura_kpis,)], 
-        style = {'width': '100%', 'display': 'flex', 'align-items': 'center', 'justify-content': 'center'}),
+        html.Div([
+        dcc.Graph(id='kpis',figure=estado.figura_kpis,)], 
+            style = {'width': '100%', 'display': 'flex', 'align-items': 'center', 'justify-content': 'center'}),
     
-    # Inserto el mapa de infectados general
-    html.H3(children='Mapa de infectados por coronavirus desde el 22 de enero de 2020', 
-            style = {'textAlign':'center','font-family': "Helvetica Neue"}),
-    dcc.Graph(
-        id='mapa-principal',
-        figure= go.Figure(data=go.Scattergeo(
-        locationmode = 'ISO-3',
-        lon = df.loc[df['casos_totales']>0]['Long'],
-        lat = df.loc[df['casos_totales']>0]['Lat'],
-        text = 'Estado: ' + df.loc[df['casos_totales']>0]['State'].astype(str) \
-                + ' <br> Pais: ' + df.loc[df['casos_totales']>0]['Country/Region'].astype(str) \
-                + ' <br> Casos: ' + df.loc[df['casos_totales']>0]['casos_totales'].astype(str),
-        mode = 'markers',
-        marker = dict(
-            # Tamanio de los circulos en el mapa principal de contagios
-            size = np.sqrt(df.loc[df['casos_totales']>0]['casos_totales']/30)+10,
-            opacity = 0.8,
-            reversescale = True,
-            autocolorscale = False,
-            color='red',
-            line = dict(width=1,color='rgba(102, 102, 102)'))),
-                          layout=dict(geo = dict(showcountries = True), 
-                                      height=800, template=PLANTILLA, margin=dict(t=10)))),
-    # Inserto saltos de líneas
-    html.Br(),
-    html.Div(children=''''''),
-    html.Div(children=''''''),
+        # Inserto el mapa de infectados general
+        html.H3(children='Mapa de infectados por coronavirus desde el 22 de enero de 2020', 
+                style = {'textAlign':'center','font-family': "Helvetica Neue"}),
+        dcc.Graph(id='mapa-principal', figure=estado.figura_mapa_principal),
+        # Inserto saltos de líneas
+        html.Br(),
+        html.Div(children=''''''),
+        html.Div(children=''''''),
     
-    # Inserto pestañas de selección
-    dcc.Tabs(id="menu-pestanias", value='pestania-consejos',
-             children=[
-                 dcc.Tab(label='China', id='tab1', value='pestania-china', style=ESTILO_PESTANIA, 
-                         selected_style=ESTILO_SELECCIONADA),
-                 dcc.Tab(label=u'España', id='tab3', value='pestania-espania', style=ESTILO_PESTANIA, 
-                         selected_style=ESTILO_SELECCIONADA),
-                 dcc.Tab(label='Fuera de China', id='tab2',value='pestania-out-china', style=ESTILO_PESTANIA,
-                         selected_style=ESTILO_SELECCIONADA),
-                 dcc.Tab(label='Edad y patologías', id='tab4',value='pestania-edad-patologias', style=ESTILO_PESTANIA,
-                         selected_style=ESTILO_SELECCIONADA),
-                 dcc.Tab(label='Consejos básicos', id='tab5',value='pestania-consejos', style=ESTILO_PESTANIA,
-                         selected_style=ESTILO_SELECCIONADA),
-                 dcc.Tab(label='Análisis 5/5/2020', id='tab6',value='pestania-analisis', style=ESTILO_PESTANIA,
-                         selected_style=ESTILO_SELECCIONADA),
-             ], style=ESTILO_PESTANIAS),
-    # Inserto el contenido de la pestaña seleccionada
-    html.Div(id='contenido-pestanias'),
-    # Inserto footer
-    render_footer()])
+        # Inserto pestañas de selección
+        dcc.Tabs(id="menu-pestanias", value='pestania-consejos',
+                 children=[
+                     dcc.Tab(label='China', id='tab1', value='pestania-china', style=ESTILO_PESTANIA, 
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label=u'España', id='tab3', value='pestania-espania', style=ESTILO_PESTANIA, 
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label='Fuera de China', id='tab2',value='pestania-out-china', style=ESTILO_PESTANIA,
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label='Edad y patologías', id='tab4',value='pestania-edad-patologias', style=ESTILO_PESTANIA,
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label='Consejos básicos', id='tab5',value='pestania-consejos', style=ESTILO_PESTANIA,
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label='Análisis 5/5/2020', id='tab6',value='pestania-analisis', style=ESTILO_PESTANIA,
+                             selected_style=ESTILO_SELECCIONADA),
+                     dcc.Tab(label='Por país', id='tab7',value='pestania-paises', style=ESTILO_PESTANIA,
+                             selected_style=ESTILO_SELECCIONADA),
+                 ], style=ESTILO_PESTANIAS),
+        # Inserto el contenido de la pestaña seleccionada
+        html.Div(id='contenido-pestanias'),
+        # Inserto footer
+        render_footer()] + ([dcc.Store(id='datos-pestanias', data=datos_pestanias_cliente(estado))]
+                            if PESTANIAS_EN_CLIENTE else []))
+
+@app.callback(Output('recarga-calentamiento', 'href'), [Input('intervalo-calentamiento', 'n_intervals')])
+def comprueba_calentamiento(n_intervals):
+    if REFRESCO.estado is None:
+        raise PreventUpdate
+    return '/'
+
+# *********************************************************************************************************
+# --------------------------- CALLBACK DEL DETALLE DEL MAPA -----------------------------------------------
+# *********************************************************************************************************
+@app.callback(Output('mapa-principal', 'figure'),[Input('mapa-principal', 'relayoutData')])
+def actualiza_detalle_mapa(relayout):
+    """
+    Al hacer zoom o desplazar el mapa se cambia el nivel de agrupación y, con zoom
+    suficiente, se envían las regiones individuales de la zona visible
+    """
+    zona = ventana_relayout(relayout)
+    if zona is None:
+        raise PreventUpdate
+    nivel, ventana = zona
+    estado = REFRESCO.estado
+    if nivel == 0:
+        return estado.figura_mapa_principal
+    return figura_mapa(estado.vista_mapa.puntos(nivel, ventana if nivel >= NIVEL_DETALLE else None), PLANTILLA)
+
+
+# *********************************************************************************************************
+# --------------------------- CALLBACKS DEL DETALLE DE LAS TENDENCIAS -------------------------------------
+# *********************************************************************************************************
+# Las gráficas de tendencia están dentro de las pestañas, no en la plantilla inicial
+app.config.suppress_callback_exceptions = True
+
+def registra_callback_tendencia(id_grafica, localizacion, titulo_eje_y):
+    @app.callback(Output(id_grafica, 'figure'),
+                  [Input(id_grafica, 'relayoutData'), Input(id_grafica + '-vista', 'value')])
+    def actualiza_detalle_tendencia(relayout, vista):
+        """
+        Al cambiar de vista se envía la vista general de la métrica elegida; al hacer
+        zoom en el eje x, la ventana visible a resolución completa
+        """
+        estado = REFRESCO.estado
+        disparadores = [disparador['prop_id'] for disparador in dash.callback_context.triggered]
+        if id_grafica + '-vista.value' in disparadores:
+            return devuelve_figura_tendencia(estado, localizacion, titulo_eje_y, vista=vista)
+        ventana = ventana_relayout_fechas(relayout, estado.cubo.dias)
+        if ventana is None:
+            raise PreventUpdate
+        return devuelve_figura_tendencia(estado, localizacion, titulo_eje_y,
+                                         None if ventana == 'completa' else ventana, vista)
+    return actualiza_detalle_tendencia
 
+for id_grafica, (localizacion, titulo_eje_y) in GRAFICAS_TENDENCIA.items():
+    registra_callback_tendencia(id_grafica, localizacion, titulo_eje_y)
+
+# *********************************************************************************************************
+# --------------------------- CALLBACK DE LA PESTAÑA POR PAÍS ---------------------------------------------
+# *********************************************************************************************************
+# Figuras ya serializadas por (versión de los países de los que dependen, localización,
+# vista, ventana). Las de los países más consultados se sirven sin volver a construirlas
+# y las de los países a los que no afecta un cambio de los datos siguen valiendo
+CACHE_FIGURAS = CacheLRU(TAMANIO_CACHE_FIGURAS)
+
+def version_figura(estado, paises=None):
+    """Versión de una figura que depende de los datos de `paises` (None: de todos)"""
+    if paises is None:
+        return estado.version
+    return '|'.join(estado.versiones_paises.get(pais, estado.version) for pais in paises)
+
+def version_localizacion(estado, clave):
+    return version_figura(estado, [clave.rsplit(SEPARADOR_LOCALIZACION, 1)[-1]])
+
+def figura_kpis_localizacion(estado, clave, inicio=0, fin=None):
+    """Kpis de una localización con los casos de los días [inicio, fin] (por defecto, todos)"""
+    fin = estado.indice_rangos.ultimo if fin is None else fin
+    def construye():
+        casos = estado.indice_rangos.totales(inicio, fin, estado.indice_localizaciones[clave])
+        return serializa_componentes(devuelve_figura_con_kpis(*casos.tolist()))
+    return CACHE_FIGURAS.obtiene((version_localizacion(estado, clave), 'kpis', clave, inicio, fin), construye)
+
+def figura_tendencia_localizacion(estado, clave, vista='acumulados', ventana=None):
+    def construye():
+        return serializa_componentes(figura_tendencia(estado, estado.indice_localizaciones[clave], 
+                                                      'Población acumulada', ventana, vista, clave))
+    return CACHE_FIGURAS.obtiene((version_localizacion(estado, clave), 'tendencia', clave, vista, ventana), construye)
+
+@app.callback([Output('kpis-localizacion', 'figure'), Output('tendencia-localizacion', 'figure')],
+              [Input('selector-localizacion', 'value'), Input('tendencia-localizacion', 'relayoutData'),
+               Input('tendencia-localizacion-vista', 'value'), Input('rango-fechas', 'value')])
+def actualiza_localizacion(clave, relayout, vista, rango):
+    """
+    Al elegir otra localización se envían sus kpis y su tendencia; al cambiar el rango de
+    fechas, sus kpis en ese rango; al cambiar de vista, la vista general de la métrica
+    elegida; al hacer zoom, la ventana visible a resolución completa. Las series salen de
+    una fila del cubo y los kpis del índice de rangos: coste constante
+    """
+    estado = REFRESCO.estado
+    if clave not in estado.indice_localizaciones:
+        raise PreventUpdate
+    inicio, fin = estado.indice_rangos.acota(rango)
+    disparadores = [disparador['prop_id'] for disparador in dash.callback_context.triggered]
+    if 'selector-localizacion.value' in disparadores:
+        return figura_kpis_localizacion(estado, clave, inicio, fin), figura_tendencia_localizacion(estado, clave, vista)
+    if 'rango-fechas.value' in disparadores:
+        return figura_kpis_localizacion(estado, clave, inicio, fin), dash.no_update
+    if 'tendencia-localizacion-vista.value' in disparadores:
+        return dash.no_update, figura_tendencia_localizacion(estado, clave, vista)
+    ventana = ventana_relayout_fechas(relayout, estado.cubo.dias)
+    if ventana is None:
+        if estado.indice_rangos.completo(inicio, fin):
+            raise PreventUpdate
+        # Pestaña cargada con un rango de fechas ya elegido
+        return figura_kpis_localizacion(estado, clave, inicio, fin), dash.no_update
+    return dash.no_update, figura_tendencia_localizacion(estado, clave, vista, 
+                                                         None if ventana == 'completa' else ventana)
+
+def figura_carrera_paises(estado, metrica='confirmados'):
+    def construye():
+        return serializa_componentes(estado.ranking.figura_carrera(metrica, PLANTILLA_FIGURAS))
+    return CACHE_FIGURAS.obtiene((version_figura(estado), 'carrera', metrica), construye)
+
+@app.callback(Output('carrera-paises', 'figure'), [Input('ranking-metrica', 'value')])
+def actualiza_carrera_paises(metrica):
+    """Carrera de barras de la métrica elegida, construida desde el ranking del refresco"""
+    disparadores = [disparador['prop_id'] for disparador in dash.callback_context.triggered]
+    if metrica not in METRICAS or 'ranking-metrica.value' not in disparadores:
+        raise PreventUpdate
+    return figura_carrera_paises(REFRESCO.estado, metrica)
+
+# *********************************************************************************************************
+# --------------------------- CALLBACKS DEL RANGO DE FECHAS -----------------------------------------------
+# *********************************************************************************************************
+# Los kpis y las barras de cada rango salen del índice de rangos (dos columnas del cubo por
+# consulta) y se guardan ya serializados en la caché de figuras por (versión, figura, rango)
+# Países de los que depende cada figura de rango; las demás (el total, todo menos China y
+# los países con más casos) dependen de todos
+DEPENDENCIAS_RANGOS = {'china': ['China'], 'esp': ['Spain'], 'estados_china': ['China']}
+
+def rango_disparado(estado, rango):
+    """
+    (inicio, fin) del rango del deslizador. Al cargar la página o una pestaña con el rango
+    completo no hay nada que actualizar: sus figuras ya son las de todos los días.
+    Los callbacks de las pestañas tienen además como entrada el id de un componente de
+    la pestaña: el deslizador está en la cabecera y Dash sólo dispara al montar la
+    pestaña los callbacks con alguna entrada dentro de ella
+    """
+    inicio, fin = estado.indice_rangos.acota(rango)
+    disparadores = [disparador['prop_id'] for disparador in dash.callback_context.triggered]
+    if estado.indice_rangos.completo(inicio, fin) and 'rango-fechas.value' not in disparadores:
+        raise PreventUpdate
+    return inicio, fin
+
+def figura_rango(estado, nombre, inicio, fin, construye, paises=None):
+    """Figura de un rango guardada por la versión de los países de los que depende (None: todos)"""
+    return CACHE_FIGURAS.obtiene((version_figura(estado, paises), 'rango', nombre, inicio, fin),
+                                 lambda: serializa_componentes(construye()))
+
+def figura_kpis_rango(estado, nombre, inicio, fin):
+    """Kpis de una pestaña ('china', 'esp' u 'otros', todo menos China) con los casos del rango"""
+    def construye():
+        filas = estado.filas_rangos
+        totales = estado.indice_rangos.totales(inicio, fin, [filas['total'], filas['china'], filas['esp']])
+        casos = {'china': totales[:, 1], 'esp': totales[:, 2], 'otros': totales[:, 0] - totales[:, 1]}[nombre]
+        return devuelve_figura_con_kpis(*casos.tolist())
+    return figura_rango(estado, 'kpis-' + nombre, inicio, fin, construye, DEPENDENCIAS_RANGOS.get(nombre))
+
+def figura_barras_rango(estado, nombre, x, inicio, fin, **layout):
+    """Barras de confirmados en el rango de las filas de estado.filas_rangos[nombre]"""
+    def construye():
+        return devuelve_figura_barras(x, estado.indice_rangos.totales(inicio, fin, estado.filas_rangos[nombre])[0].tolist(),
+                                      **layout)
+    return figura_rango(estado, 'barras-' + nombre, inicio, fin, construye, DEPENDENCIAS_RANGOS.get(nombre))
+
+@app.callback([Output('kpis', 'figure'), Output('texto-rango-fechas', 'children')], [Input('rango-fechas', 'value')])
+def actualiza_kpis_rango(rango):
+    """Kpis globales y de España con los casos del rango de fechas elegido"""
+    estado = REFRESCO.estado
+    inicio, fin = rango_disparado(estado, rango)
+    def construye():
+        filas = estado.filas_rangos
+        return devuelve_figura_con_kpis_doble(*estado.indice_rangos.totales(inicio, fin, [filas['total'], filas['esp']]).tolist())
+    return figura_rango(estado, 'kpis', inicio, fin, construye), texto_rango(estado.indice_rangos, inicio, fin)
+
+@app.callback([Output('kpis-china', 'figure'), Output('example-graph1', 'figure')],
+              [Input('rango-fechas', 'value'), Input('kpis-china', 'id')])
+def actualiza_china_rango(rango, _):
+    estado = REFRESCO.estado
+    inicio, fin = rango_disparado(estado, rango)
+    return (figura_kpis_rango(estado, 'china', inicio, fin), 
+            figura_barras_rango(estado, 'estados_china', estado.df_china['State'].tolist(), inicio, fin))
+
+@app.callback([Output('kpis-otros', 'figure'), Output('example-graph3', 'figure')],
+              [Input('rango-fechas', 'value'), Input('kpis-otros', 'id')])
+def actualiza_otros_rango(rango, _):
+    estado = REFRESCO.estado
+    inicio, fin = rango_disparado(estado, rango)
+    return (figura_kpis_rango(estado, 'otros', inicio, fin),
+            figura_barras_rango(estado, 'paises', estado.df_mas_infectados['Country/Region'].tolist(), inicio, fin,
+                                yaxis_title="Población total infectada"))
+
+@app.callback(Output('kpis-espania', 'figure'),
+              [Input('rango-fechas', 'value'), Input('kpis-espania', 'id')])
+def actualiza_espania_rango(rango, _):
+    estado = REFRESCO.estado
+    inicio, fin = rango_disparado(estado, rango)
+    return figura_kpis_rango(estado, 'esp', inicio, fin)
 
 # *********************************************************************************************************
 # --------------------------- CALLBACK DE LA PESTAÑA DE SELECCIÓN -----------------------------------------
 # *********************************************************************************************************
-@app.callback(Output('contenido-pestanias', 'children'),[Input('menu-pestanias', 'value')])
-def render_content(tab):
+def construye_pestania(tab, estado):
+    """
+    Construye el contenido de una pestaña a partir de un estado del dashboard
+    """
     # Pestaña China
     if tab == 'pestania-china':
         return html.Div(children=[
@@ -364,27 +1066,14 @@ def render_content(tab):
             html.Br(),
             html.Br(),
             # Inserto figuras con kpis de china
-            dcc.Graph(id='kpis', figure=figura_kpis_china),
+            dcc.Graph(id='kpis-china', figure=estado.figura_kpis_china),
             html.Div(children=''''''),
             # Inserto la tendencia de infectados
             html.H4(children='Tendencia de infectados en Hubei (estado con más casos)', 
                     style = {'textAlign':'center','font-family': "Helvetica Neue"}),
-            dcc.Graph(
-                id='example-scatter',
-                figure=go.Figure(data = [
-                    go.Scatter(
-                        x=x, y=y_hubei, mode='lines+markers',name='Casos confirmados',
-                        marker_color='rgba(152, 0, 0, .8)'),
-                    go.Scatter(x=x,y=y_hubei_d, name='Fallecimientos', 
-                               mode='lines+markers',
-                               marker_color='rgb(231, 99, 250)'),
-                    go.Scatter(x=x,y=y_hubei_r, name='Casos sanados',
-                               mode='lines+markers',
-                               marker_color='rgb(17, 157, 255)')],
-                 layout = go.Layout(margin=dict(t=10),height=600,
-                                    xaxis = dict(range = [a_tiempo_unix(datetime(2020, 1, 21)),
-                                                          a_tiempo_unix(datetime.now())]),
-                                    template=PLANTILLA, yaxis_title="Población acumulada (en miles)"))),
+            selector_vista_tendencia('example-scatter'),
+            dcc.Graph(id='example-scatter',
+                      figure=devuelve_figura_tendencia(estado, *GRAFICAS_TENDENCIA['example-scatter'])),
 
             # Inserto separación
             html.Div(children=''''''),
@@ -392,18 +1081,15 @@ def render_content(tab):
             html.H4(children='Infectados por coronavirus en estados de China', 
                     style = {'textAlign':'center','font-family': "Helvetica Neue"}),
             dcc.Graph(id='example-graph1',
-                      figure=go.Figure(data=[go.Bar(
-                          x=df_china['State'].tolist(), y=df_china['casos_totales'].tolist(),
-                          text=df_china['casos_totales'].tolist(),textposition='auto',)],
-                                       layout=go.Layout(height=600,margin=dict(t=10),
-                                                        template=PLANTILLA))),])
+                      figure=devuelve_figura_barras(estado.df_china['State'].tolist(), 
+                                                    estado.df_china['casos_totales'].tolist())),])
     # Pestaña fuera de China
     elif tab == 'pestania-out-china':
         return html.Div(children=[
         html.Br(),
         html.Br(),
         # Inserto figura con kpis de otros países
-        dcc.Graph(id='kpis', figure=figura_kpis_otros),
+        dcc.Graph(id='kpis-otros', figure=estado.figura_kpis_otros),
         html.Div(children=''''''),
             
         # Inserto infectados en otros países del mundo
@@ -411,40 +1097,27 @@ def render_content(tab):
                 style = {'textAlign':'center','font-family': "Helvetica Neue"}),
         dcc.Graph(
         id='example-graph3',
-        figure=go.Figure(data=[go.Bar(
-            x=df_mas_infectados['Country/Region'].tolist(), 
-            y=df_mas_infectados['casos_totales'].tolist(),
-            text=df_mas_infectados['casos_totales'].tolist(),
-            textposition='auto',
-        )],layout=go.Layout(height=600,margin=dict(t=10),
-                            template=PLANTILLA, yaxis_title="Población total infectada"))),
+        figure=devuelve_figura_barras(estado.df_mas_infectados['Country/Region'].tolist(), 
+                                      estado.df_mas_infectados['casos_totales'].tolist(),
+                                      yaxis_title="Población total infectada")),
+        html.Div(children=''''''),
+
+        # Inserto la carrera de barras de los países con más casos de cada día
+        html.H4(children='Evolución de los {0} países con más casos'.format(PUESTOS_RANKING), 
+                style = {'textAlign':'center','font-family': "Helvetica Neue"}),
+        dcc.RadioItems(id='ranking-metrica', value='confirmados',
+                       options=[{'label': TITULOS_METRICAS[metrica], 'value': metrica} for metrica in METRICAS],
+                       labelStyle={'display': 'inline-block', 'margin-right': '15px'},
+                       style={'textAlign': 'center', 'font-family': "Helvetica Neue"}),
+        dcc.Graph(id='carrera-paises', figure=figura_carrera_paises(estado)),
         html.Div(children=''''''),
             
         # Inserto tendencia en Italia
         html.H4(children='Tendencia de infectados por coronavirus en Italia', 
                 style = {'textAlign':'center','font-family': "Helvetica Neue"}),
-        dcc.Graph(
-            id='example-scatter2',
-            figure=go.Figure(data = [go.Scatter(
-            x=x,
-            y=y_italy,
-            name='Casos confirmados',
-            mode='lines+markers',
-            marker_color='rgba(152, 0, 0, .8)'), go.Scatter(
-            x=x,
-            y=y_italy_d,
-            name='Fallecimientos',
-            mode='lines+markers',
-            marker_color='rgb(231, 99, 250)'),go.Scatter(
-            x=x,
-            y=y_italy_r,
-            name='Casos sanados',
-            mode='lines+markers',
-            marker_color='rgb(17, 157, 255)')],
-            layout = go.Layout(yaxis_title="Población acumulada", height=600,xaxis = dict(
-                    range = [a_tiempo_unix(datetime(2020, 1, 21)),
-                                a_tiempo_unix(datetime.now())]
-                                ), template=PLANTILLA, margin=dict(t=10)))),
+        selector_vista_tendencia('example-scatter2'),
+        dcc.Graph(id='example-scatter2',
+                  figure=devuelve_figura_tendencia(estado, *GRAFICAS_TENDENCIA['example-scatter2'])),
             # Inserto separación
             html.Div(children=''''''),
             html.Div(children=[
@@ -454,8 +1127,8 @@ def render_content(tab):
                 figure={
                     'data': [
                         go.Pie(
-                            labels=list(df_mas_infectados['Country/Region']),
-                            values=list(df_mas_infectados['casos_totales']),
+                            labels=list(estado.df_mas_infectados['Country/Region']),
+                            values=list(estado.df_mas_infectados['casos_totales']),
                             hoverinfo='label+value+percent')],
                     'layout':{
                         'showlegend':True,
@@ -473,8 +1146,8 @@ def render_content(tab):
                     figure={
                         'data': [
                             go.Pie(
-                                labels=list(df_menos_infectados['Country/Region']),
-                                values=list(df_menos_infectados['casos_totales']),
+                                labels=list(estado.df_menos_infectados['Country/Region']),
+                                values=list(estado.df_menos_infectados['casos_totales']),
                                 hoverinfo='label+value+percent'
                             )
                         ],
@@ -496,33 +1169,21 @@ def render_content(tab):
             html.Br(),
             html.Br(),
             # Inserto kpis para España
-            dcc.Graph(id='kpis',figure=figura_kpis_esp),
+            dcc.Graph(id='kpis-espania',figure=estado.figura_kpis_esp),
             # Inserto tendencia de infectados en España
             html.Div(children=''''''),
             html.H4(children='Tendencia de infectados en España', 
                     style = {'textAlign':'center','font-family': "Helvetica Neue"}),
-            dcc.Graph(
-                id='example-scatter3',
-                figure=go.Figure(data = [
-                    go.Scatter(
-                        x=x,y=y_esp,mode='lines+markers',name='Casos confirmados',
-                        marker_color='rgba(152, 0, 0, .8)'),
-                    go.Scatter(
-                        x=x,y=y_esp_d,name='Fallecimientos',mode='lines+markers',
-                        marker_color='rgb(231, 99, 250)'),
-                    go.Scatter(
-                        x=x,y=y_esp_r,name='Casos sanados',mode='lines+markers',
-                        marker_color='rgb(17, 157, 255)')],
-                 layout = go.Layout(margin=dict(t=10),height=600,
-                        xaxis = dict(range = [a_tiempo_unix(datetime(2020, 1, 21)),
-                                              a_tiempo_unix(datetime.now())]),
-                        template=PLANTILLA, yaxis_title="Población acumulada"))),
+            selector_vista_tendencia('example-scatter3'),
+            dcc.Graph(id='example-scatter3',
+                      figure=devuelve_figura_tendencia(estado, *GRAFICAS_TENDENCIA['example-scatter3'])),
             html.Div(children=''''''),
             
             # Inserto mapa de infectados por comunidad autónoma en html
-            html.H4(children='Infectados en España por comunidad autónoma (actualizado el 16 de abril de 2020)', 
+            html.H4(children='Infectados en España por comunidad autónoma (actualizado el {0})'.format(
+                        estado.fecha_mapa_espania or '-'), 
                     style = {'textAlign':'center','font-family': "Helvetica Neue"}),
-            html.Iframe(srcDoc = open('infectados_espania.html', 'r').read(),
+            html.Iframe(src = estado.url_mapa_espania,
                         style={'width': '80%', 'height':800, 'padding-left':'10%', 'border': 'white'}),  
             html.Br(),
         ])
@@ -569,6 +1230,24 @@ def render_content(tab):
                                   go.Scatter(x=PATOLOGIAS,y=RATIOS_PATOLOGIAS)],
                                  layout = go.Layout(margin=dict(t=10), template=PLANTILLA,
                                                     yaxis_title="Tasa de mortalidad (%)",showlegend=False))),])
+    # Pestaña por país: cualquier país o región con estado
+    elif tab == 'pestania-paises':
+        clave = LOCALIZACION_POR_DEFECTO if LOCALIZACION_POR_DEFECTO in estado.indice_localizaciones \
+            else estado.opciones_localizaciones[0]['value']
+        return html.Div(children=[
+            html.Br(),
+            html.Br(),
+            # Inserto el desplegable con todos los países y regiones
+            dcc.Dropdown(id='selector-localizacion', options=estado.opciones_localizaciones, value=clave,
+                         clearable=False, style={'width': '50%', 'margin': 'auto'}),
+            # Inserto kpis y tendencia de la localización elegida
+            dcc.Graph(id='kpis-localizacion', figure=figura_kpis_localizacion(estado, clave)),
+            html.Div(children=''''''),
+            html.H4(children='Tendencia de infectados', 
+                    style = {'textAlign':'center','font-family': "Helvetica Neue"}),
+            selector_vista_tendencia('tendencia-localizacion'),
+            dcc.Graph(id='tendencia-localizacion', figure=figura_tendencia_localizacion(estado, clave)),
+        ])
     elif tab == 'pestania-analisis':
         return html.Div(children=[
             html.Br(),
@@ -626,6 +1305,128 @@ def render_content(tab):
                     style = {'font-size':20,'font-family': "Helvetica Neue"}),
             html.Br(),])
 
+# Las pestañas se guardan ya serializadas por (pestaña, versión del contenido) y se
+# precalculan en cada refresco antes de publicar el estado nuevo
+CACHE_PESTANIAS = CacheVersionada()
+CACHE_RESPUESTAS = CacheVersionada()
+CACHE_CLIENTE = CacheVersionada()
+
+def contenido_pestania(estado, tab):
+    return CACHE_PESTANIAS.obtiene(tab, version_pestania(estado, tab),
+                                   lambda: serializa_componentes(construye_pestania(tab, estado)))
+
+def render_content(tab):
+    if tab not in PESTANIAS:
+        raise PreventUpdate
+    return contenido_pestania(REFRESCO.estado, tab)
+
+def version_pestania(estado, tab):
+    return estado.versiones_pestanias.get(tab, estado.version_contenido)
+
+def separa_plantillas(nodo, plantillas):
+    """
+    Copia de un árbol serializado en la que la plantilla de cada figura se sustituye por
+    {'indice_plantilla': i}, su posición en `plantillas` (cada plantilla distinta una vez)
+    """
+    if isinstance(nodo, list):
+        return [separa_plantillas(elemento, plantillas) for elemento in nodo]
+    if not isinstance(nodo, dict):
+        return nodo
+    copia = {}
+    for clave, valor in nodo.items():
+        if clave == 'template' and isinstance(valor, dict):
+            if valor not in plantillas:
+                plantillas.append(valor)
+            copia[clave] = {'indice_plantilla': plantillas.index(valor)}
+        else:
+            copia[clave] = separa_plantillas(valor, plantillas)
+    return copia
+
+def datos_pestanias_cliente(estado):
+    """
+    Contenido del almacén 'datos-pestanias': todas las pestañas ya serializadas y las
+    plantillas de sus figuras, que se envían una sola vez y se reponen en el navegador
+    """
+    def construye():
+        plantillas = []
+        pestanias = {tab: separa_plantillas(contenido_pestania(estado, tab), plantillas) for tab in PESTANIAS}
+        return {'plantillas': plantillas, 'pestanias': pestanias}
+    version = '|'.join(version_pestania(estado, tab) for tab in PESTANIAS)
+    return CACHE_CLIENTE.obtiene('pestanias', version, construye)
+
+if PESTANIAS_EN_CLIENTE:
+    app.clientside_callback(ClientsideFunction(namespace='pestanias', function_name='muestra'),
+                            Output('contenido-pestanias', 'children'),
+                            [Input('menu-pestanias', 'value')], [State('datos-pestanias', 'data')])
+else:
+    app.callback(Output('contenido-pestanias', 'children'),[Input('menu-pestanias', 'value')])(render_content)
+
+def calienta_cache_pestanias(estado):
+    # Sólo se construyen las pestañas cuya versión ha cambiado
+    CACHE_PESTANIAS.calienta(estado.versiones_pestanias, 
+                             lambda tab: serializa_componentes(construye_pestania(tab, estado)))
+    if PESTANIAS_EN_CLIENTE:
+        datos_pestanias_cliente(estado)
+
+# Respuesta HTTP completa del callback de pestañas: un cambio de pestaña es una consulta a un diccionario
+instala_cache_respuestas(server, CACHE_RESPUESTAS, 'contenido-pestanias.children', PESTANIAS,
+                         lambda tab: version_pestania(REFRESCO.estado, tab))
+
+@server.route('/estadisticas-cache')
+def estadisticas_cache():
+    """
+    Aciertos y fallos de las cachés de pestañas y de figuras por país
+    """
+    return flask.jsonify(pestanias=CACHE_PESTANIAS.estadisticas(), 
+                         respuestas=CACHE_RESPUESTAS.estadisticas(),
+                         cliente=CACHE_CLIENTE.estadisticas(),
+                         figuras=CACHE_FIGURAS.estadisticas())
+
+@REGISTRO.recolector
+def metricas_caches_y_refresco():
+    """
+    Contadores de las cachés, estado del refresco y memoria de la ingesta por condados,
+    leídos al consultar /metrics
+    """
+    caches = {'pestanias': CACHE_PESTANIAS, 'respuestas': CACHE_RESPUESTAS, 'cliente': CACHE_CLIENTE, 
+              'figuras': CACHE_FIGURAS}
+    estado = REFRESCO.estado
+    condados = estado.condados if estado is not None else None
+    return [('covid_cache_aciertos_total', 'counter', 'Aciertos de cada caché', 
+             [({'cache': nombre}, cache.aciertos) for nombre, cache in caches.items()]),
+            ('covid_cache_fallos_total', 'counter', 'Fallos de cada caché', 
+             [({'cache': nombre}, cache.fallos) for nombre, cache in caches.items()]),
+            ('covid_refresco_errores_total', 'counter', 'Refrescos de los datos fallidos', [({}, REFRESCO.errores)]),
+            ('covid_refresco_ultimo_timestamp_segundos', 'gauge', 'Momento del último refresco correcto', 
+             [({}, REFRESCO.ultimo_refresco)]),
+            ('covid_datos_listos', 'gauge', '1 si hay datos que servir', [({}, int(estado is not None))]),
+            ('covid_condados_ingesta_pico_bytes', 'gauge', 
+             'Memoria de trabajo máxima contabilizada en la última ingesta por condados', 
+             [({}, None if condados is None else condados.pico_bytes)]),
+            ('covid_condados_cubo_bytes', 'gauge', 'Bytes de los valores del cubo de condados',
+             [({}, None if condados is None else condados.cubo.valores.nbytes)])]
+
+# *********************************************************************************************************
+# --------------------------- ARRANQUE DEL REFRESCO -------------------------------------------------------
+# *********************************************************************************************************
+REFRESCO.suscribe(calienta_cache_pestanias)
+if REFRESCO.estado is not None:
+    calienta_cache_pestanias(REFRESCO.estado)
+# La plantilla se asigna al final: usa las cachés de pestañas para el almacén del cliente
+app.layout = render_layout
+
+def arranca_refresco():
+    """
+    Arranca el refresco en segundo plano de este proceso. En arranque rápido el hilo
+    empieza construyendo el primer estado
+    """
+    REFRESCO.inicia(primer_refresco if REFRESCO.estado is None else None)
+
+DURACION_IMPORTACION = time.time() - INICIO_IMPORTACION
+
+if not REFRESCO_EN_TRABAJADORES:
+    arranca_refresco()
+
 # *********************************************************************************************************
 # ---------------------- MAIN -----------------------------------------------------------------------------
 # *********************************************************************************************************
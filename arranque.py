@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Arranque rápido del dashboard.
+
+Con COVID_ARRANQUE_RAPIDO=1 el servidor está listo para responder en cuanto se importan
+Dash y Flask: pandas y numpy se registran como módulos diferidos (no se ejecutan hasta
+el primer acceso a uno de sus atributos) y los datos y las figuras se construyen en un
+hilo en segundo plano. Mientras tanto se sirve una plantilla ligera de espera.
+"""
+import importlib.util
+import os
+import sys
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+ARRANQUE_RAPIDO = os.environ.get('COVID_ARRANQUE_RAPIDO') == '1'
+MODULOS_DIFERIDOS = ('numpy', 'pandas')
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+class _ModuloDiferido(importlib.util._LazyModule):
+    """
+    Módulo de LazyLoader que no se carga al consultar __spec__: la maquinaria de import
+    lo consulta en cada `import numpy` y cargaría el módulo en la primera importación
+    """
+    def __getattribute__(self, atributo):
+        if atributo == '__spec__':
+            return object.__getattribute__(self, '__dict__')['__spec__']
+        return super().__getattribute__(atributo)
+
+
+def importa_diferido(nombre):
+    """
+    Registra el módulo en sys.modules sin ejecutarlo: se carga en el primer acceso a un
+    atributo. Los `import` posteriores de cualquier módulo reciben el módulo diferido.
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    especificacion = importlib.util.find_spec(nombre)
+    if especificacion is None:
+        raise ImportError('No se encuentra el módulo {0}'.format(nombre))
+    cargador = importlib.util.LazyLoader(especificacion.loader)
+    especificacion.loader = cargador
+    modulo = importlib.util.module_from_spec(especificacion)
+    sys.modules[nombre] = modulo
+    cargador.exec_module(modulo)
+    modulo.__class__ = _ModuloDiferido
+    return modulo
+
+def difiere_importaciones(modulos=MODULOS_DIFERIDOS):
+    """Registra como diferidos los módulos pesados que sólo hacen falta para los datos"""
+    for nombre in modulos:
+        importa_diferido(nombre)
+
+def carga_diferidos(modulos=MODULOS_DIFERIDOS):
+    """
+    Fuerza la carga de los módulos diferidos. Se llama desde el hilo que construye los
+    datos antes de usarlos, para que la carga no coincida con la de otro hilo.
+    """
+    for nombre in modulos:
+        modulo = sys.modules.get(nombre)
+        if modulo is not None:
+            getattr(modulo, '__doc__')
@@ -0,0 +1,37 @@
+/*
+ * Cambio de pestaña en el navegador (COVID_PESTANIAS_EN_CLIENTE=1). El almacén
+ * 'datos-pestanias' trae una sola vez el contenido ya serializado de todas las pestañas
+ * y las plantillas de sus figuras; cada figura lleva en su lugar {indice_plantilla: i}.
+ */
+(function() {
+    function reponePlantillas(nodo, plantillas) {
+        if (Array.isArray(nodo)) {
+            return nodo.map(function(elemento) { return reponePlantillas(elemento, plantillas); });
+        }
+        if (nodo === null || typeof nodo !== 'object') {
+            return nodo;
+        }
+        var copia = {};
+        Object.keys(nodo).forEach(function(clave) {
+            var valor = nodo[clave];
+            if (clave === 'template' && valor !== null && typeof valor === 'object'
+                    && typeof valor.indice_plantilla === 'number') {
+                copia[clave] = plantillas[valor.indice_plantilla];
+            } else {
+                copia[clave] = reponePlantillas(valor, plantillas);
+            }
+        });
+        return copia;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        pestanias: {
+            muestra: function(tab, datos) {
+                if (!datos || !datos.pestanias[tab]) {
+                    return null;
+                }
+                return reponePlantillas(datos.pestanias[tab], datos.plantillas);
+            }
+        }
+    });
+})();
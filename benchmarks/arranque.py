@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tiempos de arranque con y sin arranque rápido (COVID_ARRANQUE_RAPIDO=1).
+
+Para cada modo mide, en procesos nuevos:
+  - el tiempo de `import app` y los módulos que más tardan en importarse (-X importtime)
+  - con gunicorn: el tiempo hasta el primer byte de '/' (la plantilla de espera en el
+    arranque rápido), hasta que /listo responde 200 (datos listos) y hasta que indica
+    las cachés de pestañas calientes (pestanias_listas)
+
+    $ python benchmarks/arranque.py --dir-csv /ruta/a/csv_jhu
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from comun import RAIZ, imprime_tabla
+
+
+def entorno_modo(modo, temporal, args):
+    entorno = dict(os.environ, COVID_DIR_SNAPSHOTS=os.path.join(temporal, 'snapshots'),
+                   COVID_DIR_CACHE_CSV=os.path.join(temporal, 'cache_csv'),
+                   COVID_DIR_ESTATICOS=os.path.join(temporal, 'estaticos'),
+                   COVID_INTERVALO_REFRESCO='0', COVID_ARRANQUE_RAPIDO='1' if modo == 'rapido' else '0')
+    if args.dir_csv:
+        entorno['COVID_DIR_CSV'] = os.path.abspath(args.dir_csv)
+    return entorno
+
+def tiempos_importacion(salida, modulos):
+    """Paquetes (módulos sin punto) con más tiempo acumulado en la salida de -X importtime"""
+    acumulados = {}
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = [parte.strip() for parte in linea[len('import time:'):].split('|')]
+        if '.' not in nombre:
+            acumulados[nombre] = acumulados.get(nombre, 0) + int(acumulado)
+    return sorted(acumulados.items(), key=lambda elemento: -elemento[1])[:modulos]
+
+def mide_importacion(modo, temporal, args):
+    codigo = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+    mejor = float('inf')
+    for _ in range(args.repeticiones):
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=entorno_modo(modo, temporal, args),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        mejor = min(mejor, float(salida.stdout.decode().strip().splitlines()[-1]))
+    traza = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=RAIZ,
+                           env=entorno_modo(modo, temporal, args), stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE, check=True)
+    return mejor, tiempos_importacion(traza.stderr.decode(), args.modulos)
+
+def espera(url, proceso, inicio, limite=300, condicion=None):
+    """
+    Segundos desde `inicio` hasta que `url` responde 200 (y, si se indica, su cuerpo
+    cumple condicion(cuerpo))
+    """
+    while time.time() - inicio < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError('gunicorn ha terminado al arrancar')
+        try:
+            with urlopen(url, timeout=60) as respuesta:
+                cuerpo = respuesta.read()
+                if condicion is None or condicion(cuerpo):
+                    return time.time() - inicio
+        except HTTPError as error:
+            # 503 mientras se cargan los datos
+            error.close()
+        except Exception:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError('{0} no responde en {1} s'.format(url, limite))
+
+def mide_servidor(modo, temporal, args):
+    # Configuración vacía: gunicorn >= 20 carga ./gunicorn.conf.py si no se indica otra
+    vacia = os.path.join(temporal, 'vacia.conf.py')
+    open(vacia, 'w').close()
+    orden = [sys.executable, '-m', 'gunicorn', '-w', '1', '-b', '127.0.0.1:{0}'.format(args.puerto),
+             '--timeout', '300', '-c', vacia, 'app:server']
+    inicio = time.time()
+    proceso = subprocess.Popen(orden, cwd=RAIZ, env=entorno_modo(modo, temporal, args),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:{0}'.format(args.puerto)
+    try:
+        primer_byte = espera(url + '/', proceso, inicio)
+        listo = espera(url + '/listo', proceso, inicio)
+        pestanias = espera(url + '/listo', proceso, inicio,
+                           condicion=lambda cuerpo: json.loads(cuerpo.decode('utf-8'))['pestanias_listas'])
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return primer_byte, listo, pestanias
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV de la JHU (sin él se descargan)')
+    parser.add_argument('--modos', nargs='+', default=['normal', 'rapido'])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--modulos', type=int, default=8, help='Módulos más lentos que se muestran')
+    parser.add_argument('--puerto', type=int, default=8766)
+    args = parser.parse_args()
+
+    filas = []
+    for modo in args.modos:
+        temporal = tempfile.mkdtemp(prefix='arranque-')
+        try:
+            importacion, modulos = mide_importacion(modo, temporal, args)
+            primer_byte, listo, pestanias = mide_servidor(modo, temporal, args)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        filas.append([modo] + ['{0:.2f}'.format(segundos) for segundos in (importacion, primer_byte, listo, pestanias)])
+        print('Importación más lenta en modo {0} (ms acumulados):'.format(modo))
+        for nombre, microsegundos in modulos:
+            print('  {0:<24}{1:>8.0f}'.format(nombre, microsegundos / 1000.0))
+    imprime_tabla(filas, ['modo', 'import app s', 'primer byte s', 'datos listos s', 'pestañas listas s'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tiempo del ajuste de las curvas logística y de Gompertz (ajustes.py) de confirmados y
+fallecidos: en un único lote para todos los países y para todas las filas del cubo,
+frente a un bucle en Python que ajusta los países de uno en uno con el mismo método.
+Muestra también el error (normalizado) de los ajustes.
+
+    $ python benchmarks/bench_ajustes.py --dir-csv /ruta/a/csv_jhu
+    $ python benchmarks/bench_ajustes.py --regiones 300 3300 --dias 1000
+"""
+import argparse
+
+import numpy as np
+
+from comun import cronometra, genera_series, imprime_tabla, lee_series
+from ajustes import MODELOS, AjustesCurvas
+from cubo import CuboSeries
+
+
+def mide(cubo, etiqueta, repeticiones):
+    paises = cubo.fila_pais
+    filas = []
+    casos = [('países, lote', lambda: AjustesCurvas.calcula(cubo, filas=paises)),
+             ('países, bucle por país', lambda: [AjustesCurvas.calcula(cubo, filas=[fila]) for fila in paises]),
+             ('todas las filas, lote', lambda: AjustesCurvas.calcula(cubo))]
+    for nombre, funcion in casos:
+        # El bucle por país sólo una vez: es el caso lento
+        segundos = cronometra(funcion, 1 if 'bucle' in nombre else repeticiones)
+        filas.append([etiqueta, nombre, len(paises) if 'países' in nombre else cubo.valores.shape[1],
+                      '{0:.1f}'.format(segundos * 1000)])
+    ajustes = AjustesCurvas.calcula(cubo, filas=paises)
+    for posicion, modelo in enumerate(MODELOS):
+        errores = ajustes.error[posicion][~np.isnan(ajustes.error[posicion])]
+        if len(errores):
+            print('{0}  {1}: {2} ajustes, error p50 {3:.4f}, p95 {4:.4f}'.format(
+                etiqueta, modelo, len(errores), *np.percentile(errores, [50, 95])))
+    return filas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV globales de la JHU (sin él se generan)')
+    parser.add_argument('--regiones', type=int, nargs='+', default=[300, 3300])
+    parser.add_argument('--dias', type=int, nargs='+', default=[1000])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    filas = []
+    if args.dir_csv:
+        filas += mide(CuboSeries.desde_series(lee_series(args.dir_csv)), 'JHU', args.repeticiones)
+    else:
+        for regiones in args.regiones:
+            for dias in args.dias:
+                cubo = CuboSeries.desde_series(genera_series(regiones, dias))
+                filas += mide(cubo, '{0}x{1}'.format(regiones, dias), args.repeticiones)
+    imprime_tabla(filas, ['caso', 'ajuste', 'filas', 'ms'])
+
+
+if __name__ == '__main__':
+    main()
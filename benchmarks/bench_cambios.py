@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Coste de un refresco según el tamaño del cambio: detección de cambios entre cubos y
+actualización de las métricas derivadas frente a su recálculo completo, en varios
+escenarios (sólo un día nuevo, un día nuevo con regiones revisadas, una provincia
+renombrada). Comprueba además que las métricas actualizadas coinciden con las
+recalculadas.
+
+    $ python benchmarks/bench_cambios.py --regiones 3000 --dias 1000
+"""
+import argparse
+
+import numpy as np
+
+from comun import cronometra, genera_series, imprime_tabla
+from cambios import compara_cubos, huellas_filas
+from cubo import CuboSeries
+from metricas import MetricasDerivadas
+
+
+def recorta(series, dias):
+    return {nombre: df.iloc[:, :df.shape[1] - dias] if dias else df.copy() for nombre, df in series.items()}
+
+def revisa(series, filas, desde):
+    """Suma un caso a partir del día `desde` (contado desde el final) en las filas indicadas"""
+    df = series['confirmados']
+    columnas = df.columns[-desde:]
+    df.loc[df.index[filas], columnas] = df.loc[df.index[filas], columnas] + 1
+    return series
+
+def escenarios(series):
+    renombrada = recorta(series, 0)
+    renombrada['confirmados'] = renombrada['confirmados'].copy()
+    for df in renombrada.values():
+        df.loc[df.index[10], 'Province/State'] = 'Renombrada'
+    return [('día nuevo', recorta(series, 0)),
+            ('día nuevo + 10 regiones revisadas', revisa(recorta(series, 0), list(range(20, 30)), 30)),
+            ('día nuevo + 200 regiones revisadas', revisa(recorta(series, 0), list(range(20, 220)), 30)),
+            ('región renombrada', renombrada)]
+
+def iguales(a, b):
+    return all(np.allclose(getattr(a, nombre), getattr(b, nombre), equal_nan=True)
+               for nombre in ['nuevos', 'media7', 'letalidad', 'crecimiento'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--regiones', type=int, default=3000)
+    parser.add_argument('--dias', type=int, default=1000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    series = genera_series(args.regiones, args.dias)
+    previo = CuboSeries.desde_series(recorta(series, 1))
+    huellas = huellas_filas(previo.regiones)
+    anteriores = MetricasDerivadas.calcula(previo)
+    filas = []
+    for nombre, nuevas in escenarios(series):
+        cubo = CuboSeries.desde_series(nuevas)
+        cambios = compara_cubos(previo, cubo, huellas)
+        deteccion = cronometra(lambda: compara_cubos(previo, cubo, huellas), args.repeticiones)
+        incremental = cronometra(lambda: MetricasDerivadas.actualiza(anteriores, cubo, cambios), args.repeticiones)
+        completo = cronometra(lambda: MetricasDerivadas.calcula(cubo), args.repeticiones)
+        metricas = MetricasDerivadas.actualiza(anteriores, cubo, cambios)
+        resumen = cambios.resumen()
+        filas.append([nombre, resumen['celdas_revisadas'], len(resumen['regiones_renombradas']),
+                      resumen['total_anomalias'], metricas.filas_recalculadas,
+                      '{0:.1f}'.format(deteccion * 1000), '{0:.1f}'.format(incremental * 1000),
+                      '{0:.1f}'.format(completo * 1000), iguales(metricas, MetricasDerivadas.calcula(cubo))])
+    print('{0} regiones x {1} días'.format(args.regiones, args.dias))
+    imprime_tabla(filas, ['escenario', 'celdas revisadas', 'renombradas', 'anomalías', 'filas recalculadas',
+                          'detección ms', 'métricas ms', 'métricas completo ms', 'iguales'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ingesta de los CSV por condado de EE. UU.: lectura completa con pd.read_csv y cubo con
+CuboSeries.desde_series (como las series globales) frente a la ingesta por bloques de
+condados.py con varios presupuestos de memoria por bloque. Cada ingesta se ejecuta en
+un proceso nuevo y se mide su tiempo y el pico de memoria residente (VmHWM, reiniciado
+antes de la ingesta) por encima de la del proceso ya con las librerías importadas.
+Comprueba además que ambos cubos son iguales. Sólo funciona en Linux.
+
+    $ python benchmarks/bench_condados.py --condados 3300 --dias 500 1000 2000
+    $ python benchmarks/bench_condados.py --dir-csv /ruta/a/csv_jhu_eeuu
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from comun import FICHEROS_CONDADOS, RAIZ, escribe_condados, imprime_tabla
+
+
+CODIGO = '''
+import json, sys, time
+sys.path.insert(0, {raiz!r})
+import numpy as np, pandas as pd
+from condados import lee_condados
+from cubo import CuboSeries
+
+def completa(rutas):
+    series = {{}}
+    for metrica, ruta in rutas.items():
+        df = pd.read_csv(ruta).rename(columns={{'Admin2': 'Province/State', 'Province_State': 'Country/Region',
+                                               'Long_': 'Long'}})
+        series[metrica] = df.drop(columns=[columna for columna in ['UID', 'iso2', 'iso3', 'code3', 'FIPS',
+                                           'Country_Region', 'Combined_Key', 'Population'] if columna in df])
+    series['recuperados'] = series['fallecidos'].iloc[:0]
+    return CuboSeries.desde_series(series)
+
+def memoria(campo):
+    with open('/proc/self/status') as fichero:
+        return int(next(linea.split()[1] for linea in fichero if linea.startswith(campo + ':')))
+
+rutas = {rutas!r}
+# Reinicia el pico de RSS del proceso (VmHWM) para medir sólo el de la ingesta
+with open('/proc/self/clear_refs', 'w') as fichero:
+    fichero.write('5')
+antes = memoria('VmRSS')
+inicio = time.perf_counter()
+if {modo!r} == 'completa':
+    cubo = completa(rutas)
+    pico_contabilizado = None
+else:
+    ingesta = lee_condados(rutas, memoria_bloque={memoria!r})
+    cubo, pico_contabilizado = ingesta.cubo, ingesta.pico_bytes
+segundos = time.perf_counter() - inicio
+pico = memoria('VmHWM') - antes
+if {referencia!r}:
+    np.save({referencia!r}, np.asarray(cubo.valores[:2], dtype=np.int64))
+print(json.dumps({{'segundos': segundos, 'pico_kb': pico, 'contabilizado': pico_contabilizado,
+                  'mb_cubo': cubo.valores[:2].nbytes / 1e6}}))
+'''
+
+
+def ejecuta(modo, rutas, memoria=None, referencia=None):
+    codigo = CODIGO.format(raiz=RAIZ, rutas=rutas, modo=modo, memoria=memoria, referencia=referencia)
+    salida = subprocess.run([sys.executable, '-c', codigo], stdout=subprocess.PIPE, check=True)
+    return json.loads(salida.stdout.decode().strip().splitlines()[-1])
+
+def mide(rutas, etiqueta, args, temporal):
+    import numpy as np
+    filas = []
+    ruta_completa, ruta_bloques = os.path.join(temporal, 'completa.npy'), os.path.join(temporal, 'bloques.npy')
+    medidas = [('completa', None, ruta_completa)] + [('bloques', mb, ruta_bloques) for mb in args.memoria_bloque]
+    for modo, mb, referencia in medidas:
+        resultado = ejecuta(modo, rutas, None if mb is None else int(mb * 2 ** 20), referencia)
+        if modo == 'bloques' and not np.array_equal(np.load(ruta_completa), np.load(ruta_bloques)):
+            raise AssertionError('Los cubos de la lectura completa y por bloques no coinciden')
+        filas.append([etiqueta, modo if mb is None else '{0} ({1} MB)'.format(modo, mb),
+                      '{0:.2f}'.format(resultado['segundos']), '{0:.1f}'.format(resultado['mb_cubo']),
+                      '{0:.1f}'.format(resultado['pico_kb'] / 1024.0),
+                      '' if resultado['contabilizado'] is None else '{0:.1f}'.format(resultado['contabilizado'] / 2 ** 20)])
+    return filas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV por condado de la JHU (sin él se generan)')
+    parser.add_argument('--condados', type=int, nargs='+', default=[3300])
+    parser.add_argument('--dias', type=int, nargs='+', default=[500, 1000, 2000])
+    parser.add_argument('--memoria-bloque', type=float, nargs='+', default=[2, 8, 32], help='MB por bloque')
+    args = parser.parse_args()
+
+    temporal = tempfile.mkdtemp(prefix='condados-')
+    filas = []
+    try:
+        if args.dir_csv:
+            rutas = {metrica: os.path.join(os.path.abspath(args.dir_csv), fichero)
+                     for metrica, fichero in FICHEROS_CONDADOS.items()}
+            filas += mide(rutas, 'JHU', args, temporal)
+        else:
+            for condados in args.condados:
+                for dias in args.dias:
+                    directorio = os.path.join(temporal, 'csv')
+                    escribe_condados(directorio, condados, dias)
+                    rutas = {metrica: os.path.join(directorio, fichero) for metrica, fichero in FICHEROS_CONDADOS.items()}
+                    filas += mide(rutas, '{0}x{1}'.format(condados, dias), args, temporal)
+                    shutil.rmtree(directorio, ignore_errors=True)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    imprime_tabla(filas, ['caso', 'ingesta', 'segundos', 'MB cubo', 'MB pico RSS', 'MB contabilizados'])
+
+
+if __name__ == '__main__':
+    main()
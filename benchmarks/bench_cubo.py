@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara memoria y tiempos de los tres dataframes anchos originales con el cubo denso.
+
+    $ python benchmarks/bench_cubo.py --dir-csv /ruta/a/csv_jhu
+"""
+import argparse
+
+import numpy as np
+
+from comun import cronometra, imprime_tabla, lee_series, memoria_frames
+from cubo import CuboSeries
+
+
+# Implementación original basada en dataframes anchos, como referencia
+def prepara_frames(series):
+    frames = []
+    for nombre in ['confirmados', 'fallecidos', 'recuperados']:
+        df = series[nombre].copy()
+        df['casos_totales'] = df[df.columns[-1]]
+        df.rename(columns = {'Province/State':'State'}, inplace = True)
+        frames.append(df)
+    return frames
+
+def localizacion_pais_frames(df, df_fallecidos, df_recuperados, localizacion, flag_not=False):
+    if flag_not:
+        df_conf = df[df['Country/Region']!=localizacion].reset_index(drop=True)
+        df_fall = df_fallecidos[df_fallecidos['Country/Region']!=localizacion].reset_index(drop=True)
+        df_recup = df_recuperados[df_recuperados['Country/Region']!=localizacion].reset_index(drop=True)
+    else:
+        df_conf = df[df['Country/Region']==localizacion].reset_index(drop=True)
+        df_fall = df_fallecidos[df_fallecidos['Country/Region']==localizacion].reset_index(drop=True)
+        df_recup = df_recuperados[df_recuperados['Country/Region']==localizacion].reset_index(drop=True)
+    df_conf.loc['fecha_infecciones'] = df_conf.sum(numeric_only=True)
+    df_fall.loc['fecha_infecciones'] = df_fall.sum(numeric_only=True)
+    df_recup.loc['fecha_infecciones'] = df_recup.sum(numeric_only=True)
+    return df_conf, df_fall, df_recup
+
+def localizacion_estado_frames(df, df_fallecidos, df_recuperados, localizacion):
+    return (df[df['State']==localizacion].reset_index(drop=True),
+            df_fallecidos[df_fallecidos['State']==localizacion].reset_index(drop=True),
+            df_recuperados[df_recuperados['State']==localizacion].reset_index(drop=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV globales de la JHU')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    series = lee_series(args.dir_csv)
+    frames = prepara_frames(series)
+    cubo = CuboSeries.desde_series(series)
+
+    # Dataframes que mantenía la app: las tres series, los de cada localización y el agregado
+    localizaciones = [localizacion_estado_frames(*frames, 'Hubei')]
+    for pais in ['US', 'Italy', 'China', 'Spain']:
+        localizaciones.append(localizacion_pais_frames(*frames, pais))
+    localizaciones.append(localizacion_pais_frames(*frames, 'China', flag_not=True))
+    agrupado = frames[0].groupby(['Country/Region']).sum(numeric_only=True)
+    memoria_series = memoria_frames(frames)
+    memoria_original = memoria_series + memoria_frames([agrupado] + [df for grupo in localizaciones for df in grupo])
+    print('Memoria tres dataframes:         {0:.2f} MB'.format(memoria_series / 1e6))
+    print('Memoria dataframes de la app:    {0:.2f} MB'.format(memoria_original / 1e6))
+    print('Memoria cubo (con agregados):    {0:.2f} MB  ({1:.1f}x menos que los tres dataframes, {2:.1f}x menos que la app)'.format(
+        cubo.nbytes / 1e6, memoria_series / float(cubo.nbytes), memoria_original / float(cubo.nbytes)))
+    print('')
+
+    r = args.repeticiones
+    filas = [
+        ['preparación de los datos', cronometra(lambda: prepara_frames(series), r),
+         cronometra(lambda: CuboSeries.desde_series(series), r)],
+        ['localización país (Spain)', cronometra(lambda: localizacion_pais_frames(*frames, 'Spain'), r),
+         cronometra(lambda: cubo.serie_pais('Spain'), r)],
+        ['localización estado (Hubei)', cronometra(lambda: localizacion_estado_frames(*frames, 'Hubei'), r),
+         cronometra(lambda: cubo.serie_estado('Hubei'), r)],
+        ['agregado por país (3 métricas)', cronometra(lambda: [df.groupby(['Country/Region']).sum(numeric_only=True)
+                                                               for df in frames], r),
+         cronometra(lambda: np.add.reduceat(cubo.regiones, cubo.inicio_pais, axis=1, dtype=np.int64), r)],
+        ['fuera de China', cronometra(lambda: localizacion_pais_frames(*frames, 'China', flag_not=True), r),
+         cronometra(lambda: cubo.serie_sin_pais('China'), r)],
+    ]
+    imprime_tabla([[f[0], '{0:.6f}'.format(f[1]), '{0:.6f}'.format(f[2]), '{0:.1f}x'.format(f[1] / max(f[2], 1e-9))]
+                   for f in filas], ['operación', 'dataframes (s)', 'cubo (s)', 'mejora'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Latencia del callback de la pestaña por país con varios usuarios concurrentes eligiendo
+localizaciones al azar: p50, p95 y p99 con la caché LRU de figuras vacía (fría) y
+después de haber servido ya esas localizaciones (caliente).
+
+    $ python benchmarks/bench_localizaciones.py --dir-csv /ruta/a/csv_jhu --usuarios 16 --peticiones 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from comun import imprime_tabla
+
+
+def cuerpo(clave):
+    return {'output': '..kpis-localizacion.figure...tendencia-localizacion.figure..',
+            'outputs': [{'id': 'kpis-localizacion', 'property': 'figure'},
+                        {'id': 'tendencia-localizacion', 'property': 'figure'}],
+            'inputs': [{'id': 'selector-localizacion', 'property': 'value', 'value': clave},
+                       {'id': 'tendencia-localizacion', 'property': 'relayoutData', 'value': None},
+                       {'id': 'tendencia-localizacion-vista', 'property': 'value', 'value': 'acumulados'},
+                       {'id': 'rango-fechas', 'property': 'value', 'value': None}],
+            'changedPropIds': ['selector-localizacion.value'], 'state': []}
+
+def ronda(app, claves, usuarios, peticiones, semilla):
+    latencias = []
+    cerrojo = threading.Lock()
+
+    def usuario(indice):
+        cliente = app.server.test_client()
+        rng = random.Random(semilla + indice)
+        propias = []
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            respuesta = cliente.post('/_dash-update-component', json=cuerpo(rng.choice(claves)))
+            propias.append(time.perf_counter() - inicio)
+            assert respuesta.status_code == 200
+        with cerrojo:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=usuario, args=(indice,)) for indice in range(usuarios)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return np.array(latencias) * 1000, time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV de la JHU (sin él se descargan)')
+    parser.add_argument('--usuarios', type=int, default=16)
+    parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por usuario')
+    args = parser.parse_args()
+
+    temporal = tempfile.mkdtemp(prefix='localizaciones-')
+    os.environ.setdefault('COVID_INTERVALO_REFRESCO', '0')
+    os.environ.setdefault('COVID_DIR_SNAPSHOTS', os.path.join(temporal, 'snapshots'))
+    os.environ.setdefault('COVID_DIR_CACHE_CSV', os.path.join(temporal, 'cache_csv'))
+    os.environ.setdefault('COVID_DIR_ESTATICOS', os.path.join(temporal, 'estaticos'))
+    if args.dir_csv:
+        os.environ['COVID_DIR_CSV'] = os.path.abspath(args.dir_csv)
+    import app
+
+    claves = sorted(app.REFRESCO.estado.indice_localizaciones)
+    filas = []
+    app.CACHE_FIGURAS.vacia()
+    for nombre in ['fría', 'caliente']:
+        latencias, duracion = ronda(app, claves, args.usuarios, args.peticiones, semilla=0)
+        filas.append([nombre, len(latencias)] + ['{0:.1f}'.format(np.percentile(latencias, p)) for p in (50, 95, 99)] +
+                     ['{0:.0f}'.format(len(latencias) / duracion)])
+    print('{0} localizaciones, {1} usuarios concurrentes'.format(len(claves), args.usuarios))
+    imprime_tabla(filas, ['caché', 'peticiones', 'p50 ms', 'p95 ms', 'p99 ms', 'peticiones/s'])
+    print(app.CACHE_FIGURAS.estadisticas())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tamaño en JSON (y comprimido) y tiempo de construcción de la figura del mapa principal:
+figura original con todas las regiones frente a los niveles de detalle de VistaMapa.
+
+    $ python benchmarks/bench_mapa.py --dir-csv /ruta/a/csv_jhu
+    $ python benchmarks/bench_mapa.py --regiones 300 3300 10000
+"""
+import argparse
+import gzip
+import json
+
+import numpy as np
+import plotly
+import plotly.graph_objs as go
+
+from comun import cronometra, genera_series, imprime_tabla, lee_series
+from cubo import CuboSeries
+from mapa_global import NIVEL_DETALLE, VistaMapa, figura_mapa
+
+
+# Implementación original: cinco filtrados del dataframe y textos concatenando Series
+def figura_original(df):
+    return go.Figure(data=go.Scattergeo(
+        locationmode = 'ISO-3',
+        lon = df.loc[df['casos_totales']>0]['Long'],
+        lat = df.loc[df['casos_totales']>0]['Lat'],
+        text = 'Estado: ' + df.loc[df['casos_totales']>0]['State'].astype(str) \
+                + ' <br> Pais: ' + df.loc[df['casos_totales']>0]['Country/Region'].astype(str) \
+                + ' <br> Casos: ' + df.loc[df['casos_totales']>0]['casos_totales'].astype(str),
+        mode = 'markers',
+        marker = dict(
+            size = np.sqrt(df.loc[df['casos_totales']>0]['casos_totales']/30)+10,
+            opacity = 0.8,
+            reversescale = True,
+            autocolorscale = False,
+            color='red',
+            line = dict(width=1,color='rgba(102, 102, 102)'))),
+                      layout=dict(geo = dict(showcountries = True), height=800, margin=dict(t=10)))
+
+def frame_regiones(series):
+    df = series['confirmados'].rename(columns={'Province/State': 'State'})
+    df['casos_totales'] = df[df.columns[-1]]
+    return df
+
+def tamanios(figura):
+    contenido = json.dumps(figura, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+    return len(contenido), len(gzip.compress(contenido, 6))
+
+def mide(nombre, series, repeticiones):
+    df = frame_regiones(series)
+    vista = VistaMapa.desde_cubo(CuboSeries.desde_series(series))
+    filas = []
+    casos = [('original', lambda: figura_original(df))]
+    casos += [('nivel {0}'.format(nivel), lambda nivel=nivel: figura_mapa(vista.agrupa(8.0 / 2 ** nivel)))
+              for nivel in range(NIVEL_DETALLE)]
+    casos += [('detalle completo', lambda: figura_mapa(vista.detalle())),
+              ('detalle ventana', lambda: figura_mapa(vista.detalle((-10.0, 30.0, 30.0, 60.0))))]
+    for caso, construye in casos:
+        figura = construye()
+        bytes_json, bytes_gzip = tamanios(figura)
+        filas.append([nombre, caso, len(figura.data[0].lat), bytes_json, bytes_gzip,
+                      '{0:.1f}'.format(cronometra(construye, repeticiones) * 1000)])
+    return filas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV de la JHU')
+    parser.add_argument('--regiones', type=int, nargs='+', default=[300, 3300, 10000])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    filas = []
+    if args.dir_csv:
+        filas += mide('jhu', lee_series(args.dir_csv), args.repeticiones)
+    for regiones in args.regiones:
+        filas += mide('sintético {0}'.format(regiones), genera_series(regiones, 30), args.repeticiones)
+    imprime_tabla(filas, ['datos', 'figura', 'puntos', 'bytes json', 'bytes gzip', 'ms'])
+
+
+if __name__ == '__main__':
+    main()
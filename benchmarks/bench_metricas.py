@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tiempo de las métricas derivadas de todas las filas del cubo: cálculo completo frente
+a la actualización incremental cuando un refresco sólo añade días. Comprueba además
+que ambas dan el mismo resultado.
+
+    $ python benchmarks/bench_metricas.py --regiones 300 3000 --dias 100 1000
+"""
+import argparse
+
+import numpy as np
+
+from comun import cronometra, genera_series, imprime_tabla
+from cambios import compara_cubos
+from cubo import CuboSeries
+from metricas import MetricasDerivadas
+
+
+def iguales(a, b):
+    return all(np.allclose(getattr(a, nombre), getattr(b, nombre), equal_nan=True)
+               for nombre in ['nuevos', 'media7', 'letalidad', 'crecimiento'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--regiones', type=int, nargs='+', default=[300, 3000])
+    parser.add_argument('--dias', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--nuevos', type=int, default=1, help='Días añadidos en el refresco')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    filas = []
+    for regiones in args.regiones:
+        for dias in args.dias:
+            series = genera_series(regiones, dias)
+            cubo = CuboSeries.desde_series(series)
+            previo = CuboSeries.desde_series({nombre: df.iloc[:, :-args.nuevos] for nombre, df in series.items()})
+            anteriores = MetricasDerivadas.calcula(previo)
+            cambios = compara_cubos(previo, cubo)
+            completo = cronometra(lambda: MetricasDerivadas.calcula(cubo), args.repeticiones)
+            incremental = cronometra(lambda: MetricasDerivadas.actualiza(anteriores, cubo, cambios), args.repeticiones)
+            metricas = MetricasDerivadas.actualiza(anteriores, cubo, cambios)
+            filas.append([regiones, dias, cubo.valores.shape[1], '{0:.1f}'.format(completo * 1000),
+                          '{0:.1f}'.format(incremental * 1000), metricas.dias_calculados,
+                          iguales(metricas, MetricasDerivadas.calcula(cubo)),
+                          '{0:.1f}'.format(metricas.nbytes / 1024.0 ** 2)])
+    imprime_tabla(filas, ['regiones', 'días', 'filas cubo', 'completo ms', 'incremental ms',
+                          'días calculados', 'iguales', 'MB'])
+
+
+if __name__ == '__main__':
+    main()
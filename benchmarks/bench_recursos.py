@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Peso de la página y número de peticiones de la carga inicial del dashboard (HTML, hojas
+de estilo y scripts) con los paquetes propios de recursos.py frente a la configuración
+anterior (COVID_RECURSOS_EXTERNOS=1: hoja de estilo de codepen y los ficheros de
+assets/ por separado). Cada modo se mide en un proceso nuevo con el cliente de pruebas de
+Flask; los recursos de terceros se descargan si hay conexión y si no se cuentan sin tamaño.
+Los paquetes propios necesitan los ficheros de assets/vendor (python recursos.py vendoriza).
+
+    $ python benchmarks/bench_recursos.py
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from comun import RAIZ, imprime_tabla
+from recursos import DIR_VENDOR, RECURSOS_EXTERNOS
+
+
+CODIGO = '''
+import json, os, re, sys, urllib.request
+from urllib.parse import urlparse
+sys.path.insert(0, {raiz!r})
+os.chdir({raiz!r})
+import app
+cliente = app.server.test_client()
+indice = cliente.get('/')
+html = indice.data.decode('utf-8')
+urls = re.findall(r'<link[^>]*rel="stylesheet"[^>]*href="([^"]+)"', html) + re.findall(r'<script[^>]*src="([^"]+)"', html)
+recursos = [{{'url': '/', 'host': '', 'bytes': len(indice.data), 'transferidos': len(indice.data), 'inmutable': False}}]
+for url in urls:
+    host = urlparse(url).netloc
+    recurso = {{'url': url, 'host': host, 'bytes': None, 'transferidos': None, 'inmutable': False}}
+    if host:
+        try:
+            with urllib.request.urlopen(url, timeout={timeout!r}) as respuesta:
+                recurso['bytes'] = recurso['transferidos'] = len(respuesta.read())
+        except Exception:
+            pass
+    else:
+        completa = cliente.get(url)
+        comprimida = cliente.get(url, headers={{'Accept-Encoding': 'gzip, br'}})
+        recurso.update(bytes=len(completa.data), transferidos=len(comprimida.data),
+                       inmutable='immutable' in comprimida.headers.get('Cache-Control', ''))
+    recursos.append(recurso)
+print(json.dumps(recursos))
+'''
+
+
+def mide(externos, temporal, timeout):
+    entorno = dict(os.environ, COVID_ARRANQUE_RAPIDO='1', COVID_INTERVALO_REFRESCO='0',
+                   COVID_DIR_ESTATICOS=os.path.join(temporal, 'estaticos'),
+                   COVID_DIR_SNAPSHOTS=os.path.join(temporal, 'snapshots'),
+                   COVID_DIR_CACHE_CSV=os.path.join(temporal, 'cache_csv'))
+    entorno['COVID_RECURSOS_EXTERNOS'] = '1' if externos else '0'
+    salida = subprocess.run([sys.executable, '-c', CODIGO.format(raiz=RAIZ, timeout=timeout)], env=entorno,
+                            stdout=subprocess.PIPE, check=True)
+    return json.loads(salida.stdout.decode().strip().splitlines()[-1])
+
+def resume(modo, recursos):
+    propios = [recurso for recurso in recursos if not recurso['host']]
+    terceros = [recurso for recurso in recursos if recurso['host']]
+    sin_tamanio = sum(1 for recurso in terceros if recurso['bytes'] is None)
+    kb = lambda campo: '{0:.1f}'.format(sum(recurso[campo] or 0 for recurso in recursos) / 1024.0)
+    return [modo, len(recursos), len(terceros), len(set(recurso['host'] for recurso in terceros)),
+            kb('bytes') + (' (+{0} sin medir)'.format(sin_tamanio) if sin_tamanio else ''), kb('transferidos'),
+            sum(1 for recurso in propios if recurso['inmutable'])]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=10, help='Segundos por recurso de terceros')
+    parser.add_argument('--detalle', action='store_true', help='Lista cada recurso')
+    args = parser.parse_args()
+
+    modos = [('CDN y assets sueltos', True)]
+    faltan = [nombre for nombre in RECURSOS_EXTERNOS if not os.path.isfile(os.path.join(DIR_VENDOR, nombre))]
+    if faltan:
+        print('Sin paquetes propios: faltan {0} en {1}'.format(', '.join(faltan), DIR_VENDOR))
+    else:
+        modos.append(('paquetes propios', False))
+
+    temporal = tempfile.mkdtemp(prefix='recursos-')
+    filas = []
+    try:
+        for modo, externos in modos:
+            recursos = mide(externos, temporal, args.timeout)
+            filas.append(resume(modo, recursos))
+            if args.detalle:
+                for recurso in recursos:
+                    print('{0:<22}{1:>10}{2:>10}  {3}'.format(modo[:20], str(recurso['bytes']),
+                                                             str(recurso['transferidos']), recurso['url']))
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    imprime_tabla(filas, ['modo', 'peticiones', 'a terceros', 'hosts de terceros', 'KB', 'KB transferidos',
+                          'con caché inmutable'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Escalado de la extracción de la evolución temporal (3 métricas x 4 localizaciones)
+con el número de días y de regiones: bucle por fecha original frente a la extracción
+vectorizada del cubo.
+
+    $ python benchmarks/bench_series.py
+"""
+import argparse
+
+from bench_cubo import localizacion_estado_frames, localizacion_pais_frames, prepara_frames
+from comun import cronometra, genera_series, imprime_tabla
+from cubo import CuboSeries
+
+
+# Implementación original con un .copy() del dataframe de la localización por cada fecha
+def evol_local_frames(lista_df_localizacion, y, pais=False):
+    if pais:
+        y_conf = [lista_df_localizacion[0].copy().loc['fecha_infecciones'][str(d)] for d in y]
+        y_fall = [lista_df_localizacion[1].copy().loc['fecha_infecciones'][str(d)] for d in y]
+        y_recup=[lista_df_localizacion[2].copy().loc['fecha_infecciones'][str(d)] for d in y]
+    else:
+        y_conf=[lista_df_localizacion[0].copy()[str(d)].item() for d in y]
+        y_fall=[lista_df_localizacion[1].copy()[str(d)].item() for d in y]
+        y_recup=[lista_df_localizacion[2].copy()[str(d)].item() for d in y]
+    return y_conf, y_fall, y_recup
+
+def extraccion_frames(frames, y):
+    evoluciones = [evol_local_frames(localizacion_estado_frames(*frames, 'Hubei'), y)]
+    for pais in ['US', 'Italy', 'Spain']:
+        evoluciones.append(evol_local_frames(localizacion_pais_frames(*frames, pais), y, pais=True))
+    return evoluciones
+
+def extraccion_cubo(cubo, y):
+    return cubo.extrae_series(paises=['US', 'Italy', 'Spain'], estados=['Hubei'], fechas=y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dias', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--regiones', type=int, nargs='+', default=[300, 1000, 3300])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    filas = []
+    for regiones in args.regiones:
+        for dias in args.dias:
+            series = genera_series(regiones, dias)
+            frames = prepara_frames(series)
+            cubo = CuboSeries.desde_series(series)
+            y = list(cubo.fechas)
+            t_frames = cronometra(lambda: extraccion_frames(frames, y), args.repeticiones)
+            t_cubo = cronometra(lambda: extraccion_cubo(cubo, y), args.repeticiones)
+            filas.append([regiones, dias, '{0:.4f}'.format(t_frames), '{0:.6f}'.format(t_cubo),
+                          '{0:.0f}x'.format(t_frames / max(t_cubo, 1e-9))])
+    imprime_tabla(filas, ['regiones', 'días', 'bucle por fecha (s)', 'cubo (s)', 'mejora'])
+
+
+if __name__ == '__main__':
+    main()
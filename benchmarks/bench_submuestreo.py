@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tamaño en JSON y tiempo de construcción de una gráfica de tendencia (3 trazas) con
+todos los puntos frente al submuestreo LTTB, según la longitud de las series.
+
+    $ python benchmarks/bench_submuestreo.py --dias 100 1000 10000
+"""
+import argparse
+import json
+
+import numpy as np
+import plotly
+import plotly.graph_objs as go
+
+from comun import cronometra, imprime_tabla
+from submuestreo import PUNTOS_TRAZA, indices_traza
+
+
+def figura(dias, series, indices=None):
+    trazas = []
+    for serie in series:
+        seleccion = slice(None) if indices is None else indices(serie)
+        trazas.append(go.Scatter(x=dias[seleccion], y=serie[seleccion], mode='lines+markers'))
+    return go.Figure(data=trazas)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dias', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    filas = []
+    for n in args.dias:
+        dias = np.datetime64('2020-01-22') + np.arange(n).astype('timedelta64[D]')
+        x = dias.astype(np.int64)
+        series = [np.cumsum(rng.poisson(100 * factor, n)) for factor in (1.0, 0.03, 0.6)]
+        casos = [('completa', lambda: figura(dias, series)),
+                 ('lttb', lambda: figura(dias, series, lambda serie: indices_traza(x, serie))),
+                 ('lttb + ventana 10%', lambda: figura(dias, series, lambda serie: indices_traza(
+                     x, serie, (n // 2, n // 2 + max(n // 10, 1)))))]
+        for nombre, construye in casos:
+            contenido = json.dumps(construye(), cls=plotly.utils.PlotlyJSONEncoder)
+            filas.append([n, nombre, len(contenido), '{0:.1f}'.format(cronometra(construye, args.repeticiones) * 1000)])
+    print('Puntos por traza en la vista general: {0}'.format(PUNTOS_TRAZA))
+    imprime_tabla(filas, ['días', 'figura', 'bytes json', 'ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de extremo a extremo: varios usuarios concurrentes reproducen sesiones
+reales del dashboard contra la app en el propio proceso (cliente de pruebas de Flask)
+o contra gunicorn en local con distinto número de trabajadores.
+
+Cada sesión pide la página, los recursos que enlaza (sólo en la primera sesión de cada
+usuario: después el navegador los tiene en caché), la plantilla y las dependencias de
+Dash y el contenido de cada pestaña en orden aleatorio. Si el cambio de pestaña se
+resuelve en el navegador (COVID_PESTANIAS_EN_CLIENTE=1) no se piden las pestañas.
+Informa del rendimiento (peticiones y sesiones por segundo), la latencia p50/p95/p99
+y el tamaño medio de respuesta por tipo de petición, y la memoria de los trabajadores.
+
+    $ python benchmarks/carga.py --dir-csv /ruta/a/csv_jhu --modo proceso --usuarios 1 8 32
+    $ python benchmarks/carga.py --dir-csv /ruta/a/csv_jhu --modo gunicorn --trabajadores 1 4 --usuarios 8 32
+    $ python benchmarks/carga.py --modo gunicorn --config gunicorn.conf.py --trabajadores 4
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from comun import RAIZ, imprime_tabla
+from rss_trabajadores import espera_arranque, hijos, memoria_proceso
+
+
+PESTANIAS = ['pestania-china', 'pestania-espania', 'pestania-out-china', 'pestania-edad-patologias',
+             'pestania-consejos', 'pestania-analisis', 'pestania-paises']
+CABECERAS = {'Accept-Encoding': 'gzip'}
+TIPOS = ['pagina', 'recurso', 'plantilla', 'dependencias', 'pestania']
+
+
+def cuerpo_pestania(pestania):
+    return {'output': 'contenido-pestanias.children',
+            'outputs': {'id': 'contenido-pestanias', 'property': 'children'},
+            'inputs': [{'id': 'menu-pestanias', 'property': 'value', 'value': pestania}],
+            'changedPropIds': ['menu-pestanias.value'], 'state': []}
+
+def descomprime(datos):
+    return gzip.decompress(datos) if datos[:2] == b'\x1f\x8b' else datos
+
+def recursos_pagina(html):
+    """Rutas locales de los scripts y hojas de estilo que enlaza la página"""
+    return sorted(set(re.findall(r'(?:src|href)="(/[^"/][^"]*)"', html)))
+
+
+class ClienteProceso(object):
+    """Peticiones a la app importada en este proceso con el cliente de pruebas de Flask"""
+    def __init__(self, app):
+        self.cliente = app.server.test_client()
+
+    def pide(self, ruta, cuerpo=None):
+        if cuerpo is None:
+            respuesta = self.cliente.get(ruta, headers=CABECERAS)
+        else:
+            respuesta = self.cliente.post(ruta, json=cuerpo, headers=CABECERAS)
+        return respuesta.status_code, respuesta.get_data()
+
+
+class ClienteHttp(object):
+    """Peticiones HTTP a un servidor; el tamaño es el transferido (comprimido si lo está)"""
+    def __init__(self, url):
+        self.url = url
+
+    def pide(self, ruta, cuerpo=None):
+        cabeceras = dict(CABECERAS)
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/json'
+        try:
+            with urlopen(Request(self.url + ruta, data=datos, headers=cabeceras), timeout=60) as respuesta:
+                return respuesta.status, respuesta.read()
+        except HTTPError as error:
+            with error:
+                return error.code, error.read()
+
+
+def sesion(cliente, rng, pide_recursos, pestanias_servidor, anota):
+    def pide(tipo, ruta, cuerpo=None):
+        inicio = time.perf_counter()
+        estado, datos = cliente.pide(ruta, cuerpo)
+        anota(tipo, time.perf_counter() - inicio, len(datos), estado)
+        return datos
+
+    pagina = pide('pagina', '/')
+    if pide_recursos:
+        for ruta in recursos_pagina(descomprime(pagina).decode('utf-8', 'replace')):
+            pide('recurso', ruta)
+    pide('plantilla', '/_dash-layout')
+    pide('dependencias', '/_dash-dependencies')
+    if pestanias_servidor:
+        for pestania in rng.sample(PESTANIAS, len(PESTANIAS)):
+            pide('pestania', '/_dash-update-component', cuerpo_pestania(pestania))
+
+def pestanias_en_servidor(cliente):
+    """False si el contenido de las pestañas lo calcula un callback del navegador"""
+    _, datos = cliente.pide('/_dash-dependencies')
+    for dependencia in json.loads(descomprime(datos).decode('utf-8')):
+        if dependencia['output'] == 'contenido-pestanias.children':
+            return not dependencia.get('clientside_function')
+    return False
+
+def ronda(crea_cliente, usuarios, sesiones, semilla):
+    """Ejecuta sesiones concurrentes y devuelve (medidas por tipo, errores, duración)"""
+    medidas = {tipo: ([], []) for tipo in TIPOS}
+    errores = []
+    cerrojo = threading.Lock()
+    pestanias_servidor = pestanias_en_servidor(crea_cliente())
+
+    def usuario(indice):
+        cliente = crea_cliente()
+        rng = random.Random(semilla + indice)
+        propias = {tipo: ([], []) for tipo in TIPOS}
+        propios_errores = []
+
+        def anota(tipo, segundos, tamanio, estado):
+            propias[tipo][0].append(segundos)
+            propias[tipo][1].append(tamanio)
+            if estado >= 400:
+                propios_errores.append((tipo, estado))
+
+        for numero in range(sesiones):
+            sesion(cliente, rng, numero == 0, pestanias_servidor, anota)
+        with cerrojo:
+            for tipo in TIPOS:
+                medidas[tipo][0].extend(propias[tipo][0])
+                medidas[tipo][1].extend(propias[tipo][1])
+            errores.extend(propios_errores)
+
+    hilos = [threading.Thread(target=usuario, args=(indice,)) for indice in range(usuarios)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return medidas, errores, time.perf_counter() - inicio
+
+def resume(medidas, errores, duracion, usuarios, sesiones):
+    """Fila resumen (todas las peticiones) y filas por tipo de petición"""
+    todas = np.array([segundos for tipo in TIPOS for segundos in medidas[tipo][0]]) * 1000
+    fila = [usuarios, len(todas), len(errores), '{0:.0f}'.format(len(todas) / duracion),
+            '{0:.1f}'.format(usuarios * sesiones / duracion)]
+    fila += ['{0:.1f}'.format(np.percentile(todas, p)) for p in (50, 95, 99)]
+    por_tipo = []
+    for tipo in TIPOS:
+        latencias, tamanios = np.array(medidas[tipo][0]) * 1000, medidas[tipo][1]
+        if len(latencias):
+            por_tipo.append([usuarios, tipo, len(latencias)] +
+                            ['{0:.1f}'.format(np.percentile(latencias, p)) for p in (50, 95, 99)] +
+                            ['{0:.1f}'.format(np.mean(tamanios) / 1024.0)])
+    return fila, por_tipo
+
+def memoria_trabajadores(pid_maestro):
+    """RSS medio y total (MB) de los trabajadores de gunicorn (o de este proceso)"""
+    pids = hijos(pid_maestro) if pid_maestro != os.getpid() else [pid_maestro]
+    rss = [memoria_proceso(pid)[0] / 1024.0 for pid in pids]
+    return len(pids), '{0:.1f}'.format(np.mean(rss)), '{0:.1f}'.format(sum(rss))
+
+def entorno_temporal(temporal, args):
+    entorno = dict(os.environ, COVID_DIR_SNAPSHOTS=os.path.join(temporal, 'snapshots'),
+                   COVID_DIR_CACHE_CSV=os.path.join(temporal, 'cache_csv'),
+                   COVID_DIR_ESTATICOS=os.path.join(temporal, 'estaticos'))
+    entorno.setdefault('COVID_INTERVALO_REFRESCO', '0')
+    if args.dir_csv:
+        entorno['COVID_DIR_CSV'] = os.path.abspath(args.dir_csv)
+    return entorno
+
+def arranca_gunicorn(trabajadores, args, temporal):
+    entorno = entorno_temporal(temporal, args)
+    if args.config:
+        entorno['COVID_DIR_PLANO'] = os.path.join(temporal, 'plano')
+        config = os.path.abspath(args.config)
+    else:
+        # Configuración vacía: gunicorn >= 20 carga ./gunicorn.conf.py si no se indica otra
+        config = os.path.join(temporal, 'vacia.conf.py')
+        open(config, 'w').close()
+    orden = [sys.executable, '-m', 'gunicorn', '-w', str(trabajadores), '-b', '127.0.0.1:{0}'.format(args.puerto),
+             '--timeout', '300', '-c', config, 'app:server']
+    proceso = subprocess.Popen(orden, cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:{0}'.format(args.puerto)
+    espera_arranque(url, proceso)
+    while len(hijos(proceso.pid)) < trabajadores:
+        time.sleep(0.5)
+    return proceso, url
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV de la JHU (sin él se descargan)')
+    parser.add_argument('--modo', choices=['proceso', 'gunicorn'], default='proceso')
+    parser.add_argument('--trabajadores', type=int, nargs='+', default=[1], help='Sólo en modo gunicorn')
+    parser.add_argument('--config', help='Configuración de gunicorn (p. ej. gunicorn.conf.py con plano compartido)')
+    parser.add_argument('--usuarios', type=int, nargs='+', default=[1, 8, 32], help='Usuarios concurrentes')
+    parser.add_argument('--sesiones', type=int, default=5, help='Sesiones por usuario')
+    parser.add_argument('--calentamiento', type=int, default=1, help='Sesiones previas sin medir')
+    parser.add_argument('--puerto', type=int, default=8767)
+    parser.add_argument('--salida', help='Fichero JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    temporal = tempfile.mkdtemp(prefix='carga-')
+    resultados = []
+    try:
+        configuraciones = args.trabajadores if args.modo == 'gunicorn' else [1]
+        for trabajadores in configuraciones:
+            proceso = None
+            if args.modo == 'gunicorn':
+                proceso, url = arranca_gunicorn(trabajadores, args, temporal)
+                crea_cliente, pid = (lambda: ClienteHttp(url)), proceso.pid
+            else:
+                os.environ.update(entorno_temporal(temporal, args))
+                import app
+                crea_cliente, pid = (lambda: ClienteProceso(app)), os.getpid()
+            try:
+                # Calentamiento: cachés de pestañas y respuestas y recursos estáticos
+                ronda(crea_cliente, max(trabajadores, 1), args.calentamiento, semilla=1000)
+                filas, detalle = [], []
+                for usuarios in args.usuarios:
+                    medidas, errores, duracion = ronda(crea_cliente, usuarios, args.sesiones, semilla=0)
+                    fila, por_tipo = resume(medidas, errores, duracion, usuarios, args.sesiones)
+                    numero, rss_medio, rss_total = memoria_trabajadores(pid)
+                    filas.append([trabajadores] + fila + [rss_medio, rss_total])
+                    detalle.extend([trabajadores] + tipo for tipo in por_tipo)
+                    resultados.append({'trabajadores': trabajadores, 'procesos': numero, 'usuarios': usuarios,
+                                       'peticiones': fila[1], 'errores': fila[2], 'peticiones_s': float(fila[3]),
+                                       'sesiones_s': float(fila[4]), 'p50_ms': float(fila[5]),
+                                       'p95_ms': float(fila[6]), 'p99_ms': float(fila[7]),
+                                       'rss_medio_mb': float(rss_medio), 'rss_total_mb': float(rss_total),
+                                       'tipos': {tipo[1]: {'peticiones': tipo[2], 'p50_ms': float(tipo[3]),
+                                                           'p95_ms': float(tipo[4]), 'p99_ms': float(tipo[5]),
+                                                           'kb_medio': float(tipo[6])} for tipo in por_tipo}})
+                    print('  '.join(str(valor) for valor in filas[-1]), file=sys.stderr)
+            finally:
+                if proceso is not None:
+                    proceso.terminate()
+                    proceso.wait()
+            print('Modo {0}, {1} sesiones por usuario'.format(args.modo, args.sesiones))
+            imprime_tabla(filas, ['trabajadores', 'usuarios', 'peticiones', 'errores', 'peticiones/s', 'sesiones/s',
+                                  'p50 ms', 'p95 ms', 'p99 ms', 'RSS/trab. MB', 'RSS total MB'])
+            print('')
+            imprime_tabla(detalle, ['trabajadores', 'usuarios', 'tipo', 'peticiones', 'p50 ms', 'p95 ms', 'p99 ms',
+                                    'KB medio'])
+            print('')
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    if args.salida:
+        with open(args.salida, 'w') as fichero:
+            json.dump({'modo': args.modo, 'sesiones': args.sesiones, 'resultados': resultados}, fichero, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Utilidades comunes de los benchmarks: lectura de las series y medición de tiempos.
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+URL_BASE = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/'
+FICHEROS_SERIES = {'confirmados': 'time_series_covid19_confirmed_global.csv',
+                   'fallecidos': 'time_series_covid19_deaths_global.csv',
+                   'recuperados': 'time_series_covid19_recovered_global.csv'}
+
+
+def lee_series(dir_csv=None):
+    """Lee las tres series de la JHU desde un directorio local o desde GitHub"""
+    base = dir_csv if dir_csv else URL_BASE
+    return {nombre: pd.read_csv(os.path.join(base, fichero) if dir_csv else base + fichero)
+            for nombre, fichero in FICHEROS_SERIES.items()}
+
+def cronometra(funcion, repeticiones=5):
+    """Devuelve el mejor tiempo (segundos) de varias ejecuciones de funcion()"""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def memoria_frames(frames):
+    """Bytes ocupados por una lista de dataframes, incluyendo las columnas de texto"""
+    return int(sum(df.memory_usage(deep=True).sum() for df in frames))
+
+def imprime_tabla(filas, cabecera):
+    anchos = [max(len(str(fila[i])) for fila in [cabecera] + filas) for i in range(len(cabecera))]
+    for fila in [cabecera] + filas:
+        print('  '.join(str(valor).rjust(ancho) for valor, ancho in zip(fila, anchos)))
+
+def genera_series(regiones, dias, semilla=0):
+    """
+    Genera {métrica: dataframe} con el formato ancho de la JHU: `regiones` filas (unas
+    cuantas con estado dentro de los mismos países) y `dias` columnas de fecha
+    """
+    import numpy as np
+    rng = np.random.RandomState(semilla)
+    fechas = pd.date_range('2020-01-22', periods=dias, freq='D')
+    columnas = ['{0}/{1}/{2}'.format(fecha.month, fecha.day, fecha.strftime('%y')) for fecha in fechas]
+    paises = ['Pais{0}'.format(i // 4 if i < regiones // 2 else i) for i in range(regiones)]
+    estados = ['Estado{0}'.format(i) if i < regiones // 2 else np.nan for i in range(regiones)]
+    # Localizaciones fijas que usa el dashboard
+    for fila, (estado, pais) in enumerate([('Hubei', 'China'), ('Beijing', 'China'), (np.nan, 'US'),
+                                           (np.nan, 'Italy'), (np.nan, 'Spain')]):
+        estados[fila], paises[fila] = estado, pais
+    base = rng.randint(1, 500, size=(regiones, 1))
+    series = {}
+    for nombre, factor in [('confirmados', 1.0), ('fallecidos', 0.03), ('recuperados', 0.6)]:
+        incrementos = rng.poisson(base * factor * np.linspace(0, 1, dias)[None, :])
+        df = pd.DataFrame(np.cumsum(incrementos, axis=1), columns=columnas)
+        df.insert(0, 'Province/State', estados)
+        df.insert(1, 'Country/Region', paises)
+        df.insert(2, 'Lat', rng.uniform(-60, 60, regiones))
+        df.insert(3, 'Long', rng.uniform(-180, 180, regiones))
+        series[nombre] = df
+    return series
+
+def escribe_series(directorio, regiones, dias, semilla=0):
+    """
+    Escribe en `directorio` los tres CSV de genera_series con los nombres de fichero de
+    la JHU, listos para usar como COVID_DIR_CSV. Devuelve el tamaño total en bytes
+    """
+    if not os.path.isdir(directorio):
+        os.makedirs(directorio)
+    total = 0
+    for nombre, df in genera_series(regiones, dias, semilla).items():
+        ruta = os.path.join(directorio, FICHEROS_SERIES[nombre])
+        df.to_csv(ruta, index=False)
+        total += os.path.getsize(ruta)
+    return total
+
+FICHEROS_CONDADOS = {'confirmados': 'time_series_covid19_confirmed_US.csv',
+                     'fallecidos': 'time_series_covid19_deaths_US.csv'}
+
+def genera_condados(condados, dias, semilla=0):
+    """
+    Genera {métrica: dataframe} con el formato de los CSV por condado de EE. UU. de la
+    JHU: metadatos (UID, FIPS, Admin2, Province_State, Lat, Long_...; Population en
+    fallecidos) y `dias` columnas de fecha, con los condados repartidos en 56 estados
+    """
+    import numpy as np
+    rng = np.random.RandomState(semilla)
+    fechas = pd.date_range('2020-01-22', periods=dias, freq='D')
+    columnas = ['{0}/{1}/{2}'.format(fecha.month, fecha.day, fecha.strftime('%y')) for fecha in fechas]
+    estado = np.arange(condados) * 56 // max(condados, 1)
+    fips = (estado + 1) * 1000 + np.arange(condados) % 1000
+    metadatos = pd.DataFrame({'UID': 84000000 + fips, 'iso2': 'US', 'iso3': 'USA', 'code3': 840,
+                              'FIPS': fips.astype(np.float64),
+                              'Admin2': ['Condado{0}'.format(i) for i in range(condados)],
+                              'Province_State': ['Estado{0}'.format(e) for e in estado], 'Country_Region': 'US',
+                              'Lat': rng.uniform(20, 60, condados), 'Long_': rng.uniform(-160, -70, condados)})
+    metadatos['Combined_Key'] = metadatos['Admin2'] + ', ' + metadatos['Province_State'] + ', US'
+    base = rng.randint(1, 200, size=(condados, 1))
+    series = {}
+    for nombre, factor in [('confirmados', 1.0), ('fallecidos', 0.02)]:
+        incrementos = rng.poisson(base * factor * np.linspace(0, 1, dias)[None, :])
+        df = metadatos.copy()
+        if nombre == 'fallecidos':
+            df['Population'] = rng.randint(1000, 1000000, condados)
+        series[nombre] = pd.concat([df, pd.DataFrame(np.cumsum(incrementos, axis=1), columns=columnas)], axis=1)
+    return series
+
+def escribe_condados(directorio, condados, dias, semilla=0):
+    """Escribe en `directorio` los CSV de genera_condados. Devuelve el tamaño total en bytes"""
+    if not os.path.isdir(directorio):
+        os.makedirs(directorio)
+    total = 0
+    for nombre, df in genera_condados(condados, dias, semilla).items():
+        ruta = os.path.join(directorio, FICHEROS_CONDADOS[nombre])
+        df.to_csv(ruta, index=False)
+        total += os.path.getsize(ruta)
+    return total
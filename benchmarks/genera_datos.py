@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Genera los tres CSV de la JHU (formato ancho: Province/State, Country/Region, Lat, Long
+y una columna por fecha m/d/yy) con datos sintéticos del tamaño pedido, para usarlos
+como COVID_DIR_CSV o con --dir-csv en los benchmarks. Con --condados escribe también
+los dos CSV por condado de EE. UU. (COVID_CONDADOS_EEUU=1).
+
+    $ python benchmarks/genera_datos.py --regiones 3300 --dias 1000 --salida /tmp/jhu_3300x1000
+    $ python benchmarks/genera_datos.py --dias 1000 --condados 3300 --salida /tmp/jhu_eeuu
+"""
+import argparse
+
+from comun import escribe_condados, escribe_series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--regiones', type=int, default=300)
+    parser.add_argument('--dias', type=int, default=100)
+    parser.add_argument('--condados', type=int, default=0, help='Condados de los CSV de EE. UU. (0: sin ellos)')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', required=True, help='Directorio donde se escriben los CSV')
+    args = parser.parse_args()
+    tamanio = escribe_series(args.salida, args.regiones, args.dias, args.semilla)
+    print('{0} regiones x {1} días: {2:.1f} MB en {3}'.format(args.regiones, args.dias, tamanio / 1e6, args.salida))
+    if args.condados:
+        tamanio = escribe_condados(args.salida, args.condados, args.dias, args.semilla)
+        print('{0} condados x {1} días: {2:.1f} MB en {3}'.format(args.condados, args.dias, tamanio / 1e6,
+                                                                  args.salida))
+
+
+if __name__ == '__main__':
+    main()
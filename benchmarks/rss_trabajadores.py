@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Memoria por trabajador de gunicorn con y sin plano de datos compartido.
+
+Arranca gunicorn con 1, 4 y 8 trabajadores en dos modos: 'privado' (cada trabajador
+importa la app y lee los datos por su cuenta, como `gunicorn app:server`) y
+'compartido' (gunicorn.conf.py: preload y plano de datos mapeado en memoria). Tras
+pedir todas las pestañas varias veces mide en /proc el RSS, el PSS (memoria compartida
+repartida entre los procesos que la usan) y el USS (memoria privada) de cada trabajador.
+Sólo funciona en Linux.
+
+    $ python benchmarks/rss_trabajadores.py --dir-csv /ruta/a/csv_jhu --trabajadores 1 4 8
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import Request, urlopen
+
+from comun import RAIZ, imprime_tabla
+
+
+PESTANIAS = ['pestania-china', 'pestania-espania', 'pestania-out-china',
+             'pestania-edad-patologias', 'pestania-consejos', 'pestania-analisis']
+
+
+def memoria_proceso(pid):
+    """RSS, PSS y USS (KB) de un proceso a partir de /proc/<pid>/smaps_rollup"""
+    memoria = {'Rss': 0, 'Pss': 0, 'Private_Clean': 0, 'Private_Dirty': 0}
+    with open('/proc/{0}/smaps_rollup'.format(pid)) as fichero:
+        for linea in fichero:
+            partes = linea.split()
+            if partes and partes[0].rstrip(':') in memoria:
+                memoria[partes[0].rstrip(':')] = int(partes[1])
+    return memoria['Rss'], memoria['Pss'], memoria['Private_Clean'] + memoria['Private_Dirty']
+
+def hijos(pid):
+    resultado = []
+    for nombre in os.listdir('/proc'):
+        if not nombre.isdigit():
+            continue
+        try:
+            with open('/proc/{0}/stat'.format(nombre)) as fichero:
+                campos = fichero.read().rsplit(')', 1)[1].split()
+        except (IOError, OSError):
+            continue
+        if int(campos[1]) == pid:
+            resultado.append(int(nombre))
+    return resultado
+
+def pide(url, cuerpo=None):
+    datos = None if cuerpo is None else json.dumps(cuerpo).encode('utf-8')
+    peticion = Request(url, data=datos, headers={'Content-Type': 'application/json'})
+    with urlopen(peticion, timeout=60) as respuesta:
+        return respuesta.read()
+
+def espera_arranque(url, proceso, limite=300):
+    inicio = time.time()
+    while time.time() - inicio < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError('gunicorn ha terminado al arrancar')
+        try:
+            return pide(url + '/version-datos')
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError('gunicorn no ha arrancado en {0} s'.format(limite))
+
+def mide(modo, trabajadores, args, puerto):
+    temporal = tempfile.mkdtemp(prefix='rss-')
+    entorno = dict(os.environ, COVID_DIR_SNAPSHOTS=os.path.join(temporal, 'snapshots'),
+                   COVID_DIR_CACHE_CSV=os.path.join(temporal, 'cache_csv'),
+                   COVID_DIR_ESTATICOS=os.path.join(temporal, 'estaticos'),
+                   COVID_INTERVALO_REFRESCO='0')
+    if args.dir_csv:
+        entorno['COVID_DIR_CSV'] = os.path.abspath(args.dir_csv)
+    orden = [sys.executable, '-m', 'gunicorn', '-w', str(trabajadores), '-b', '127.0.0.1:{0}'.format(puerto),
+             '--timeout', '300']
+    if modo == 'compartido':
+        entorno['COVID_DIR_PLANO'] = os.path.join(temporal, 'plano')
+        orden += ['-c', os.path.join(RAIZ, 'gunicorn.conf.py')]
+    else:
+        # Configuración vacía: gunicorn >= 20 carga ./gunicorn.conf.py si no se indica otra
+        vacia = os.path.join(temporal, 'vacia.conf.py')
+        open(vacia, 'w').close()
+        orden += ['-c', vacia]
+    orden.append('app:server')
+    proceso = subprocess.Popen(orden, cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:{0}'.format(puerto)
+    try:
+        espera_arranque(url, proceso)
+        # Se espera a que todos los trabajadores hayan arrancado y se reparten las peticiones
+        while len(hijos(proceso.pid)) < trabajadores:
+            time.sleep(0.5)
+        time.sleep(2)
+        for _ in range(args.rondas * trabajadores):
+            pide(url + '/')
+            pide(url + '/_dash-layout')
+            for pestania in PESTANIAS:
+                pide(url + '/_dash-update-component', {
+                    'output': 'contenido-pestanias.children',
+                    'outputs': {'id': 'contenido-pestanias', 'property': 'children'},
+                    'inputs': [{'id': 'menu-pestanias', 'property': 'value', 'value': pestania}],
+                    'changedPropIds': ['menu-pestanias.value'], 'state': []})
+        medidas = [memoria_proceso(pid) for pid in hijos(proceso.pid)]
+        maestro = memoria_proceso(proceso.pid)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(temporal, ignore_errors=True)
+    media = [sum(medida[i] for medida in medidas) / len(medidas) / 1024.0 for i in range(3)]
+    pss_total = (sum(medida[1] for medida in medidas) + maestro[1]) / 1024.0
+    return [modo, trabajadores] + ['{0:.1f}'.format(valor) for valor in media] + ['{0:.1f}'.format(pss_total)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir-csv', help='Directorio con los CSV de la JHU (sin él se descargan)')
+    parser.add_argument('--trabajadores', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--modos', nargs='+', default=['privado', 'compartido'])
+    parser.add_argument('--rondas', type=int, default=3, help='Rondas de peticiones por trabajador')
+    parser.add_argument('--puerto', type=int, default=8765)
+    args = parser.parse_args()
+
+    filas = []
+    for trabajadores in args.trabajadores:
+        for modo in args.modos:
+            filas.append(mide(modo, trabajadores, args, args.puerto))
+            print('  '.join(str(valor) for valor in filas[-1]), file=sys.stderr)
+    imprime_tabla(filas, ['modo', 'trabajadores', 'RSS/trab. MB', 'PSS/trab. MB', 'USS/trab. MB',
+                          'PSS total MB'])
+
+
+if __name__ == '__main__':
+    main()
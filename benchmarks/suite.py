@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Suite de micro-benchmarks sobre datos sintéticos con el formato de la JHU.
+
+Para cada tamaño (regiones x días) genera los CSV y mide el tiempo (mejor de N
+ejecuciones) y el pico de memoria reservada (tracemalloc, una ejecución) de cada etapa:
+ingesta, preparación de los datos, series por país, evolución de una localización,
+agregado por país, ranking de países y carrera de barras, ajuste de curvas, figuras de kpis, cada pestaña
+y el refresco completo. Las etapas
+'*_original' son las implementaciones con dataframes anchos de antes del cubo, como
+referencia. Los resultados se guardan en JSON con el commit medido y se pueden
+comparar con los de otro commit:
+
+    $ python benchmarks/suite.py --regiones 300 3300 --dias 100 1000 --salida antes.json
+    $ python benchmarks/suite.py --regiones 300 3300 --dias 100 1000 --compara antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+from comun import RAIZ, cronometra, escribe_series, imprime_tabla
+from bench_cubo import localizacion_pais_frames, prepara_frames
+
+
+UMBRAL_REGRESION = 0.2 # Aumento relativo del tiempo a partir del cual se marca una regresión
+
+
+def importa_app(temporal):
+    """
+    Importa app.py sin leer datos al importar (arranque rápido y sin hilo de refresco)
+    y con snapshots, caché de CSV y estáticos en un directorio temporal
+    """
+    os.environ.update(COVID_ARRANQUE_RAPIDO='1', COVID_REFRESCO_EN_TRABAJADORES='1', COVID_INTERVALO_REFRESCO='0',
+                      COVID_DIR_SNAPSHOTS=os.path.join(temporal, 'snapshots'),
+                      COVID_DIR_CACHE_CSV=os.path.join(temporal, 'cache_csv'),
+                      COVID_DIR_ESTATICOS=os.path.join(temporal, 'estaticos'))
+    os.environ.pop('COVID_DIR_PLANO', None)
+    # read_csv avisa de tipos mezclados en Province/State con muchas regiones sin estado
+    warnings.filterwarnings('ignore', message='Columns .* have mixed types')
+    # Las rutas de los mapas de app.py son relativas a la raíz del repositorio
+    os.chdir(RAIZ)
+    import app
+    return app
+
+def pico_memoria(funcion):
+    """Pico de memoria (bytes) reservada durante una ejecución de funcion()"""
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def etapas(app, series, estado):
+    """Lista de (nombre, función) a medir sobre unas series y el estado construido con ellas"""
+    import numpy as np
+    from cache import serializa_componentes
+    from cubo import CuboSeries
+    from ranking import RankingPaises
+    from ajustes import AjustesCurvas
+
+    cubo = estado.cubo
+    frames = prepara_frames(series)
+    fila = estado.filas_tendencia['esp']
+
+    def carrera_original():
+        # Un groupby por fotograma sobre el dataframe ancho de confirmados
+        fechas = [cubo.fechas[dia] for dia in estado.ranking.dias_fotogramas()]
+        agrupado = frames[0].groupby('Country/Region')
+        return [agrupado[fecha].sum().nlargest(10) for fecha in fechas]
+
+    def pestania(tab):
+        def construye():
+            # Sin la caché de figuras de la pestaña por país: se mide la construcción
+            app.CACHE_FIGURAS.vacia()
+            return serializa_componentes(app.construye_pestania(tab, estado))
+        return construye
+
+    lista = [
+        ('ingesta', lambda: app.lee_series_jhu(usa_snapshot=False)),
+        ('preparacion', lambda: CuboSeries.desde_series(series)),
+        ('preparacion_original', lambda: prepara_frames(series)),
+        ('localizacion_pais', lambda: app.devuelve_dfs_localizacion_pais(cubo, 'Spain')),
+        ('localizacion_sin_pais', lambda: app.devuelve_dfs_localizacion_pais(cubo, 'China', flag_not=True)),
+        ('localizacion_pais_original', lambda: localizacion_pais_frames(*frames, 'Spain')),
+        ('evolucion_local', lambda: app.series_tendencia(estado, fila, 'acumulados')),
+        ('evolucion_local_media7', lambda: app.series_tendencia(estado, fila, 'media7')),
+        ('agregado_paises', lambda: np.add.reduceat(cubo.regiones, cubo.inicio_pais, axis=1, dtype=np.int64)),
+        ('agregado_paises_original', lambda: frames[0].groupby(['Country/Region']).sum(numeric_only=True)),
+        ('ranking_paises', lambda: RankingPaises.calcula(cubo)),
+        ('carrera_paises', lambda: serializa_componentes(estado.ranking.figura_carrera('confirmados'))),
+        ('carrera_paises_original', carrera_original),
+        ('ajustes_curvas', lambda: AjustesCurvas.calcula(cubo)),
+        ('figura_kpis', lambda: app.devuelve_figura_con_kpis(1000, 100, 500)),
+        ('figura_kpis_doble', lambda: app.devuelve_figura_con_kpis_doble([1000, 10], [100, 1], [500, 5])),
+    ]
+    lista += [('pestania:' + tab, pestania(tab)) for tab in app.PESTANIAS]
+    lista.append(('refresco_completo', lambda: app.construye_estado(usa_snapshot=False)))
+    return lista
+
+def mide_caso(app, regiones, dias, args, temporal):
+    directorio = os.path.join(temporal, 'csv_{0}x{1}'.format(regiones, dias))
+    tamanio_csv = escribe_series(directorio, regiones, dias, args.semilla)
+    app.DIR_CSV = directorio
+    series, _, _ = app.lee_series_jhu(usa_snapshot=False)
+    estado = app.construye_estado(usa_snapshot=False)
+    resultado = {'regiones': regiones, 'dias': dias, 'mb_csv': round(tamanio_csv / 1e6, 3),
+                 'mb_cubo': round(estado.cubo.nbytes / 1e6, 3), 'etapas': {}}
+    for nombre, funcion in etapas(app, series, estado):
+        if args.etapas and not any(nombre.startswith(prefijo) for prefijo in args.etapas):
+            continue
+        segundos = cronometra(funcion, args.repeticiones)
+        resultado['etapas'][nombre] = {'segundos': segundos, 'pico_mb': round(pico_memoria(funcion) / 1e6, 3)}
+        print('{0}x{1}  {2:<34}{3:>10.2f} ms{4:>10.1f} MB'.format(
+            regiones, dias, nombre, segundos * 1000, resultado['etapas'][nombre]['pico_mb']), file=sys.stderr)
+    shutil.rmtree(directorio, ignore_errors=True)
+    return resultado
+
+def commit_actual():
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True)
+        return salida.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def versiones_librerias():
+    versiones = {}
+    for nombre in ['numpy', 'pandas', 'dash', 'plotly']:
+        try:
+            versiones[nombre] = __import__(nombre).__version__
+        except ImportError:
+            versiones[nombre] = None
+    return versiones
+
+def compara(anteriores, actuales, umbral):
+    """Tabla con el tiempo de cada etapa en ambos resultados y las regresiones marcadas"""
+    casos = {(caso['regiones'], caso['dias']): caso['etapas'] for caso in anteriores['casos']}
+    filas = []
+    for caso in actuales['casos']:
+        previas = casos.get((caso['regiones'], caso['dias']), {})
+        for nombre, medida in caso['etapas'].items():
+            if nombre not in previas:
+                continue
+            antes, ahora = previas[nombre]['segundos'], medida['segundos']
+            ratio = ahora / antes if antes > 0 else float('inf')
+            filas.append(['{0}x{1}'.format(caso['regiones'], caso['dias']), nombre, '{0:.2f}'.format(antes * 1000),
+                          '{0:.2f}'.format(ahora * 1000), '{0:.2f}x'.format(ratio),
+                          'REGRESIÓN' if ratio > 1 + umbral else ''])
+    print('Comparación con {0} ({1})'.format(anteriores.get('commit'), anteriores.get('fecha')))
+    imprime_tabla(filas, ['caso', 'etapa', 'antes ms', 'ahora ms', 'ratio', ''])
+    return sum(1 for fila in filas if fila[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--regiones', type=int, nargs='+', default=[300, 3300])
+    parser.add_argument('--dias', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--etapas', nargs='+', help='Sólo las etapas que empiezan por estos prefijos')
+    parser.add_argument('--salida', help='Fichero JSON de resultados (por defecto suite-<commit>.json)')
+    parser.add_argument('--compara', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION)
+    args = parser.parse_args()
+
+    temporal = tempfile.mkdtemp(prefix='suite-')
+    directorio_inicial = os.getcwd()
+    try:
+        app = importa_app(temporal)
+        casos = [mide_caso(app, regiones, dias, args, temporal) for regiones in args.regiones for dias in args.dias]
+    finally:
+        os.chdir(directorio_inicial)
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    commit = commit_actual()
+    resultados = {'commit': commit, 'fecha': datetime.now().isoformat(timespec='seconds'),
+                  'python': platform.python_version(), 'librerias': versiones_librerias(),
+                  'repeticiones': args.repeticiones, 'casos': casos}
+    salida = args.salida or 'suite-{0}.json'.format(commit or int(time.time()))
+    with open(salida, 'w') as fichero:
+        json.dump(resultados, fichero, indent=1)
+    print('Resultados guardados en {0}'.format(salida))
+    if args.compara:
+        with open(args.compara) as fichero:
+            regresiones = compara(json.load(fichero), resultados, args.umbral)
+        sys.exit(1 if regresiones else 0)
+
+
+if __name__ == '__main__':
+    main()
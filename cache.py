@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caché de respuestas precalculadas por versión de los datos.
+
+Las entradas se indexan por (clave, versión) y cada clave lleva sus propias versiones:
+al aparecer una versión nueva de una clave se descartan las más antiguas de esa clave,
+de modo que sólo conviven la versión servida y la que se está calentando. Así una
+clave a la que no afecta un cambio de los datos conserva su versión y su entrada.
+"""
+import collections
+import gzip
+import json
+import threading
+
+import flask
+import plotly
+
+from estaticos import codificacion_aceptada
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def serializa_componentes(arbol):
+    """
+    Convierte un árbol de componentes Dash (con figuras plotly y arrays numpy) en una
+    estructura de dicts y listas ya serializable, que Dash vuelve a codificar sin coste
+    """
+    return json.loads(json.dumps(arbol, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+class CacheVersionada(object):
+    """
+    Diccionario (clave, versión) -> valor con contadores de aciertos y fallos
+    """
+    def __init__(self, max_versiones=2):
+        self.max_versiones = max_versiones
+        self._entradas = {}
+        self._versiones = {}
+        self._retiradas = {}
+        self._cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _registra_version(self, clave, version):
+        versiones = self._versiones.setdefault(clave, [])
+        retiradas = self._retiradas.setdefault(clave, [])
+        if version in versiones or version in retiradas:
+            return
+        versiones.append(version)
+        while len(versiones) > self.max_versiones:
+            antigua = versiones.pop(0)
+            self._entradas.pop((clave, antigua), None)
+            # Sólo se recuerdan las últimas retiradas de cada clave: basta para rechazar
+            # una construcción tardía de una versión anterior
+            retiradas.append(antigua)
+            del retiradas[:-self.max_versiones]
+
+    def consulta(self, clave, version):
+        """Devuelve el valor guardado o None, contando el acierto o el fallo"""
+        valor = self._entradas.get((clave, version))
+        with self._cerrojo:
+            if valor is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return valor
+
+    def guarda(self, clave, version, valor):
+        with self._cerrojo:
+            self._registra_version(clave, version)
+            if version in self._versiones[clave]:
+                self._entradas[(clave, version)] = valor
+        return valor
+
+    def obtiene(self, clave, version, construye):
+        """Devuelve el valor guardado o lo construye con construye() y lo guarda"""
+        valor = self.consulta(clave, version)
+        if valor is None:
+            valor = self.guarda(clave, version, construye())
+        return valor
+
+    def calienta(self, versiones, construye):
+        """
+        Precalcula construye(clave) para cada clave de {clave: versión}, salvo las que ya
+        están guardadas en esa versión
+        """
+        for clave, version in versiones.items():
+            if (clave, version) not in self._entradas:
+                self.guarda(clave, version, construye(clave))
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {'aciertos': self.aciertos, 'fallos': self.fallos,
+                'ratio_aciertos': float(self.aciertos) / consultas if consultas else None,
+                'entradas': len(self._entradas),
+                'versiones': {str(clave): list(versiones) for clave, versiones in self._versiones.items()}}
+
+
+class CacheLRU(object):
+    """
+    Diccionario de capacidad acotada que descarta la entrada usada hace más tiempo, con
+    contadores de aciertos y fallos
+    """
+    def __init__(self, capacidad=512):
+        self.capacidad = capacidad
+        self._entradas = collections.OrderedDict()
+        self._cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtiene(self, clave, construye):
+        """Devuelve el valor guardado o lo construye con construye() y lo guarda"""
+        with self._cerrojo:
+            valor = self._entradas.get(clave)
+            if valor is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return valor
+            self.fallos += 1
+        # Se construye fuera del cerrojo: dos peticiones simultáneas pueden construir
+        # el mismo valor, pero ninguna espera a las demás
+        valor = construye()
+        with self._cerrojo:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def vacia(self):
+        with self._cerrojo:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {'aciertos': self.aciertos, 'fallos': self.fallos,
+                'ratio_aciertos': float(self.aciertos) / consultas if consultas else None,
+                'entradas': len(self._entradas), 'capacidad': self.capacidad}
+
+
+def instala_cache_respuestas(server, cache, salida, valores, obtiene_version):
+    """
+    Envuelve la vista /_dash-update-component para servir directamente, sin pasar por
+    Dash, la respuesta ya codificada (y comprimida) de los callbacks cuya salida es
+    `salida` (p. ej. 'contenido-pestanias.children') y que tienen una única entrada.
+    Sólo se guardan los valores de entrada de `valores`; los demás van siempre a Dash.
+    La versión de cada respuesta es obtiene_version(valor de entrada). La primera
+    petición de cada (valor de entrada, versión) pasa por Dash y se guarda.
+    """
+    endpoint = [regla.endpoint for regla in server.url_map.iter_rules()
+                if regla.rule.endswith('_dash-update-component')][0]
+    vista_original = server.view_functions[endpoint]
+    valores = frozenset(valores)
+
+    def vista_con_cache(*args, **kwargs):
+        cuerpo = flask.request.get_json(silent=True)
+        cuerpo = cuerpo if isinstance(cuerpo, dict) else {}
+        entradas = cuerpo.get('inputs') or []
+        if cuerpo.get('output') != salida or not isinstance(entradas, list) or len(entradas) != 1 \
+                or not isinstance(entradas[0], dict) or not isinstance(entradas[0].get('value'), str) \
+                or entradas[0]['value'] not in valores:
+            return vista_original(*args, **kwargs)
+
+        clave = ('respuesta', entradas[0]['value'])
+        version = obtiene_version(entradas[0]['value'])
+        entrada = cache.consulta(clave, version)
+        # Para la instrumentación (instrumentacion.py): resultado de la caché y tamaño sin comprimir
+        flask.g.cache_respuesta = 'fallo' if entrada is None else 'acierto'
+        if entrada is None:
+            respuesta = vista_original(*args, **kwargs)
+            if respuesta.status_code != 200 or respuesta.headers.get('Content-Encoding'):
+                return respuesta
+            datos = respuesta.get_data()
+            entrada = cache.guarda(clave, version, (datos, gzip.compress(datos, 6)))
+        datos, datos_gzip = entrada
+        flask.g.bytes_respuesta = len(datos)
+        if codificacion_aceptada(['gzip']) == 'gzip':
+            respuesta = flask.Response(datos_gzip, mimetype='application/json')
+            respuesta.headers['Content-Encoding'] = 'gzip'
+            respuesta.headers['Vary'] = 'Accept-Encoding'
+            return respuesta
+        return flask.Response(datos, mimetype='application/json')
+
+    server.view_functions[endpoint] = vista_con_cache
+    return vista_con_cache
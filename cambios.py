@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Detección de cambios entre dos versiones del cubo de datos.
+
+La JHU reescribe a menudo el histórico: corrige valores pasados, renombra provincias y
+añade regiones. En lugar de dar por cambiado todo el cubo, se compara la versión nueva
+con la anterior:
+  1. Huella por (métrica, región) de los días comunes: una suma ponderada módulo 2^64
+     con un peso pseudoaleatorio por día. Es aditiva por rangos de días, así que la
+     huella completa de la versión anterior se guarda y sólo hay que recorrer el cubo nuevo.
+  2. Sólo en las regiones cuya huella difiere se comparan las columnas para obtener el
+     rango exacto de días cambiados por métrica.
+  3. Se buscan anomalías (casos diarios negativos, más fallecidos o recuperados que
+     confirmados) sólo en las celdas nuevas o cambiadas.
+El informe indica qué filas del cubo (regiones y sus agregados) y qué países se ven
+afectados, para invalidar sólo lo que depende de ellos.
+"""
+import numpy as np
+
+from cubo import METRICAS
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+DIAS_BLOQUE_HUELLA = 128 # Días por bloque al calcular huellas, para acotar la memoria temporal
+MAX_DETALLE = 1000 # Entradas como máximo en las listas de celdas cambiadas y anomalías
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def pesos_dias(inicio, fin):
+    """Peso pseudoaleatorio (splitmix64) de cada día en [inicio, fin)"""
+    z = (np.arange(inicio, fin, dtype=np.uint64) + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def huellas_filas(valores, inicio=0, fin=None):
+    """
+    Huella uint64 (métrica, fila) de los días [inicio, fin) de un array (métrica, fila,
+    día). La huella de [a, c) es la suma (módulo 2^64) de las de [a, b) y [b, c).
+    """
+    fin = valores.shape[2] if fin is None else fin
+    huellas = np.zeros(valores.shape[:2], dtype=np.uint64)
+    for desde in range(inicio, fin, DIAS_BLOQUE_HUELLA):
+        hasta = min(desde + DIAS_BLOQUE_HUELLA, fin)
+        huellas += np.matmul(valores[:, :, desde:hasta].astype(np.uint64), pesos_dias(desde, hasta))
+    return huellas
+
+def claves_regiones(cubo):
+    return list(zip(cubo.estados.tolist(), cubo.paises_region.tolist()))
+
+def busca_anomalias(cubo, filas, desde, hasta=None):
+    """
+    Anomalías de las regiones `filas` en los días [desde, hasta): casos diarios
+    negativos y más fallecidos o recuperados que confirmados. Devuelve una lista de
+    (tipo, fila, métrica, día, valor).
+    """
+    hasta = len(cubo.fechas) if hasta is None else hasta
+    filas = np.asarray(filas, dtype=np.intp)
+    if not len(filas) or desde >= hasta:
+        return []
+    inicio = max(desde - 1, 0)
+    valores = cubo.valores[:, filas, inicio:hasta].astype(np.int64)
+    anomalias = []
+    # Casos diarios negativos: el acumulado baja respecto al día anterior
+    diarios = np.diff(valores, axis=2)
+    if desde == 0:
+        diarios = np.concatenate([valores[:, :, :1], diarios], axis=2)
+    for metrica, fila, dia in zip(*np.nonzero(diarios < 0)):
+        anomalias.append(('diario_negativo', int(filas[fila]), METRICAS[metrica], desde + int(dia),
+                          int(diarios[metrica, fila, dia])))
+    actuales = valores[:, :, desde - inicio:]
+    for metrica in (1, 2):
+        for fila, dia in zip(*np.nonzero(actuales[metrica] > actuales[0])):
+            anomalias.append(('{0}_sobre_confirmados'.format(METRICAS[metrica]), int(filas[fila]),
+                              METRICAS[metrica], desde + int(dia), int(actuales[metrica, fila, dia])))
+    return anomalias
+
+
+class InformeCambios(object):
+    """
+    Resultado de comparar dos versiones del cubo:
+      - fechas_compatibles: las fechas anteriores son un prefijo de las nuevas
+      - fechas_nuevas: fechas añadidas al final
+      - regiones_nuevas, regiones_eliminadas: claves (estado, país)
+      - regiones_renombradas: pares (clave anterior, clave nueva) con los mismos valores
+      - revisiones: (fila nueva, métrica, primer día, último día, celdas) de las regiones
+        comunes con valores pasados cambiados
+      - anomalias: (tipo, fila nueva, métrica, día, valor) en las celdas nuevas o cambiadas
+      - huellas: huellas completas del cubo nuevo, para la siguiente comparación
+    """
+    def __init__(self, cubo, **kwargs):
+        self.cubo = cubo
+        self.__dict__.update(kwargs)
+
+    @property
+    def misma_estructura(self):
+        """Mismas regiones en las mismas filas y fechas anteriores como prefijo"""
+        return self.fechas_compatibles and self.mismas_filas
+
+    @property
+    def filas_revisadas(self):
+        """Filas de regiones del cubo nuevo con valores pasados cambiados"""
+        return np.unique(np.array([revision[0] for revision in self.revisiones], dtype=np.intp))
+
+    @property
+    def primer_dia_revisado(self):
+        """Primer día con valores cambiados (None si no hay revisiones)"""
+        return min(revision[2] for revision in self.revisiones) if self.revisiones else None
+
+    @property
+    def filas_cubo_revisadas(self):
+        """Filas del cubo nuevo afectadas por las revisiones: regiones, sus países y el total"""
+        regiones = self.filas_revisadas
+        if not len(regiones):
+            return regiones
+        paises = self.cubo.fila_pais[np.unique(self.cubo.codigos_pais[regiones])]
+        return np.unique(np.concatenate([regiones, paises, [self.cubo.fila_total]])).astype(np.intp)
+
+    @property
+    def paises_afectados(self):
+        """Países con valores revisados o con regiones nuevas, eliminadas o renombradas"""
+        paises = set(self.cubo.paises_region[self.filas_revisadas].tolist())
+        paises.update(pais for _, pais in self.regiones_nuevas + self.regiones_eliminadas)
+        paises.update(pais for pareja in self.regiones_renombradas for _, pais in pareja)
+        return paises
+
+    @property
+    def hay_cambios(self):
+        return bool(self.fechas_nuevas or not self.fechas_compatibles or self.revisiones
+                    or self.regiones_nuevas or self.regiones_eliminadas or self.regiones_renombradas)
+
+    def afecta(self, paises=None):
+        """
+        Si los cambios afectan a lo que depende de `paises` (None: cualquier país;
+        lista vacía: nada). Las fechas nuevas o cambiadas afectan a todos.
+        """
+        if paises is not None and not paises:
+            return False
+        if self.fechas_nuevas or not self.fechas_compatibles:
+            return True
+        if paises is None:
+            return self.hay_cambios
+        return bool(self.paises_afectados.intersection(paises))
+
+    def resumen(self, max_detalle=MAX_DETALLE):
+        """Informe serializable en JSON con las listas de detalle recortadas"""
+        fechas, claves = self.cubo.fechas, claves_regiones(self.cubo)
+        return {
+            'fechas_compatibles': self.fechas_compatibles,
+            'fechas_nuevas': self.fechas_nuevas,
+            'regiones_nuevas': [list(clave) for clave in self.regiones_nuevas],
+            'regiones_eliminadas': [list(clave) for clave in self.regiones_eliminadas],
+            'regiones_renombradas': [[list(anterior), list(nueva)] for anterior, nueva in self.regiones_renombradas],
+            'paises_afectados': sorted(self.paises_afectados),
+            'celdas_revisadas': sum(revision[4] for revision in self.revisiones),
+            'revisiones': [{'region': list(claves[fila]), 'metrica': metrica, 'desde': fechas[desde],
+                            'hasta': fechas[hasta], 'celdas': celdas}
+                           for fila, metrica, desde, hasta, celdas in self.revisiones[:max_detalle]],
+            'total_anomalias': len(self.anomalias),
+            'anomalias': [{'tipo': tipo, 'region': list(claves[fila]), 'metrica': metrica,
+                           'fecha': fechas[dia], 'valor': valor}
+                          for tipo, fila, metrica, dia, valor in self.anomalias[:max_detalle]]}
+
+
+def compara_cubos(anterior, nuevo, huellas_anteriores=None):
+    """
+    Compara el cubo nuevo con el anterior. `huellas_anteriores` son las huellas
+    completas de las regiones del cubo anterior (InformeCambios.huellas de la
+    comparación previa); si no se indican se calculan.
+    """
+    n_anterior = len(anterior.fechas)
+    fechas_compatibles = list(nuevo.fechas[:n_anterior]) == list(anterior.fechas)
+    if fechas_compatibles:
+        fechas_nuevas = list(nuevo.fechas[n_anterior:])
+        fechas_comunes = None
+        regiones_anterior = anterior.regiones
+        regiones_nuevo = nuevo.regiones[:, :, :n_anterior]
+        if huellas_anteriores is None or huellas_anteriores.shape != regiones_anterior.shape[:2]:
+            huellas_anteriores = huellas_filas(regiones_anterior)
+        huellas_comunes = huellas_filas(nuevo.regiones, 0, n_anterior)
+        huellas = huellas_comunes + huellas_filas(nuevo.regiones, n_anterior)
+    else:
+        # Fechas reordenadas o eliminadas: se comparan sólo los días comunes
+        fechas_nuevas = [fecha for fecha in nuevo.fechas if fecha not in anterior.indice_fechas]
+        fechas_comunes = [fecha for fecha in anterior.fechas if fecha in nuevo.indice_fechas]
+        regiones_anterior = anterior.regiones[:, :, anterior.posiciones_fechas(fechas_comunes)]
+        regiones_nuevo = nuevo.regiones[:, :, nuevo.posiciones_fechas(fechas_comunes)]
+        huellas_anteriores = huellas_filas(regiones_anterior)
+        huellas_comunes = huellas_filas(regiones_nuevo)
+        huellas = huellas_filas(nuevo.regiones)
+
+    # Emparejamiento de regiones por (estado, país)
+    claves_anterior, claves_nuevo = claves_regiones(anterior), claves_regiones(nuevo)
+    comunes = [(fila, nuevo.indice_regiones[clave]) for fila, clave in enumerate(claves_anterior)
+               if clave in nuevo.indice_regiones]
+    filas_anterior = np.array([fila for fila, _ in comunes], dtype=np.intp)
+    filas_nuevo = np.array([fila for _, fila in comunes], dtype=np.intp)
+    regiones_nuevas = [clave for clave in claves_nuevo if clave not in anterior.indice_regiones]
+    regiones_eliminadas = [clave for clave in claves_anterior if clave not in nuevo.indice_regiones]
+
+    # Renombradas: una región eliminada y una nueva del mismo país con los mismos valores
+    regiones_renombradas = []
+    por_huella = {}
+    for clave in regiones_eliminadas:
+        por_huella.setdefault((clave[1], huellas_anteriores[:, anterior.indice_regiones[clave]].tobytes()), clave)
+    for clave in regiones_nuevas:
+        eliminada = por_huella.pop((clave[1], huellas_comunes[:, nuevo.indice_regiones[clave]].tobytes()), None)
+        if eliminada is not None:
+            regiones_renombradas.append((eliminada, clave))
+    renombradas = set(clave for pareja in regiones_renombradas for clave in pareja)
+
+    # Regiones comunes con la huella cambiada y, sólo en ellas, rango exacto de días
+    cambiadas = np.flatnonzero(np.any(huellas_anteriores[:, filas_anterior] != huellas_comunes[:, filas_nuevo], axis=0))
+    revisiones = []
+    if len(cambiadas):
+        distintas = regiones_anterior[:, filas_anterior[cambiadas]] != regiones_nuevo[:, filas_nuevo[cambiadas]]
+        for metrica, posicion in zip(*np.nonzero(distintas.any(axis=2))):
+            dias = np.flatnonzero(distintas[metrica, posicion])
+            revisiones.append((int(filas_nuevo[cambiadas[posicion]]), METRICAS[metrica],
+                               int(dias[0]), int(dias[-1]), len(dias)))
+        if not fechas_compatibles:
+            # Posiciones de los días comunes en el cubo nuevo
+            posiciones = nuevo.posiciones_fechas(fechas_comunes)
+            revisiones = [(fila, metrica, int(posiciones[desde]), int(posiciones[hasta]), celdas)
+                          for fila, metrica, desde, hasta, celdas in revisiones]
+
+    # Anomalías sólo en las celdas nuevas o cambiadas
+    anomalias = []
+    if fechas_compatibles:
+        anomalias += busca_anomalias(nuevo, np.arange(nuevo.n_regiones), n_anterior)
+    for fila in np.unique([revision[0] for revision in revisiones]).astype(np.intp):
+        desde = min(revision[2] for revision in revisiones if revision[0] == fila)
+        anomalias += busca_anomalias(nuevo, [fila], desde, n_anterior if fechas_compatibles else None)
+    filas_nuevas = [nuevo.indice_regiones[clave] for clave in regiones_nuevas]
+    anomalias += busca_anomalias(nuevo, filas_nuevas, 0, n_anterior if fechas_compatibles else None)
+
+    mismas_filas = not regiones_nuevas and not regiones_eliminadas and np.array_equal(filas_anterior, filas_nuevo)
+    return InformeCambios(nuevo, fechas_compatibles=fechas_compatibles, fechas_nuevas=fechas_nuevas,
+                          regiones_nuevas=[clave for clave in regiones_nuevas if clave not in renombradas],
+                          regiones_eliminadas=[clave for clave in regiones_eliminadas if clave not in renombradas],
+                          regiones_renombradas=regiones_renombradas, revisiones=revisiones,
+                          anomalias=anomalias, huellas=huellas, mismas_filas=mismas_filas)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ingesta por bloques de las series de la JHU por condado de EE. UU.
+
+Los CSV por condado (~3.300 filas y una columna más cada día) no se leen enteros: una
+primera pasada lee sólo las columnas de metadatos (FIPS, condado y estado como
+categóricas) y fija la fila de cada condado en el cubo; la segunda lee las fechas en
+bloques de filas, las interpreta con una sola llamada a numpy por bloque y las escribe
+directamente en el array int32 final, que ya incluye las filas de los agregados por
+estado y del total. La memoria de trabajo es el cubo
+más un bloque, y el tamaño del bloque se calcula a partir de un presupuesto en bytes.
+
+El resultado es un CuboSeries con la misma disposición que el de las series globales:
+las regiones son los condados y los "países" los estados, de modo que fila_pais da
+el agregado de cada estado y fila_total el de todo el país.
+"""
+import io
+import re
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from cubo import CuboSeries
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+METRICAS_CONDADOS = ('confirmados', 'fallecidos') # La JHU no publica recuperados por condado
+COLUMNAS_METADATOS = ('UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 'Province_State', 'Country_Region',
+                      'Lat', 'Long_', 'Combined_Key', 'Population')
+TIPOS_METADATOS = {'FIPS': np.float64, 'Admin2': 'category', 'Province_State': 'category',
+                   'Lat': np.float64, 'Long_': np.float64, 'Population': np.float64}
+MEMORIA_BLOQUE = 16 * 2 ** 20 # Bytes de memoria de trabajo por bloque de filas leído
+# Bytes por celda de un bloque mientras se lee: líneas de texto, colas unidas y
+# valores int64 y su copia reducida
+BYTES_CELDA = 32
+DIAS_REDUCCION = 64 # Días por tramo al calcular los agregados por estado
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+class IngestaCondados(object):
+    """
+    Cubo de condados y sus metadatos, alineados con las filas de regiones del cubo:
+      - fips, condados, estados: categóricas (FIPS con cinco dígitos, '' si no hay)
+      - poblacion: int64 (0 si el CSV no la trae)
+    y las estadísticas de la ingesta: segundos, filas por bloque, bloques leídos y
+    pico_bytes, la memoria de trabajo máxima contabilizada (cubo, metadatos y el mayor
+    bloque en memoria)
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def resumen(self):
+        return {'condados': int(self.cubo.n_regiones), 'estados': len(self.cubo.paises),
+                'dias': len(self.cubo.fechas), 'segundos': round(self.segundos, 3),
+                'filas_bloque': self.filas_bloque, 'bloques': self.bloques,
+                'mb_cubo': round(self.cubo.valores.nbytes / 1e6, 3), 'mb_pico': round(self.pico_bytes / 1e6, 3)}
+
+
+def columnas_csv(ruta):
+    """(columnas de metadatos, columnas de fecha) de un CSV por condado, leyendo sólo la cabecera"""
+    columnas = list(pd.read_csv(ruta, nrows=0).columns)
+    return ([columna for columna in columnas if columna in COLUMNAS_METADATOS],
+            [columna for columna in columnas if columna not in COLUMNAS_METADATOS])
+
+def filas_por_bloque(dias, memoria_bloque=MEMORIA_BLOQUE):
+    """Filas de un bloque para que su lectura quepa en memoria_bloque (crece cada día)"""
+    return max(1, int(memoria_bloque // (BYTES_CELDA * max(dias, 1))))
+
+def patron_metadatos(campos):
+    """
+    Expresión que reconoce los primeros `campos` campos de una línea, que son los de
+    metadatos. Admite campos entre comillas con comas (Combined_Key: "Autauga, Alabama, US")
+    """
+    return re.compile('(?:(?:"(?:[^"]|"")*"|[^,"\r\n]*),){%d}' % campos)
+
+def bloques_lineas(ruta, filas_bloque):
+    """Líneas de datos del CSV (sin la cabecera) en listas de como mucho filas_bloque"""
+    with open(ruta, newline='') as fichero:
+        next(fichero)
+        bloque = []
+        for linea in fichero:
+            if linea.strip():
+                bloque.append(linea)
+            if len(bloque) == filas_bloque:
+                yield bloque
+                bloque = []
+        if bloque:
+            yield bloque
+
+def lee_metadatos(ruta, columnas, filas_bloque):
+    """
+    Lee sólo los campos de metadatos, que van al principio de cada línea: de cada línea
+    se separa la cabeza hasta el último de ellos y el resto (las fechas) no se interpreta.
+    Devuelve un dataframe con condado, estado y FIPS categóricos, coordenadas y población
+    (NaN si el CSV no la trae)
+    """
+    patron = patron_metadatos(len(columnas))
+    cabezas = [patron.match(linea).group(0)[:-1]
+               for lineas in bloques_lineas(ruta, filas_bloque) for linea in lineas]
+    usadas = [columna for columna in TIPOS_METADATOS if columna in columnas]
+    leidos = pd.read_csv(io.StringIO('\n'.join(cabezas)), header=None, names=columnas, usecols=usadas,
+                         dtype={columna: TIPOS_METADATOS[columna] for columna in usadas})
+    fips = leidos['FIPS'].to_numpy()
+    metadatos = pd.DataFrame({
+        'condado': leidos['Admin2'], 'estado': leidos['Province_State'],
+        'fips': pd.Categorical(np.where(np.isnan(fips), '', np.char.zfill(
+            np.nan_to_num(fips).astype(np.int64).astype(str), 5)))})
+    for columna in ['Lat', 'Long_', 'Population']:
+        metadatos[columna] = leidos[columna].to_numpy() if columna in usadas else np.nan
+    return metadatos
+
+def claves_condados(metadatos):
+    return pd.MultiIndex.from_arrays([metadatos['condado'].astype(str).replace('nan', '').to_numpy(dtype=str),
+                                      metadatos['estado'].astype(str).to_numpy(dtype=str)])
+
+def interpreta_bloque(colas, columnas):
+    """
+    Valores (filas, columnas) de las colas de fechas de un bloque de líneas. Se
+    interpretan de una vez con np.fromstring; si hay celdas vacías o no enteras se
+    recurre a pandas y cuentan como 0
+    """
+    texto = ','.join(colas)
+    with warnings.catch_warnings():
+        # numpy avisa (y para) al encontrar un valor que no es entero
+        warnings.simplefilter('ignore', DeprecationWarning)
+        leidos = np.fromstring(texto, dtype=np.int64, sep=',')
+    if leidos.size == len(colas) * columnas:
+        return leidos.reshape(len(colas), columnas)
+    leidos = pd.read_csv(io.StringIO('\n'.join(colas)), header=None, names=range(columnas), dtype=np.float64)
+    return leidos.fillna(0).to_numpy().astype(np.int64)
+
+def escribe_bloques(ruta, columnas_metadatos, fechas_csv, fechas, destino, matriz, filas_bloque):
+    """
+    Lee las fechas del CSV por bloques de filas y suma cada fila en matriz[destino[fila]],
+    reducida al tipo de la matriz. Las fechas que no están en `fechas` se ignoran y las
+    que faltan en el CSV valen 0. Devuelve (bloques leídos, memoria estimada del mayor bloque)
+    """
+    patron = patron_metadatos(len(columnas_metadatos))
+    posiciones = pd.Index(fechas).get_indexer(fechas_csv)
+    directas = len(fechas_csv) == len(fechas) and (posiciones == np.arange(len(fechas))).all()
+    limites = np.iinfo(matriz.dtype)
+    bloques, mayor, inicio = 0, 0, 0
+    for lineas in bloques_lineas(ruta, filas_bloque):
+        leidos = interpreta_bloque([linea[patron.match(linea).end():].rstrip('\r\n') for linea in lineas],
+                                   len(fechas_csv))
+        if not directas:
+            completos = np.zeros((len(lineas), len(fechas)), dtype=leidos.dtype)
+            completos[:, posiciones[posiciones >= 0]] = leidos[:, posiciones >= 0]
+            leidos = completos
+        if leidos.size and (leidos.max() > limites.max or leidos.min() < limites.min):
+            raise ValueError('Valor fuera del rango de {0} en {1}'.format(matriz.dtype, ruta))
+        filas = destino[inicio:inicio + len(lineas)]
+        if len(np.unique(filas)) == len(filas):
+            matriz[filas] += leidos.astype(matriz.dtype)
+        else:
+            # Filas repetidas de un mismo condado en el CSV: se suman
+            np.add.at(matriz, filas, leidos.astype(matriz.dtype))
+        inicio += len(lineas)
+        bloques += 1
+        mayor = max(mayor, leidos.size * BYTES_CELDA)
+    return bloques, mayor
+
+def lee_condados(rutas, memoria_bloque=MEMORIA_BLOQUE):
+    """
+    Construye el cubo de condados a partir de {métrica: ruta del CSV} (las de
+    METRICAS_CONDADOS). Las regiones son la unión de las de todos los CSV, ordenadas por
+    estado y condado; las fechas, las del primer CSV. Devuelve un IngestaCondados
+    """
+    inicio = time.time()
+    metricas = [metrica for metrica in METRICAS_CONDADOS if metrica in rutas]
+    columnas = {metrica: columnas_csv(rutas[metrica]) for metrica in metricas}
+    fechas = columnas[metricas[0]][1]
+    filas_bloque = filas_por_bloque(len(fechas), memoria_bloque)
+
+    # Primera pasada: metadatos de todos los CSV y fila de cada condado
+    metadatos = {metrica: lee_metadatos(rutas[metrica], columnas[metrica][0], filas_bloque) for metrica in metricas}
+    claves = {metrica: claves_condados(metadatos[metrica]) for metrica in metricas}
+    regiones = claves[metricas[0]]
+    for metrica in metricas[1:]:
+        regiones = regiones.append(claves[metrica][~claves[metrica].isin(regiones)])
+    regiones = regiones.drop_duplicates()
+    condados = np.asarray(regiones.get_level_values(0), dtype=str)
+    estados = np.asarray(regiones.get_level_values(1), dtype=str)
+    orden = np.lexsort((condados, estados))
+    regiones, condados, estados = regiones[orden], condados[orden], estados[orden]
+
+    # Disposición final del cubo: condados, agregados de los estados con varios condados
+    # y total. Se reserva una sola vez y los bloques se escriben en su sitio
+    _, inicio_estado = np.unique(estados, return_index=True)
+    fin_estado = np.append(inicio_estado[1:], len(estados))
+    varias = np.flatnonzero(fin_estado - inicio_estado > 1)
+    n_regiones = len(regiones)
+    valores = np.zeros((len(metricas), n_regiones + len(varias) + 1, len(fechas)), dtype=np.int32)
+
+    bloques, mayor = 0, 0
+    coordenadas = np.full((n_regiones, 2), np.nan)
+    poblacion = np.zeros(n_regiones, dtype=np.int64)
+    for posicion, metrica in enumerate(metricas):
+        destino = regiones.get_indexer(claves[metrica])
+        leidos, bytes_bloque = escribe_bloques(rutas[metrica], *columnas[metrica], fechas, destino,
+                                               valores[posicion, :n_regiones], filas_bloque)
+        bloques, mayor = bloques + leidos, max(mayor, bytes_bloque)
+        sin_coordenadas = np.isnan(coordenadas[destino, 0])
+        coordenadas[destino[sin_coordenadas]] = metadatos[metrica][['Lat', 'Long_']].to_numpy()[sin_coordenadas]
+        if metadatos[metrica]['Population'].notnull().any():
+            poblacion[destino] = metadatos[metrica]['Population'].fillna(0).to_numpy(dtype=np.int64)
+
+    # Agregados por estado y total con una reducción agrupada sobre las filas ya escritas,
+    # por tramos de días: la conversión a int64 de la entrada nunca ocupa más de un tramo
+    por_estado = np.empty((len(metricas), len(inicio_estado), len(fechas)), dtype=np.int64)
+    for dia in range(0, len(fechas), DIAS_REDUCCION):
+        por_estado[:, :, dia:dia + DIAS_REDUCCION] = np.add.reduceat(
+            valores[:, :n_regiones, dia:dia + DIAS_REDUCCION], inicio_estado, axis=1, dtype=np.int64)
+    total = por_estado.sum(axis=1, dtype=np.int64)
+    if total.max(initial=0) > np.iinfo(np.int32).max:
+        # No ocurre con los datos de EE. UU.; la copia a int64 duplica el cubo un momento
+        valores = valores.astype(np.int64)
+    valores[:, n_regiones:-1] = por_estado[:, varias]
+    valores[:, -1] = total
+    cubo = CuboSeries(valores, condados, estados, coordenadas, fechas, con_agregados=True)
+
+    # Metadatos categóricos alineados con las filas del cubo (los del primer CSV que trae cada condado)
+    alineados = pd.concat([metadatos[metrica] for metrica in metricas], ignore_index=True)
+    alineados.index = np.concatenate([regiones.get_indexer(claves[metrica]) for metrica in metricas])
+    alineados = alineados[~alineados.index.duplicated()].sort_index()
+    memoria_metadatos = sum(int(df.memory_usage(deep=True).sum()) for df in metadatos.values())
+    return IngestaCondados(
+        cubo=cubo, fips=alineados['fips'].astype('category').values,
+        condados=alineados['condado'].astype('category').values,
+        estados=alineados['estado'].astype('category').values, poblacion=poblacion,
+        segundos=time.time() - inicio, filas_bloque=filas_bloque, bloques=bloques,
+        pico_bytes=valores.nbytes + por_estado.nbytes + coordenadas.nbytes + memoria_metadatos + mayor)
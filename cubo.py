@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cubo denso región x fecha con las tres series de la JHU.
+
+Los valores se guardan en un único array int32 con forma (métrica, región, día). Las
+regiones se ordenan por país, de modo que las filas de un país son contiguas y los
+agregados por país se calculan con una única reducción agrupada (np.add.reduceat).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+METRICAS = ('confirmados', 'fallecidos', 'recuperados')
+COLUMNAS_NO_FECHA = ('Province/State', 'State', 'Country/Region', 'Lat', 'Long', 'casos_totales')
+ARRAYS_CUBO = ('valores', 'estados', 'paises_region', 'coordenadas')
+FICHERO_FECHAS = 'fechas.json'
+SEPARADOR_LOCALIZACION = '|' # Claves de localización de regiones: 'estado|país'
+
+
+# *********************************************************************************************************
+# --------------------------- CUBO DE DATOS ---------------------------------------------------------------
+# *********************************************************************************************************
+class CuboSeries(object):
+    """
+    Atributos principales:
+      - valores: int32 (métrica, fila, día). Las primeras n_regiones filas son las
+        regiones de la JHU; después van los agregados de los países con varias regiones
+        y, en la última fila, el agregado global
+      - estados, paises_region: nombre de estado ('' si no hay) y de país de cada región
+      - codigos_pais: int32 con el código de país de cada región
+      - paises: nombres de país, indexados por código
+      - inicio_pais, fin_pais: rango [inicio, fin) de filas de regiones de cada país
+      - fila_pais: fila de valores con la serie de cada país (su región si sólo tiene una)
+      - fechas: lista de fechas en el formato de columna de la JHU ('3/15/20')
+    """
+    def __init__(self, valores, estados, paises_region, coordenadas, fechas, con_agregados=False):
+        self.estados = estados
+        self.paises_region = paises_region
+        self.coordenadas = coordenadas
+        self.fechas = fechas
+        self.n_regiones = len(paises_region)
+        self.dias = pd.to_datetime(pd.Index(fechas, dtype=object), format='%m/%d/%y').to_numpy(dtype='datetime64[D]')
+        self.indice_fechas = {fecha: posicion for posicion, fecha in enumerate(fechas)}
+
+        # Códigos categóricos de país (las regiones ya vienen ordenadas por país)
+        self.paises, self.inicio_pais, self.codigos_pais = np.unique(
+            paises_region, return_index=True, return_inverse=True)
+        self.codigos_pais = self.codigos_pais.astype(np.int32).ravel()
+        self.fin_pais = np.append(self.inicio_pais[1:], self.n_regiones).astype(self.inicio_pais.dtype)
+        self.indice_paises = {pais: codigo for codigo, pais in enumerate(self.paises.tolist())}
+        self.indice_regiones = {(estado, pais): fila for fila, (estado, pais)
+                                in enumerate(zip(estados.tolist(), paises_region.tolist()))}
+        self.indice_estados = {}
+        for fila, estado in enumerate(estados.tolist()):
+            if estado:
+                self.indice_estados.setdefault(estado, fila)
+
+        # Agregados por país y global con una única reducción agrupada. Sólo se guardan
+        # filas nuevas para los países con varias regiones. Con con_agregados los valores
+        # ya los incluyen (cubo guardado en disco) y se usan tal cual
+        varias = np.flatnonzero(self.fin_pais - self.inicio_pais > 1)
+        if con_agregados:
+            self.valores = valores
+        else:
+            self.valores = self._agrega(valores[:, :self.n_regiones], varias)
+        self.fila_pais = self.inicio_pais.astype(np.int32)
+        self.fila_pais[varias] = self.n_regiones + np.arange(len(varias), dtype=np.int32)
+        self.fila_total = self.valores.shape[1] - 1
+
+    def _agrega(self, regiones, varias):
+        if self.n_regiones:
+            por_pais = np.add.reduceat(regiones, self.inicio_pais, axis=1, dtype=np.int64)
+        else:
+            por_pais = np.zeros((regiones.shape[0], 0, len(self.fechas)), dtype=np.int64)
+        total = por_pais.sum(axis=1, dtype=np.int64)[:, None]
+        tipo = np.int32 if total.max(initial=0) <= np.iinfo(np.int32).max else np.int64
+        return np.concatenate([regiones, por_pais[:, varias], total], axis=1).astype(tipo, copy=False)
+
+    @classmethod
+    def desde_series(cls, series):
+        """
+        Construye el cubo a partir de {métrica: dataframe ancho de la JHU}. Las regiones
+        son la unión de las de las tres series; las que faltan en alguna valen 0.
+        """
+        frames = [series[metrica] for metrica in METRICAS]
+        fechas = [columna for columna in frames[0].columns if columna not in COLUMNAS_NO_FECHA]
+        columna_estado = 'Province/State' if 'Province/State' in frames[0].columns else 'State'
+
+        claves = []
+        for df in frames:
+            claves.append(pd.MultiIndex.from_arrays(
+                [df[columna_estado].fillna('').astype(str).to_numpy(),
+                 df['Country/Region'].astype(str).to_numpy()]))
+        regiones = claves[0]
+        for clave in claves[1:]:
+            regiones = regiones.append(clave[~clave.isin(regiones)])
+        regiones = regiones.drop_duplicates()
+        estados = np.asarray(regiones.get_level_values(0), dtype=str)
+        paises = np.asarray(regiones.get_level_values(1), dtype=str)
+        orden = np.lexsort((estados, paises))
+        regiones = regiones[orden]
+
+        valores = np.zeros((len(METRICAS), len(regiones), len(fechas)), dtype=np.int32)
+        coordenadas = np.full((len(regiones), 2), np.nan)
+        for posicion, (df, clave) in enumerate(zip(frames, claves)):
+            filas = regiones.get_indexer(clave)
+            matriz = df.reindex(columns=fechas).fillna(0).to_numpy(dtype=np.int64)
+            if len(np.unique(filas)) == len(filas):
+                valores[posicion, filas] = matriz
+            else:
+                # Filas repetidas de una misma región en el CSV: se suman
+                np.add.at(valores[posicion], filas, matriz.astype(np.int32))
+            sin_coordenadas = np.isnan(coordenadas[filas, 0])
+            coordenadas[filas[sin_coordenadas]] = df[['Lat', 'Long']].to_numpy(dtype=np.float64)[sin_coordenadas]
+
+        return cls(valores, estados[orden], paises[orden], coordenadas, fechas)
+
+    def guarda(self, directorio):
+        """Guarda el cubo (con sus agregados) como un .npy por array en un directorio"""
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in ARRAYS_CUBO:
+            np.save(os.path.join(directorio, nombre + '.npy'), np.asarray(getattr(self, nombre)),
+                    allow_pickle=False)
+        with open(os.path.join(directorio, FICHERO_FECHAS), 'w') as fichero:
+            json.dump(list(self.fechas), fichero)
+
+    @classmethod
+    def carga(cls, directorio, mmap=True):
+        """
+        Carga un cubo guardado con guarda(). Con mmap los valores se mapean en memoria
+        de sólo lectura y las páginas se comparten entre todos los procesos que lo cargan.
+        """
+        arrays = {nombre: np.load(os.path.join(directorio, nombre + '.npy'),
+                                  mmap_mode='r' if mmap and nombre == 'valores' else None, allow_pickle=False)
+                  for nombre in ARRAYS_CUBO}
+        with open(os.path.join(directorio, FICHERO_FECHAS)) as fichero:
+            fechas = json.load(fichero)
+        return cls(arrays['valores'], arrays['estados'], arrays['paises_region'], arrays['coordenadas'],
+                   fechas, con_agregados=True)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.valores, self.estados, self.paises_region,
+                                              self.coordenadas, self.codigos_pais, self.paises,
+                                              self.inicio_pais, self.fin_pais, self.fila_pais,
+                                              self.dias])
+
+    @property
+    def regiones(self):
+        """Vista (métrica, región, día) con las regiones de la JHU"""
+        return self.valores[:, :self.n_regiones]
+
+    @property
+    def total(self):
+        """Vista (métrica, día) con el agregado global"""
+        return self.valores[:, self.fila_total]
+
+    @property
+    def por_pais(self):
+        """Copia (métrica, país, día) con el agregado de todos los países"""
+        return self.valores[:, self.fila_pais]
+
+    def ultimo_por_pais(self, metrica=0):
+        """Valor del último día de cada país para una métrica"""
+        return self.valores[metrica, self.fila_pais, -1]
+
+    def serie_pais(self, pais):
+        """Vista (métrica, día) con el agregado del país"""
+        return self.valores[:, self.fila_pais[self.indice_paises[pais]]]
+
+    def serie_sin_pais(self, pais):
+        """(métrica, día) con el agregado global excluyendo el país"""
+        return self.total.astype(np.int64) - self.serie_pais(pais)
+
+    def serie_estado(self, estado):
+        """Vista (métrica, día) de la región del estado"""
+        return self.valores[:, self.indice_estados[estado]]
+
+    def filas_pais(self, pais):
+        """Vista (métrica, región, día) con las regiones del país"""
+        codigo = self.indice_paises[pais]
+        return self.valores[:, self.inicio_pais[codigo]:self.fin_pais[codigo]]
+
+    def filas_localizaciones(self, paises=(), estados=()):
+        """Filas de valores con la serie de cada país y de cada estado, en ese orden"""
+        return np.array([self.fila_pais[self.indice_paises[pais]] for pais in paises] +
+                        [self.indice_estados[estado] for estado in estados], dtype=np.intp)
+
+    def extrae_series(self, paises=(), estados=(), metricas=METRICAS, fechas=None):
+        """
+        Extrae de una vez las series de varios países y estados. Devuelve un array
+        (localización, métrica, día) con los países primero y después los estados.
+        Si se indican fechas (formato JHU) sólo se devuelven esos días.
+        """
+        filas = self.filas_localizaciones(paises, estados)
+        posiciones_metricas = np.array([METRICAS.index(metrica) for metrica in metricas], dtype=np.intp)
+        if fechas is None:
+            series = self.valores[posiciones_metricas[:, None], filas[None, :]]
+        else:
+            series = self.valores[np.ix_(posiciones_metricas, filas, self.posiciones_fechas(fechas))]
+        return series.transpose(1, 0, 2)
+
+    def localizaciones(self):
+        """
+        Índice {clave: fila de valores} de todas las localizaciones con serie propia: cada
+        país ('Spain') y cada región con estado ('Hubei|China')
+        """
+        indice = dict(zip(self.paises.tolist(), self.fila_pais.tolist()))
+        for (estado, pais), fila in self.indice_regiones.items():
+            if estado:
+                indice[SEPARADOR_LOCALIZACION.join([estado, pais])] = fila
+        return indice
+
+    def posiciones_fechas(self, fechas):
+        return np.array([self.indice_fechas[fecha] for fecha in fechas], dtype=np.intp)
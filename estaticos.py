@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Publicación de ficheros estáticos con huella en el nombre.
+
+Cada fichero se copia a un directorio de salida como <nombre>.<huella>.<ext> junto a
+sus variantes precomprimidas (.gz y, si está instalado el paquete brotli, .br). Al
+llevar la huella en el nombre se pueden servir con caché inmutable de larga duración.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+import flask
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError: # Dependencia opcional: sin ella sólo se genera la variante gzip
+    brotli = None
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+CACHE_CONTROL_INMUTABLE = 'public, max-age=31536000, immutable'
+EXTENSIONES_COMPRESION = [('br', '.br'), ('gzip', '.gz')]
+MIMETYPES_COMPRIMIBLES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def huella_contenido(contenido, longitud=12):
+    return hashlib.sha256(contenido).hexdigest()[:longitud]
+
+def codificacion_aceptada(candidatas):
+    """
+    Mejor codificación de `candidatas` (en orden de preferencia del servidor) según el
+    Accept-Encoding de la petición en curso, con sus valores q: la de mayor q y, a igual
+    q, la primera. 'identity' si el cliente no acepta ninguna (o las rechaza con q=0)
+    """
+    aceptadas = flask.request.accept_encodings
+    calidades = [(aceptadas.quality(candidata), -posicion, candidata) for posicion, candidata in enumerate(candidatas)]
+    calidad, _, mejor = max(calidades, default=(0, 0, 'identity'))
+    return mejor if calidad > 0 else 'identity'
+
+def _escribe_si_no_existe(ruta, genera):
+    if os.path.isfile(ruta):
+        return
+    temporal = '{0}.{1}.tmp'.format(ruta, os.getpid())
+    with open(temporal, 'wb') as fichero:
+        fichero.write(genera())
+    os.replace(temporal, ruta)
+
+
+class PublicadorEstaticos(object):
+    """
+    Registro de ficheros publicados con huella y ruta Flask que los sirve
+    """
+    def __init__(self, directorio, prefijo_url='/estaticos/'):
+        self.directorio = directorio
+        self.prefijo_url = prefijo_url
+        self._publicados = {}
+
+    def publica_contenido(self, nombre, contenido):
+        """
+        Publica un contenido con el nombre base indicado (p. ej. 'mapa.html') y devuelve
+        su URL con huella. Las variantes comprimidas sólo se generan la primera vez.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        base, extension = os.path.splitext(nombre)
+        huella = huella_contenido(contenido)
+        nombre_huella = '{0}.{1}{2}'.format(base, huella, extension)
+        ruta = os.path.join(self.directorio, nombre_huella)
+        _escribe_si_no_existe(ruta, lambda: contenido)
+
+        tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        variantes = {'identity': ruta}
+        if tipo.startswith(MIMETYPES_COMPRIMIBLES):
+            _escribe_si_no_existe(ruta + '.gz', lambda: gzip.compress(contenido, 9))
+            variantes['gzip'] = ruta + '.gz'
+            if brotli is not None:
+                _escribe_si_no_existe(ruta + '.br', lambda: brotli.compress(contenido, quality=11))
+                variantes['br'] = ruta + '.br'
+        self._publicados[nombre_huella] = {'tipo': tipo, 'huella': huella, 'variantes': variantes}
+        return self.prefijo_url + nombre_huella
+
+    def publica_fichero(self, ruta):
+        """Publica un fichero existente con su mismo nombre base y devuelve su URL"""
+        with open(ruta, 'rb') as fichero:
+            return self.publica_contenido(os.path.basename(ruta), fichero.read())
+
+    def limpia(self):
+        """Borra del directorio de salida los ficheros que ya no están publicados"""
+        if not os.path.isdir(self.directorio):
+            return
+        vigentes = set()
+        for publicado in self._publicados.values():
+            vigentes.update(os.path.basename(ruta) for ruta in publicado['variantes'].values())
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if nombre not in vigentes and os.path.isfile(ruta) and not nombre.endswith('.tmp'):
+                os.remove(ruta)
+
+    def sirve(self, nombre):
+        """
+        Respuesta con la mejor variante aceptada por el cliente, ETag y caché inmutable
+        """
+        publicado = self._publicados.get(nombre)
+        if publicado is None:
+            flask.abort(404)
+        codificacion = codificacion_aceptada([candidata for candidata, _ in EXTENSIONES_COMPRESION
+                                              if candidata in publicado['variantes']])
+        etag = '{0}-{1}'.format(publicado['huella'], codificacion)
+        if flask.request.if_none_match.contains(etag):
+            respuesta = flask.Response(status=304)
+        else:
+            ruta = publicado['variantes'][codificacion]
+            respuesta = flask.Response(wrap_file(flask.request.environ, open(ruta, 'rb')),
+                                       mimetype=publicado['tipo'], direct_passthrough=True)
+            respuesta.headers['Content-Length'] = str(os.path.getsize(ruta))
+            if codificacion != 'identity':
+                respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = CACHE_CONTROL_INMUTABLE
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
+
+    def registra(self, server):
+        """Añade al servidor Flask la ruta que sirve los ficheros publicados"""
+        server.add_url_rule(self.prefijo_url + '<path:nombre>', 'estaticos_huella', self.sirve)
+        return self
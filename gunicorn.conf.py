@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Configuración de gunicorn. La app se carga en el proceso maestro antes de crear los
+trabajadores (preload), de modo que el código y el estado inicial se comparten, y los
+datos numéricos viven en el plano compartido (ficheros mapeados en memoria) que todos
+los trabajadores mapean en lugar de tener cada uno su copia.
+
+    $ gunicorn -c gunicorn.conf.py app:server
+"""
+import os
+
+preload_app = True
+
+# Se leen al importar app.py en el maestro
+os.environ.setdefault('COVID_DIR_PLANO', 'plano')
+os.environ['COVID_REFRESCO_EN_TRABAJADORES'] = '1'
+
+
+def post_fork(server, worker):
+    # Los hilos no sobreviven al fork: cada trabajador arranca su propio refresco
+    import app
+    app.arranca_refresco()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Descarga concurrente de los CSV de la JHU.
+
+Cada feed se descarga en su propio hilo con timeout, reintentos acotados y peticiones
+condicionales (ETag / Last-Modified). La última copia buena de cada feed se guarda en
+un directorio local; si una descarga falla se usa esa copia y se marca como obsoleta.
+"""
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+TIMEOUT_DESCARGA = 20
+REINTENTOS_DESCARGA = 2
+ESPERA_REINTENTO = 1.0
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+class ErrorIngesta(Exception):
+    """Un feed no se ha podido descargar y no existe copia local de él"""
+
+
+class ResultadoFeed(object):
+    """
+    Resultado de la ingesta de un feed. estado es uno de: 'descargado', 'sin_cambios'
+    (respuesta 304), 'local' (fichero local) u 'obsoleto' (última copia buena)
+    """
+    def __init__(self, nombre, ruta, estado, segundos, intentos=0, error=None):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.estado = estado
+        self.segundos = segundos
+        self.intentos = intentos
+        self.error = error
+
+    @property
+    def obsoleto(self):
+        return self.estado == 'obsoleto'
+
+    def __repr__(self):
+        return 'ResultadoFeed({0!r}, estado={1!r}, segundos={2:.3f})'.format(
+            self.nombre, self.estado, self.segundos)
+
+
+def es_url(origen):
+    return origen.startswith('http://') or origen.startswith('https://')
+
+def _lee_metadatos(ruta):
+    try:
+        with open(ruta) as fichero:
+            return json.load(fichero)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _escribe_atomico(ruta, contenido, modo='wb'):
+    temporal = '{0}.{1}.tmp'.format(ruta, os.getpid())
+    with open(temporal, modo) as fichero:
+        fichero.write(contenido)
+    os.replace(temporal, ruta)
+
+def _es_csv_valido(contenido):
+    primera_linea = contenido.lstrip()[:4096].split(b'\n', 1)[0]
+    return b',' in primera_linea
+
+def descarga_feed(nombre, origen, directorio_cache, timeout=TIMEOUT_DESCARGA,
+                  reintentos=REINTENTOS_DESCARGA, espera=ESPERA_REINTENTO):
+    """
+    Descarga un feed a directorio_cache/<nombre>.csv. Si falla tras los reintentos y
+    existe una copia anterior, la devuelve marcada como obsoleta.
+    """
+    inicio = time.time()
+    if not es_url(origen):
+        if not os.path.isfile(origen):
+            raise ErrorIngesta('No existe el fichero {0}'.format(origen))
+        return ResultadoFeed(nombre, origen, 'local', time.time() - inicio)
+
+    ruta_csv = os.path.join(directorio_cache, nombre + '.csv')
+    ruta_metadatos = os.path.join(directorio_cache, nombre + '.json')
+    metadatos = _lee_metadatos(ruta_metadatos) if os.path.isfile(ruta_csv) else {}
+    cabeceras = {}
+    if metadatos.get('origen') == origen:
+        if metadatos.get('etag'):
+            cabeceras['If-None-Match'] = metadatos['etag']
+        if metadatos.get('last_modified'):
+            cabeceras['If-Modified-Since'] = metadatos['last_modified']
+
+    error = None
+    intentos = 0
+    for intento in range(reintentos + 1):
+        intentos = intento + 1
+        try:
+            with urlopen(Request(origen, headers=cabeceras), timeout=timeout) as respuesta:
+                contenido = respuesta.read()
+                if not _es_csv_valido(contenido):
+                    raise ValueError('Respuesta vacía o sin formato CSV')
+                _escribe_atomico(ruta_csv, contenido)
+                _escribe_atomico(ruta_metadatos, json.dumps({
+                    'origen': origen,
+                    'etag': respuesta.headers.get('ETag'),
+                    'last_modified': respuesta.headers.get('Last-Modified'),
+                    'descargado': time.time()}), modo='w')
+                return ResultadoFeed(nombre, ruta_csv, 'descargado', time.time() - inicio, intentos)
+        except HTTPError as excepcion:
+            if excepcion.code == 304:
+                return ResultadoFeed(nombre, ruta_csv, 'sin_cambios', time.time() - inicio, intentos)
+            error = excepcion
+            if excepcion.code not in CODIGOS_REINTENTABLES:
+                break
+        except (URLError, socket.timeout, OSError, ValueError) as excepcion:
+            error = excepcion
+        if intento < reintentos:
+            time.sleep(espera * 2 ** intento)
+
+    if os.path.isfile(ruta_csv):
+        return ResultadoFeed(nombre, ruta_csv, 'obsoleto', time.time() - inicio, intentos, error)
+    raise ErrorIngesta('No se ha podido descargar {0}: {1}'.format(nombre, error))
+
+def ingesta_concurrente(origenes, directorio_cache, timeout=TIMEOUT_DESCARGA,
+                        reintentos=REINTENTOS_DESCARGA, espera=ESPERA_REINTENTO):
+    """
+    Descarga en paralelo un diccionario {nombre: url o ruta local} y devuelve
+    {nombre: ResultadoFeed}. Un feed que no termina en el plazo total (todos sus
+    intentos más las esperas) se sustituye por su última copia buena.
+    """
+    os.makedirs(directorio_cache, exist_ok=True)
+    plazo = (timeout + espera) * (reintentos + 1) + espera * 2 ** reintentos
+    ejecutor = ThreadPoolExecutor(max_workers=max(len(origenes), 1))
+    futuros = {nombre: ejecutor.submit(descarga_feed, nombre, origen, directorio_cache,
+                                       timeout, reintentos, espera)
+               for nombre, origen in origenes.items()}
+    wait(list(futuros.values()), timeout=plazo)
+    ejecutor.shutdown(wait=False)
+
+    resultados = {}
+    for nombre, futuro in futuros.items():
+        if futuro.done():
+            resultados[nombre] = futuro.result()
+            continue
+        ruta_csv = os.path.join(directorio_cache, nombre + '.csv')
+        if not os.path.isfile(ruta_csv):
+            raise ErrorIngesta('Tiempo agotado descargando {0}'.format(nombre))
+        resultados[nombre] = ResultadoFeed(nombre, ruta_csv, 'obsoleto', plazo,
+                                           error='Tiempo agotado')
+    return resultados
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Instrumentación del servidor Flask del dashboard, sin dependencias externas:
+
+  - métricas (histogramas, contadores y valores leídos al consultar) expuestas en el
+    formato de texto de Prometheus en /metrics
+  - latencia, bytes serializados y aciertos de caché de cada callback de Dash (y de cada
+    valor de entrada en los callbacks indicados, p. ej. cada pestaña, en la etiqueta 'entrada')
+  - cabecera Server-Timing en todas las respuestas
+  - perfilador por muestreo opcional: si hay directorio de perfiles, una petición con la
+    cabecera X-Perfil o el parámetro ?perfil se muestrea y su perfil (pilas plegadas,
+    formato de flamegraph.pl y speedscope) se escribe en ese directorio
+
+Las métricas son de cada proceso: con varios trabajadores de gunicorn cada uno expone
+las suyas.
+"""
+import bisect
+import collections
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+
+import flask
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LIMITES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+INTERVALO_MUESTREO = 0.005 # Segundos entre muestras del perfilador
+RUTA_CALLBACKS = '/_dash-update-component'
+ETIQUETA_OTRO = 'otro' # Callbacks y valores no registrados: las etiquetas no dependen de lo que envíe el cliente
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def _escapa(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(nombre, _escapa(valor)) for nombre, valor in pares) + '}'
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador(object):
+    """Contador monótono con etiquetas"""
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = collections.defaultdict(int)
+        self._cerrojo = threading.Lock()
+
+    def incrementa(self, valor=1, **etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        with self._cerrojo:
+            self._valores[clave] += valor
+
+    def lineas(self):
+        with self._cerrojo:
+            valores = sorted(self._valores.items())
+        return ['{0}{1} {2}'.format(self.nombre, _etiquetas(self.etiquetas, clave), _numero(valor))
+                for clave, valor in valores]
+
+
+class Histograma(object):
+    """Histograma acumulado con límites fijos, suma y número de observaciones por etiquetas"""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}
+        self._cerrojo = threading.Lock()
+
+    def observa(self, valor, **etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        posicion = bisect.bisect_left(self.limites, valor)
+        with self._cerrojo:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+
+    def lineas(self):
+        with self._cerrojo:
+            series = sorted((clave, (list(cubetas), suma)) for clave, (cubetas, suma) in self._series.items())
+        lineas = []
+        for clave, (cubetas, suma) in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (float('inf'),), cubetas):
+                acumulado += cuenta
+                lineas.append('{0}_bucket{1} {2}'.format(
+                    self.nombre, _etiquetas(self.etiquetas, clave, [('le', _numero(float(limite)))]), acumulado))
+            lineas.append('{0}_sum{1} {2}'.format(self.nombre, _etiquetas(self.etiquetas, clave), _numero(suma)))
+            lineas.append('{0}_count{1} {2}'.format(self.nombre, _etiquetas(self.etiquetas, clave), acumulado))
+        return lineas
+
+
+class Registro(object):
+    """
+    Conjunto de métricas de un proceso. Además de contadores e histogramas admite
+    recolectores: funciones que al consultar /metrics devuelven una lista de
+    (nombre, tipo, ayuda, [({etiqueta: valor}, valor)]), p. ej. para leer los contadores
+    de las cachés o el estado del refresco sin duplicarlos
+    """
+    def __init__(self):
+        self._metricas = []
+        self._recolectores = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        metrica = Histograma(nombre, ayuda, etiquetas, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    def recolector(self, funcion):
+        self._recolectores.append(funcion)
+        return funcion
+
+    def texto(self):
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)"""
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append('# HELP {0} {1}'.format(metrica.nombre, metrica.ayuda))
+            lineas.append('# TYPE {0} {1}'.format(metrica.nombre, metrica.tipo))
+            lineas.extend(metrica.lineas())
+        for recolector in self._recolectores:
+            for nombre, tipo, ayuda, muestras in recolector():
+                lineas.append('# HELP {0} {1}'.format(nombre, ayuda))
+                lineas.append('# TYPE {0} {1}'.format(nombre, tipo))
+                for etiquetas, valor in muestras:
+                    if valor is None:
+                        continue
+                    nombres = sorted(etiquetas)
+                    lineas.append('{0}{1} {2}'.format(nombre, _etiquetas(nombres, [etiquetas[clave] for clave in nombres]),
+                                                      _numero(valor)))
+        return '\n'.join(lineas) + '\n'
+
+
+class PerfiladorMuestreo(object):
+    """
+    Muestrea desde otro hilo la pila de un hilo cada `intervalo` segundos y cuenta las
+    pilas repetidas. Sólo cuesta mientras está activo y no modifica el hilo muestreado
+    """
+    def __init__(self, id_hilo, intervalo=INTERVALO_MUESTREO):
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.pilas = collections.Counter()
+        self._parada = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrea, name='perfilador')
+        self._hilo.daemon = True
+
+    def _muestrea(self):
+        while not self._parada.wait(self.intervalo):
+            marco = sys._current_frames().get(self.id_hilo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append('{0} ({1}:{2})'.format(codigo.co_name, os.path.basename(codigo.co_filename),
+                                                   marco.f_lineno))
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def inicia(self):
+        self._hilo.start()
+        return self
+
+    def para(self):
+        self._parada.set()
+        self._hilo.join()
+        return self.pilas
+
+    def escribe(self, ruta):
+        """Pilas plegadas: una línea 'marco1;marco2;... muestras' por pila distinta"""
+        with open(ruta, 'w') as fichero:
+            for pila, muestras in self.pilas.most_common():
+                fichero.write('{0} {1}\n'.format(pila, muestras))
+        return ruta
+
+
+def etiquetas_callback(salidas, valores_por_salida):
+    """
+    (callback, valor) de la petición a Dash en curso: la salida del callback si está en
+    `salidas` (los callbacks registrados en Dash) y, si está en valores_por_salida, el
+    valor de su primera entrada cuando es uno de los suyos (p. ej. la pestaña elegida).
+    Cualquier otra salida o valor se etiqueta como 'otro'
+    """
+    cuerpo = flask.request.get_json(silent=True)
+    cuerpo = cuerpo if isinstance(cuerpo, dict) else {}
+    callback = cuerpo.get('output')
+    if not isinstance(callback, str) or callback not in salidas:
+        return ETIQUETA_OTRO, ''
+    valor = ''
+    entradas = cuerpo.get('inputs') or []
+    if callback in valores_por_salida and isinstance(entradas, list) and entradas and isinstance(entradas[0], dict):
+        valor = entradas[0].get('value')
+        valor = valor if isinstance(valor, str) and valor in valores_por_salida[callback] else ETIQUETA_OTRO
+    return callback, valor
+
+def instala_instrumentacion(server, registro, salidas=(), valores_por_salida=None, dir_perfiles=None,
+                            ruta='/metrics'):
+    """
+    Registra en el servidor Flask la medición de todas las peticiones y la ruta de
+    métricas. `salidas` son las salidas de los callbacks de Dash que se etiquetan por
+    nombre (se consulta en cada petición, así que puede ser app.callback_map) y
+    valores_por_salida {salida: valores}, los valores de entrada que se etiquetan por
+    separado. Las vistas pueden anotar en flask.g `cache_respuesta` ('acierto' o 'fallo')
+    y `bytes_respuesta` (tamaño serializado cuando la respuesta va ya comprimida).
+    """
+    valores_por_salida = {salida: frozenset(valores) for salida, valores in (valores_por_salida or {}).items()}
+    numero_perfil = itertools.count(1)
+    latencia_peticiones = registro.histograma(
+        'covid_http_peticion_segundos', 'Latencia de las peticiones HTTP por ruta', ['ruta', 'metodo', 'estado'])
+    latencia_callbacks = registro.histograma(
+        'covid_dash_callback_segundos', 'Latencia de los callbacks de Dash', ['callback', 'entrada'])
+    bytes_callbacks = registro.histograma(
+        'covid_dash_callback_bytes', 'Bytes serializados de las respuestas de los callbacks de Dash',
+        ['callback', 'entrada'], limites=LIMITES_BYTES)
+    cache_callbacks = registro.contador(
+        'covid_dash_callback_cache_total', 'Respuestas de callbacks servidas desde la caché o calculadas',
+        ['callback', 'entrada', 'resultado'])
+    if dir_perfiles:
+        os.makedirs(dir_perfiles, exist_ok=True)
+
+    @server.before_request
+    def inicia_medicion():
+        flask.g.inicio_peticion = time.perf_counter()
+        if dir_perfiles and (flask.request.headers.get('X-Perfil') or 'perfil' in flask.request.args):
+            flask.g.perfilador = PerfiladorMuestreo(threading.get_ident()).inicia()
+
+    @server.after_request
+    def termina_medicion(respuesta):
+        inicio = flask.g.get('inicio_peticion')
+        if inicio is None:
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        temporizaciones = ['app;dur={0:.1f}'.format(duracion * 1000)]
+        if flask.request.path.endswith(RUTA_CALLBACKS) and flask.request.method == 'POST':
+            callback, valor = etiquetas_callback(salidas, valores_por_salida)
+            latencia_callbacks.observa(duracion, callback=callback, entrada=valor)
+            tamanio = flask.g.get('bytes_respuesta')
+            if tamanio is None and not respuesta.is_streamed:
+                tamanio = respuesta.calculate_content_length()
+            if tamanio is not None:
+                bytes_callbacks.observa(tamanio, callback=callback, entrada=valor)
+            resultado = flask.g.get('cache_respuesta')
+            if resultado is not None:
+                cache_callbacks.incrementa(callback=callback, entrada=valor, resultado=resultado)
+                temporizaciones.append('cache;desc="{0}"'.format(resultado))
+        else:
+            regla = flask.request.url_rule
+            latencia_peticiones.observa(duracion, ruta=regla.rule if regla is not None else 'otra',
+                                        metodo=flask.request.method, estado=respuesta.status_code)
+        respuesta.headers['Server-Timing'] = ', '.join(temporizaciones)
+        perfilador = flask.g.get('perfilador')
+        if perfilador is not None:
+            perfilador.para()
+            # El número de perfil distingue las peticiones a la misma ruta en el mismo segundo
+            nombre = '{0}-{1}-{2}-{3}.txt'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(numero_perfil),
+                                                  re.sub(r'[^A-Za-z0-9]+', '_', flask.request.path).strip('_') or 'raiz')
+            perfilador.escribe(os.path.join(dir_perfiles, nombre))
+            respuesta.headers['X-Perfil'] = nombre
+        return respuesta
+
+    @server.route(ruta)
+    def metricas():
+        return flask.Response(registro.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return registro
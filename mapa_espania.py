@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generación del mapa de infectados por comunidad autónoma.
+
+La geometría se guarda una única vez como topología (al estilo TopoJSON): los anillos
+de cada comunidad se cortan en arcos en los puntos donde se unen varias comunidades,
+los bordes compartidos se guardan una sola vez, cada arco se simplifica con
+Douglas-Peucker conservando sus extremos (de modo que las fronteras siguen encajando)
+y las coordenadas se cuantizan a enteros codificados como diferencias. El HTML final
+es autocontenido: la topología, los valores de cada comunidad y un decodificador que
+dibuja el mapa en SVG, sin librerías externas.
+
+    $ python mapa_espania.py topologia --origen infectados_espania.html
+    $ python mapa_espania.py html --valores mapas/valores_ccaa.csv --salida mapa.html
+"""
+import argparse
+import csv
+import html
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+DIR_RAIZ = os.path.dirname(os.path.abspath(__file__))
+DIR_MAPAS = os.path.join(DIR_RAIZ, 'mapas')
+RUTA_MAPA_FOLIUM = os.path.join(DIR_RAIZ, 'infectados_espania.html')
+RUTA_TOPOLOGIA = os.path.join(DIR_MAPAS, 'espania_ccaa.topojson')
+RUTA_VALORES = os.path.join(DIR_MAPAS, 'valores_ccaa.csv')
+FECHA_MAPA_FOLIUM = '2020-04-16'
+
+TOLERANCIA_SIMPLIFICACION = 0.01 # En grados (proyectados), unos 1000 m
+AREA_MINIMA_ISLA = 0.0005 # En grados cuadrados (proyectados), unos 5 km2
+CUANTIZACION = 4000 # Número de posiciones enteras en el lado más largo del mapa
+PRECISION_TOPOLOGIA = 1e6 # Rejilla para detectar puntos compartidos entre comunidades
+LATITUD_PROYECCION = 40.0
+# Canarias se dibuja desplazada junto a la península (grados de longitud y latitud)
+DESPLAZAMIENTOS = {'Canarias': (5.0, 7.0)}
+ESCALA_COLORES = ['#fff5f0', '#fee0d2', '#fcbba1', '#fc9272', '#fb6a4a',
+                  '#ef3b2c', '#cb181d', '#a50f15', '#67000d']
+
+PATRON_CIRCULO_FOLIUM = re.compile(
+    r'L\.circle\(\s*\[([-\d.]+), ([-\d.]+)\],.*?<center>(.*?)</b><br>Confirmados<br>'
+    r'<b><font[^>]*>(\d+)</font></b><br>Fallecidos<br><b>(\d+)</b>', re.S)
+PATRON_GEOJSON_FOLIUM = re.compile(r'geo_json_[0-9a-f]+_add\((\{.*?\})\);\n', re.S)
+
+
+# *********************************************************************************************************
+# --------------------------- LECTURA DE DATOS ------------------------------------------------------------
+# *********************************************************************************************************
+def _contiene(anillo, punto):
+    """Punto en polígono (regla par-impar) para un anillo (n, 2) de lon, lat"""
+    x, y = punto
+    xs, ys = anillo[:, 0], anillo[:, 1]
+    xs_sig, ys_sig = np.roll(xs, -1), np.roll(ys, -1)
+    cruza = (ys > y) != (ys_sig > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corte = xs + (y - ys) * (xs_sig - xs) / (ys_sig - ys)
+    return bool(np.count_nonzero(cruza & (x < corte)) % 2)
+
+def extrae_mapa_folium(ruta):
+    """
+    Extrae del mapa exportado con folium la geometría de cada comunidad y sus valores.
+    Las capas GeoJSON no llevan nombre: se asocian a la comunidad cuyo círculo cae
+    dentro (o, si no cae en ninguna, a la más cercana).
+    """
+    with open(ruta, encoding='utf-8') as fichero:
+        contenido = fichero.read()
+
+    geometrias = []
+    for bloque in PATRON_GEOJSON_FOLIUM.findall(contenido):
+        for feature in json.loads(bloque)['features']:
+            geometria = feature['geometry']
+            poligonos = geometria['coordinates']
+            if geometria['type'] == 'Polygon':
+                poligonos = [poligonos]
+            geometrias.append([[np.array(anillo, dtype=np.float64) for anillo in poligono]
+                               for poligono in poligonos])
+
+    comunidades = []
+    libres = list(range(len(geometrias)))
+    for latitud, longitud, nombre, confirmados, fallecidos in PATRON_CIRCULO_FOLIUM.findall(contenido):
+        punto = (float(longitud), float(latitud))
+        dentro = [i for i in libres if any(_contiene(poligono[0], punto) for poligono in geometrias[i])]
+        if dentro:
+            elegida = dentro[0]
+        else:
+            centros = {i: np.concatenate([poligono[0] for poligono in geometrias[i]]).mean(axis=0)
+                       for i in libres}
+            elegida = min(libres, key=lambda i: np.hypot(*(centros[i] - punto)))
+        libres.remove(elegida)
+        comunidades.append({'nombre': html.unescape(nombre).strip(), 'poligonos': geometrias[elegida],
+                            'confirmados': int(confirmados), 'fallecidos': int(fallecidos)})
+    return comunidades
+
+def lee_valores(ruta):
+    """
+    Lee el CSV de valores por comunidad (comunidad, confirmados, fallecidos, fecha).
+    Devuelve ({comunidad: {'confirmados': n, 'fallecidos': n}}, fecha más reciente).
+    """
+    valores, fechas = {}, []
+    with open(ruta, encoding='utf-8', newline='') as fichero:
+        for fila in csv.DictReader(fichero):
+            valores[fila['comunidad']] = {'confirmados': int(fila['confirmados']),
+                                          'fallecidos': int(fila['fallecidos'])}
+            if fila.get('fecha'):
+                fechas.append(fila['fecha'])
+    return valores, max(fechas) if fechas else None
+
+def escribe_valores(comunidades, ruta, fecha):
+    with open(ruta, 'w', encoding='utf-8', newline='') as fichero:
+        escritor = csv.writer(fichero)
+        escritor.writerow(['comunidad', 'confirmados', 'fallecidos', 'fecha'])
+        for comunidad in sorted(comunidades, key=lambda c: c['nombre']):
+            escritor.writerow([comunidad['nombre'], comunidad['confirmados'], comunidad['fallecidos'], fecha])
+
+
+# *********************************************************************************************************
+# --------------------------- CONSTRUCCIÓN DE LA TOPOLOGÍA ------------------------------------------------
+# *********************************************************************************************************
+def proyecta(anillo, desplazamiento=(0.0, 0.0)):
+    """Proyección equirectangular centrada en la península: x = lon·cos(lat0), y = lat"""
+    return np.column_stack([(anillo[:, 0] + desplazamiento[0]) * math.cos(math.radians(LATITUD_PROYECCION)),
+                            anillo[:, 1] + desplazamiento[1]])
+
+def _anillo_a_enteros(anillo):
+    """Anillo proyectado -> lista cíclica de puntos enteros (sin cierre ni repetidos)"""
+    enteros = np.round(anillo * PRECISION_TOPOLOGIA).astype(np.int64)
+    distintos = np.ones(len(enteros), dtype=bool)
+    distintos[1:] = np.any(enteros[1:] != enteros[:-1], axis=1)
+    enteros = enteros[distintos]
+    if len(enteros) > 1 and tuple(enteros[0]) == tuple(enteros[-1]):
+        enteros = enteros[:-1]
+    return [tuple(punto) for punto in enteros.tolist()]
+
+def _uniones(anillos):
+    """
+    Puntos en los que se cortan los anillos en arcos: los que no tienen los mismos
+    vecinos en todos los anillos en que aparecen (inicio o fin de una frontera compartida)
+    """
+    vecinos = {}
+    for anillo in anillos:
+        n = len(anillo)
+        for i, punto in enumerate(anillo):
+            par = frozenset((anillo[i - 1], anillo[(i + 1) % n]))
+            vecinos.setdefault(punto, set()).add(par)
+    return {punto for punto, pares in vecinos.items() if len(pares) > 1}
+
+def _corta_en_arcos(anillo, uniones):
+    """Divide un anillo cíclico en arcos que empiezan y terminan en uniones"""
+    cortes = [i for i, punto in enumerate(anillo) if punto in uniones]
+    if not cortes:
+        # Anillo sin uniones (isla o frontera completa): un único arco cerrado que
+        # empieza en su menor punto, para que el mismo anillo en dos comunidades coincida
+        inicio = anillo.index(min(anillo))
+        rotado = anillo[inicio:] + anillo[:inicio]
+        return [rotado + [rotado[0]]]
+    rotado = anillo[cortes[0]:] + anillo[:cortes[0]]
+    cortes = [i - cortes[0] for i in cortes] + [len(anillo)]
+    rotado.append(rotado[0])
+    return [rotado[inicio:fin + 1] for inicio, fin in zip(cortes[:-1], cortes[1:])]
+
+def _distancias_segmento(puntos, a, b):
+    ab = b - a
+    longitud = float(np.dot(ab, ab))
+    if longitud == 0.0:
+        return np.hypot(*(puntos - a).T)
+    t = np.clip(np.dot(puntos - a, ab) / longitud, 0.0, 1.0)
+    return np.hypot(*(puntos - (a + t[:, None] * ab)).T)
+
+def simplifica_arco(puntos, tolerancia):
+    """Douglas-Peucker iterativo sobre un arco (n, 2); siempre conserva los extremos"""
+    n = len(puntos)
+    conserva = np.zeros(n, dtype=bool)
+    conserva[[0, -1]] = True
+    pendientes = [(0, n - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        if fin - inicio < 2:
+            continue
+        distancias = _distancias_segmento(puntos[inicio + 1:fin], puntos[inicio], puntos[fin])
+        mayor = int(np.argmax(distancias))
+        if distancias[mayor] > tolerancia:
+            corte = inicio + 1 + mayor
+            conserva[corte] = True
+            pendientes.extend([(inicio, corte), (corte, fin)])
+    return puntos[conserva]
+
+def _area(anillo):
+    x, y = anillo[:, 0], anillo[:, 1]
+    return 0.5 * abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+
+def construye_topologia(comunidades, tolerancia=TOLERANCIA_SIMPLIFICACION,
+                        area_minima=AREA_MINIMA_ISLA, cuantizacion=CUANTIZACION):
+    """
+    Construye la topología con arcos compartidos, simplificados y cuantizados a partir
+    de [{'nombre': ..., 'poligonos': [[anillo exterior, huecos...], ...]}, ...]
+    """
+    # 1. Anillos proyectados sobre una rejilla fina de enteros
+    poligonos_comunidad = []
+    for comunidad in comunidades:
+        desplazamiento = DESPLAZAMIENTOS.get(comunidad['nombre'], (0.0, 0.0))
+        poligonos = [[_anillo_a_enteros(proyecta(anillo, desplazamiento)) for anillo in poligono]
+                     for poligono in comunidad['poligonos']]
+        poligonos_comunidad.append([[anillo for anillo in poligono if len(anillo) >= 3]
+                                    for poligono in poligonos if len(poligono[0]) >= 3])
+
+    # 2. Corte en arcos en las uniones y eliminación de arcos repetidos (en cualquier sentido)
+    uniones = _uniones([anillo for poligonos in poligonos_comunidad
+                        for poligono in poligonos for anillo in poligono])
+    arcos, indice_arcos, usos = [], {}, []
+    def referencia(arco):
+        clave = tuple(arco)
+        if clave in indice_arcos:
+            return indice_arcos[clave]
+        inversa = tuple(reversed(arco))
+        if inversa in indice_arcos:
+            return ~indice_arcos[inversa]
+        indice_arcos[clave] = len(arcos)
+        arcos.append(arco)
+        usos.append(0)
+        return len(arcos) - 1
+    referencias_comunidad = []
+    for poligonos in poligonos_comunidad:
+        referencias = [[[referencia(arco) for arco in _corta_en_arcos(anillo, uniones)]
+                        for anillo in poligono] for poligono in poligonos]
+        for indice in (i for poligono in referencias for anillo in poligono for i in anillo):
+            usos[indice if indice >= 0 else ~indice] += 1
+        referencias_comunidad.append(referencias)
+
+    # 3. Simplificación de cada arco una única vez
+    simplificados = [simplifica_arco(np.array(arco, dtype=np.float64) / PRECISION_TOPOLOGIA, tolerancia)
+                     for arco in arcos]
+
+    # 4. Descarte de islas y huecos diminutos formados sólo por arcos no compartidos
+    def puntos_anillo(anillo):
+        partes = [simplificados[i] if i >= 0 else simplificados[~i][::-1] for i in anillo]
+        return np.concatenate([partes[0]] + [parte[1:] for parte in partes[1:]])
+    def conserva(anillo):
+        if any(usos[i if i >= 0 else ~i] > 1 for i in anillo):
+            return True
+        puntos = puntos_anillo(anillo)
+        return len(puntos) >= 4 and _area(puntos) >= area_minima
+    for posicion, referencias in enumerate(referencias_comunidad):
+        filtradas = [[poligono[0]] + [hueco for hueco in poligono[1:] if conserva(hueco)]
+                     for poligono in referencias if conserva(poligono[0])]
+        if not filtradas and referencias:
+            # Nunca se deja una comunidad sin geometría: se conserva su mayor polígono
+            filtradas = [max(referencias, key=lambda poligono: _area(puntos_anillo(poligono[0])))[:1]]
+        referencias_comunidad[posicion] = filtradas
+
+    # 5. Renumeración de los arcos usados, cuantización y codificación por diferencias
+    usados = sorted({i if i >= 0 else ~i for referencias in referencias_comunidad
+                     for poligono in referencias for anillo in poligono for i in anillo})
+    nuevo_indice = {viejo: nuevo for nuevo, viejo in enumerate(usados)}
+    todos = np.concatenate([simplificados[i] for i in usados])
+    minimo = todos.min(axis=0)
+    escala = float((todos.max(axis=0) - minimo).max()) / (cuantizacion - 1)
+    arcos_codificados = []
+    for i in usados:
+        enteros = np.round((simplificados[i] - minimo) / escala).astype(np.int64)
+        distintos = np.ones(len(enteros), dtype=bool)
+        distintos[1:-1] = np.any(enteros[1:-1] != enteros[:-2], axis=1)
+        enteros = enteros[distintos]
+        arcos_codificados.append(np.vstack([enteros[:1], np.diff(enteros, axis=0)]).tolist())
+
+    geometrias = []
+    for comunidad, referencias in zip(comunidades, referencias_comunidad):
+        poligonos = [[[nuevo_indice[i] if i >= 0 else ~nuevo_indice[~i] for i in anillo]
+                      for anillo in poligono] for poligono in referencias]
+        geometrias.append({'type': 'MultiPolygon', 'arcs': poligonos,
+                           'properties': {'nombre': comunidad['nombre']}})
+    maximo = np.round((todos.max(axis=0) - minimo) / escala).astype(int).tolist()
+    return {'type': 'Topology',
+            'transform': {'scale': [escala, escala], 'translate': minimo.tolist()},
+            'bbox': [0, 0] + maximo,
+            'arcs': arcos_codificados,
+            'objects': {'ccaa': {'type': 'GeometryCollection', 'geometries': geometrias}}}
+
+def serializa_topologia(topologia):
+    return json.dumps(topologia, ensure_ascii=False, separators=(',', ':'))
+
+
+# *********************************************************************************************************
+# --------------------------- GENERACIÓN DEL HTML ---------------------------------------------------------
+# *********************************************************************************************************
+def cortes_escala(valores, clases=len(ESCALA_COLORES)):
+    """Límites inferiores de cada clase de color, en escala logarítmica entre mínimo y máximo"""
+    positivos = [valor for valor in valores if valor > 0]
+    if not positivos:
+        return [0] * clases
+    minimo, maximo = math.log10(min(positivos)), math.log10(max(positivos))
+    return [0] + [int(round(10 ** (minimo + (maximo - minimo) * i / clases))) for i in range(1, clases)]
+
+def color_valor(valor, cortes):
+    clase = 0
+    for posicion, corte in enumerate(cortes):
+        if valor >= corte:
+            clase = posicion
+    return ESCALA_COLORES[clase]
+
+def _formatea(numero):
+    return '{0:,}'.format(numero).replace(',', '.')
+
+PLANTILLA_HTML = '''<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>{titulo}</title>
+<style>
+body{{margin:0;font-family:"Helvetica Neue",Helvetica,Arial,sans-serif}}
+svg{{display:block;width:100%;height:96vh}}
+path{{stroke:#333;stroke-opacity:.5;stroke-width:1;vector-effect:non-scaling-stroke;cursor:pointer}}
+path:hover{{stroke:#000;stroke-opacity:1;stroke-width:2}}
+rect.recuadro{{fill:none;stroke:#999;stroke-dasharray:4 3;vector-effect:non-scaling-stroke}}
+.leyenda{{position:absolute;right:12px;bottom:12px;background:#fff;padding:6px 10px;font-size:12px;line-height:18px;border:1px solid #ddd}}
+.leyenda i{{display:inline-block;width:14px;height:14px;margin-right:6px;vertical-align:middle}}
+</style></head><body>
+<svg id="mapa" viewBox="{caja}" preserveAspectRatio="xMidYMid meet"><g id="comunidades" transform="matrix(1 0 0 -1 0 {alto})"></g></svg>
+<div class="leyenda"><b>Confirmados</b><br>{leyenda}<br><small>Datos del {fecha}</small></div>
+<script id="topologia" type="application/json">{topologia}</script>
+<script>
+(function(){{
+var topo=JSON.parse(document.getElementById('topologia').textContent),svg=document.getElementById('mapa'),
+g=document.getElementById('comunidades'),ns='http://www.w3.org/2000/svg',caja=svg.getAttribute('viewBox');
+var arcos=topo.arcs.map(function(arco){{var x=0,y=0;return arco.map(function(d){{x+=d[0];y+=d[1];return [x,y];}});}});
+function anillo(indices){{var puntos=[];indices.forEach(function(i){{var arco=i<0?arcos[~i].slice().reverse():arcos[i];
+puntos=puntos.concat(puntos.length?arco.slice(1):arco);}});return 'M'+puntos.join('L')+'Z';}}
+topo.objects.ccaa.geometries.forEach(function(geo){{var p=geo.properties,camino=document.createElementNS(ns,'path'),
+titulo=document.createElementNS(ns,'title');camino.setAttribute('d',geo.arcs.map(function(poligono){{
+return poligono.map(anillo).join('');}}).join(''));camino.setAttribute('fill',p.color);camino.setAttribute('fill-rule','evenodd');
+titulo.textContent=p.texto;camino.appendChild(titulo);camino.addEventListener('click',function(e){{e.stopPropagation();
+var c=camino.getBBox(),h=Number(caja.split(' ')[3]),m=Math.max(c.width,c.height)*0.15;
+svg.setAttribute('viewBox',svg.getAttribute('viewBox')===caja?[c.x-m,h-c.y-c.height-m,c.width+2*m,c.height+2*m].join(' '):caja);}});
+g.appendChild(camino);}});
+var recuadros=topo.recuadros||[];recuadros.forEach(function(r){{var rect=document.createElementNS(ns,'rect');
+rect.setAttribute('class','recuadro');['x','y','width','height'].forEach(function(a,i){{rect.setAttribute(a,r[i]);}});g.appendChild(rect);}});
+svg.addEventListener('click',function(){{svg.setAttribute('viewBox',caja);}});
+}})();
+</script></body></html>
+'''
+
+def genera_html(topologia, valores, fecha=None, titulo='Infectados en España por comunidad autónoma'):
+    """
+    HTML autocontenido con la topología y, en las propiedades de cada comunidad, su
+    color, sus valores y el texto del tooltip. Las comunidades sin valores quedan en gris.
+    """
+    topologia = json.loads(json.dumps(topologia))
+    geometrias = topologia['objects']['ccaa']['geometries']
+    cortes = cortes_escala([valores[geo['properties']['nombre']]['confirmados']
+                            for geo in geometrias if geo['properties']['nombre'] in valores])
+    for geo in geometrias:
+        propiedades = geo['properties']
+        valor = valores.get(propiedades['nombre'])
+        if valor is None:
+            propiedades.update(color='#dddddd', texto='{0}\nSin datos'.format(propiedades['nombre']))
+        else:
+            propiedades.update(color=color_valor(valor['confirmados'], cortes), texto='{0}\nConfirmados: {1}\nFallecidos: {2}'.format(
+                propiedades['nombre'], _formatea(valor['confirmados']), _formatea(valor['fallecidos'])))
+
+    # Recuadro alrededor de las comunidades desplazadas (en coordenadas cuantizadas)
+    recuadros = []
+    for nombre, (dx, dy) in DESPLAZAMIENTOS.items():
+        arcos = [i if i >= 0 else ~i for geo in geometrias if geo['properties']['nombre'] == nombre
+                 for poligono in geo['arcs'] for anillo in poligono for i in anillo]
+        if arcos:
+            puntos = np.concatenate([np.cumsum(topologia['arcs'][i], axis=0) for i in set(arcos)])
+            minimo, maximo = puntos.min(axis=0) - 40, puntos.max(axis=0) + 40
+            recuadros.append([int(minimo[0]), int(minimo[1])] + (maximo - minimo).astype(int).tolist())
+    topologia['recuadros'] = recuadros
+
+    ancho, alto = topologia['bbox'][2], topologia['bbox'][3]
+    leyenda = '<br>'.join('<i style="background:{0}"></i>{1}{2}'.format(
+        color, '≥ ' if posicion else '', _formatea(corte)) for posicion, (color, corte)
+        in enumerate(zip(ESCALA_COLORES, cortes)) if posicion == 0 or corte > cortes[posicion - 1])
+    contenido = serializa_topologia(topologia).replace('</', '<\\/')
+    return PLANTILLA_HTML.format(titulo=html.escape(titulo), caja='-20 -20 {0} {1}'.format(ancho + 40, alto + 40),
+                                 alto=alto, leyenda=leyenda, fecha=fecha or '-', topologia=contenido)
+
+def carga_topologia(ruta=RUTA_TOPOLOGIA):
+    with open(ruta, encoding='utf-8') as fichero:
+        return json.load(fichero)
+
+
+# *********************************************************************************************************
+# ---------------------- MAIN -----------------------------------------------------------------------------
+# *********************************************************************************************************
+def _informe(nombre, contenido, segundos, referencia=None):
+    tamanio = len(contenido.encode('utf-8'))
+    texto = '{0}: {1:.1f} KB en {2:.2f} s'.format(nombre, tamanio / 1024.0, segundos)
+    if referencia:
+        texto += ' ({0:.1f}x menor que {1})'.format(os.path.getsize(referencia) / float(tamanio),
+                                                    os.path.basename(referencia))
+    print(texto)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='orden')
+    topologia = subparsers.add_parser('topologia', help='Extrae la geometría del mapa de folium y genera la topología')
+    topologia.add_argument('--origen', default=RUTA_MAPA_FOLIUM)
+    topologia.add_argument('--salida', default=RUTA_TOPOLOGIA)
+    topologia.add_argument('--valores', default=RUTA_VALORES, help='CSV donde guardar los valores del mapa de folium')
+    topologia.add_argument('--tolerancia', type=float, default=TOLERANCIA_SIMPLIFICACION)
+    topologia.add_argument('--cuantizacion', type=int, default=CUANTIZACION)
+    mapa = subparsers.add_parser('html', help='Genera el HTML del mapa a partir de la topología y los valores')
+    mapa.add_argument('--topologia', default=RUTA_TOPOLOGIA)
+    mapa.add_argument('--valores', default=RUTA_VALORES)
+    mapa.add_argument('--salida', default='infectados_espania_generado.html')
+    args = parser.parse_args()
+
+    if args.orden == 'topologia':
+        inicio = time.time()
+        comunidades = extrae_mapa_folium(args.origen)
+        lectura = time.time() - inicio
+        inicio = time.time()
+        resultado = construye_topologia(comunidades, tolerancia=args.tolerancia, cuantizacion=args.cuantizacion)
+        contenido = serializa_topologia(resultado)
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, 'w', encoding='utf-8') as fichero:
+            fichero.write(contenido)
+        escribe_valores(comunidades, args.valores, FECHA_MAPA_FOLIUM)
+        print('Lectura del mapa de folium: {0:.2f} s, {1} comunidades'.format(lectura, len(comunidades)))
+        _informe(args.salida, contenido, time.time() - inicio, args.origen)
+        print('Arcos: {0}, puntos: {1}'.format(len(resultado['arcs']), sum(len(arco) for arco in resultado['arcs'])))
+    elif args.orden == 'html':
+        inicio = time.time()
+        valores, fecha = lee_valores(args.valores)
+        contenido = genera_html(carga_topologia(args.topologia), valores, fecha)
+        with open(args.salida, 'w', encoding='utf-8') as fichero:
+            fichero.write(contenido)
+        _informe(args.salida, contenido, time.time() - inicio, RUTA_MAPA_FOLIUM)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Datos del mapa global de infectados con varios niveles de detalle.
+
+La vista filtrada (regiones con casos y coordenadas) se calcula una única vez por
+versión de los datos, con las coordenadas redondeadas y los textos ya construidos. Con
+poco zoom las regiones se agrupan en celdas de una rejilla (un círculo por celda con la
+suma de casos) y al acercarse se envían las regiones individuales de la zona visible.
+"""
+import math
+
+import numpy as np
+import plotly.graph_objs as go
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+DECIMALES_COORDENADAS = 2 # Alrededor de 1 km, de sobra para un círculo en el mapa
+DECIMALES_TAMANIO = 1
+TAMANIO_CELDA_BASE = 8.0 # Lado en grados de las celdas con el mapa completo (escala 1)
+NIVEL_DETALLE = 3 # A partir de la escala 2**3 se envían las regiones individuales
+MARGEN_VENTANA = 0.5 # Fracción de la ventana visible que se añade por cada lado
+PAISES_TEXTO_GRUPO = 3
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def tamanio_marcador(casos):
+    """Tamaño de los círculos del mapa principal de contagios"""
+    return np.round(np.sqrt(np.asarray(casos, dtype=np.float64) / 30) + 10, DECIMALES_TAMANIO)
+
+def nivel_escala(escala):
+    """Nivel de detalle (0 = mapa completo) para la escala de la proyección"""
+    return max(0, min(NIVEL_DETALLE, int(math.floor(math.log(max(escala, 1.0), 2)))))
+
+def ventana_relayout(relayout):
+    """
+    Extrae de relayoutData del mapa la escala y el centro de la proyección. Devuelve
+    (nivel, (lon_min, lon_max, lat_min, lat_max)) o None si el evento no es de zoom o
+    desplazamiento del mapa.
+    """
+    if not relayout:
+        return None
+    geo = relayout.get('geo') if isinstance(relayout.get('geo'), dict) else {}
+    planos = dict(relayout)
+    for clave, valor in geo.items():
+        planos.setdefault('geo.' + clave, valor)
+    if not any(clave.startswith('geo.') for clave in planos):
+        return None
+    escala = float(planos.get('geo.projection.scale') or 1.0)
+    lon = planos.get('geo.center.lon', planos.get('geo.projection.rotation.lon', 0.0))
+    lat = planos.get('geo.center.lat', 0.0)
+    lon, lat = float(lon or 0.0), float(lat or 0.0)
+    medio_lon = 180.0 / escala * (1 + MARGEN_VENTANA)
+    medio_lat = 90.0 / escala * (1 + MARGEN_VENTANA)
+    return nivel_escala(escala), (lon - medio_lon, lon + medio_lon, lat - medio_lat, lat + medio_lat)
+
+
+class VistaMapa(object):
+    """
+    Regiones con casos del mapa global, ya filtradas, redondeadas y con su texto
+    """
+    def __init__(self, latitudes, longitudes, casos, estados, paises):
+        validas = (casos > 0) & ~np.isnan(latitudes) & ~np.isnan(longitudes)
+        self.lat = np.round(latitudes[validas], DECIMALES_COORDENADAS)
+        self.lon = np.round(longitudes[validas], DECIMALES_COORDENADAS)
+        self.casos = casos[validas].astype(np.int64)
+        self.paises = np.asarray(paises)[validas]
+        self.textos = np.array(['Estado: {0} <br> Pais: {1} <br> Casos: {2}'.format(estado, pais, n) if estado
+                                else 'Pais: {0} <br> Casos: {1}'.format(pais, n) for estado, pais, n
+                                in zip(np.asarray(estados)[validas].tolist(), self.paises.tolist(),
+                                       self.casos.tolist())], dtype=object)
+        self._niveles = {}
+
+    @classmethod
+    def desde_cubo(cls, cubo, metrica=0):
+        return cls(cubo.coordenadas[:, 0], cubo.coordenadas[:, 1], cubo.regiones[metrica, :, -1],
+                   cubo.estados, cubo.paises_region)
+
+    def __len__(self):
+        return len(self.casos)
+
+    def detalle(self, ventana=None):
+        """Regiones individuales, sólo las de la ventana (lon_min, lon_max, lat_min, lat_max) si se indica"""
+        if ventana is None:
+            seleccion = slice(None)
+        else:
+            lon_min, lon_max, lat_min, lat_max = ventana
+            # Longitudes en [-180, 180): la ventana puede dar la vuelta al antimeridiano
+            lon = (self.lon - lon_min) % 360.0
+            seleccion = (lon <= lon_max - lon_min) & (self.lat >= lat_min) & (self.lat <= lat_max)
+        return {'lat': self.lat[seleccion], 'lon': self.lon[seleccion],
+                'tamanio': tamanio_marcador(self.casos[seleccion]), 'texto': self.textos[seleccion]}
+
+    def agrupa(self, tamanio_celda):
+        """
+        Un punto por celda de la rejilla con la suma de casos, en el centro ponderado
+        por casos de sus regiones
+        """
+        celdas = np.floor(self.lon / tamanio_celda).astype(np.int64) * 100000 + \
+            np.floor(self.lat / tamanio_celda).astype(np.int64)
+        _, grupo = np.unique(celdas, return_inverse=True)
+        grupo = grupo.ravel()
+        casos = np.bincount(grupo, weights=self.casos)
+        lat = np.round(np.bincount(grupo, weights=self.lat * self.casos) / casos, DECIMALES_COORDENADAS)
+        lon = np.round(np.bincount(grupo, weights=self.lon * self.casos) / casos, DECIMALES_COORDENADAS)
+        regiones = np.bincount(grupo)
+
+        # Texto: el de la región si la celda sólo tiene una, si no los países con más casos
+        orden = np.lexsort((-self.casos, grupo))
+        inicios = np.searchsorted(grupo[orden], np.arange(len(casos)))
+        textos = []
+        for indice, inicio in enumerate(inicios.tolist()):
+            if regiones[indice] == 1:
+                textos.append(self.textos[orden[inicio]])
+                continue
+            paises = []
+            for pais in self.paises[orden[inicio:inicio + regiones[indice]]].tolist():
+                if pais not in paises:
+                    paises.append(pais)
+            nombres = ', '.join(paises[:PAISES_TEXTO_GRUPO]) + (', ...' if len(paises) > PAISES_TEXTO_GRUPO else '')
+            textos.append('Regiones: {0} <br> Paises: {1} <br> Casos: {2}'.format(
+                regiones[indice], nombres, int(casos[indice])))
+        return {'lat': lat, 'lon': lon, 'tamanio': tamanio_marcador(casos),
+                'texto': np.array(textos, dtype=object)}
+
+    def puntos(self, nivel=0, ventana=None):
+        """Puntos a dibujar para un nivel de detalle. Los niveles agrupados se guardan"""
+        if nivel >= NIVEL_DETALLE:
+            return self.detalle(ventana)
+        if nivel not in self._niveles:
+            self._niveles[nivel] = self.agrupa(TAMANIO_CELDA_BASE / 2 ** nivel)
+        return self._niveles[nivel]
+
+
+def figura_mapa(puntos, plantilla=None):
+    """
+    Figura Scattergeo del mapa principal. uirevision conserva el zoom del usuario cuando
+    la figura se sustituye por otro nivel de detalle.
+    """
+    return go.Figure(data=go.Scattergeo(
+        locationmode = 'ISO-3',
+        lon = puntos['lon'],
+        lat = puntos['lat'],
+        text = puntos['texto'],
+        hoverinfo = 'text',
+        mode = 'markers',
+        marker = dict(
+            size = puntos['tamanio'],
+            opacity = 0.8,
+            reversescale = True,
+            autocolorscale = False,
+            color='red',
+            line = dict(width=1,color='rgba(102, 102, 102)'))),
+                     layout=dict(geo = dict(showcountries = True), uirevision='mapa-principal',
+                                 height=800, template=plantilla, margin=dict(t=10)))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Métricas derivadas de las series acumuladas del cubo, para todas sus filas a la vez.
+
+Todas se calculan a partir de los acumulados del día, del día anterior y de hace una
+semana, así que cuando un refresco sólo añade días basta con calcular esos días y
+añadirlos a los ya calculados, y cuando revisa el histórico de algunas regiones basta
+con recalcular sus filas:
+  - nuevos: casos diarios (acumulado de hoy menos el de ayer)
+  - media7: media de los casos diarios de los últimos 7 días
+  - letalidad: fallecidos / confirmados (%)
+  - crecimiento: crecimiento diario medio de los confirmados en la última semana (%)
+  - duplicacion: días que tardarían en duplicarse los confirmados a ese crecimiento
+"""
+import numpy as np
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+DIAS_MEDIA = 7
+METRICAS_DERIVADAS = ('nuevos', 'media7', 'letalidad', 'crecimiento', 'duplicacion')
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def _desplazado(valores, dias, retraso):
+    """Acumulados de hace `retraso` días para los días indicados (0 antes del primer día)"""
+    previos = dias - retraso
+    validos = previos >= 0
+    resultado = np.zeros(valores.shape[:2] + (len(dias),), dtype=np.int64)
+    resultado[:, :, validos] = valores[:, :, previos[validos]]
+    return resultado
+
+def calcula_dias(valores, inicio=0):
+    """
+    Métricas derivadas de los días [inicio, n) de un array de acumulados (métrica, fila,
+    día). Devuelve (nuevos, media7, letalidad, crecimiento).
+    """
+    dias = np.arange(inicio, valores.shape[2])
+    actual = valores[:, :, inicio:].astype(np.int64)
+    hace_una_semana = _desplazado(valores, dias, DIAS_MEDIA)
+    nuevos = (actual - _desplazado(valores, dias, 1)).astype(np.int32)
+    media7 = ((actual - hace_una_semana) / np.minimum(dias + 1, DIAS_MEDIA)).astype(np.float32)
+    confirmados, fallecidos, base = actual[0], actual[1], hace_una_semana[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        letalidad = np.where(confirmados > 0, 100.0 * fallecidos / confirmados, np.nan).astype(np.float32)
+        crecimiento = np.where((base > 0) & (dias >= DIAS_MEDIA),
+                               100.0 * (np.power(confirmados / base, 1.0 / DIAS_MEDIA) - 1), np.nan)
+    return nuevos, media7, letalidad, crecimiento.astype(np.float32)
+
+def tiempo_duplicacion(crecimiento):
+    """Días para duplicar a un crecimiento diario (%) dado; NaN si no hay crecimiento"""
+    crecimiento = np.asarray(crecimiento, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(crecimiento > 0, np.log(2.0) / np.log1p(crecimiento / 100.0), np.nan).astype(np.float32)
+
+
+class MetricasDerivadas(object):
+    """
+    Métricas derivadas de todas las filas del cubo (regiones, países y total):
+      - nuevos: int32 (métrica, fila, día)
+      - media7: float32 (métrica, fila, día)
+      - letalidad, crecimiento: float32 (fila, día), NaN donde no están definidas
+    """
+    def __init__(self, cubo, nuevos, media7, letalidad, crecimiento, dias_calculados=None, filas_recalculadas=0):
+        self.fechas = list(cubo.fechas)
+        self.nuevos = nuevos
+        self.media7 = media7
+        self.letalidad = letalidad
+        self.crecimiento = crecimiento
+        # Días nuevos calculados para todas las filas y filas con el histórico recalculado
+        # en la última actualización (dias_calculados es None si se calculó todo)
+        self.dias_calculados = dias_calculados
+        self.filas_recalculadas = filas_recalculadas
+
+    @classmethod
+    def calcula(cls, cubo):
+        """Cálculo completo de todas las filas y días"""
+        return cls(cubo, *calcula_dias(cubo.valores))
+
+    @classmethod
+    def actualiza(cls, anterior, cubo, cambios=None):
+        """
+        Métricas del cubo nuevo a partir de las del anterior y del informe de cambios
+        entre ambos cubos (cambios.compara_cubos). Los días nuevos se calculan para todas
+        las filas; las revisiones del histórico sólo recalculan las filas afectadas
+        (regiones, sus países y el total) desde el primer día revisado. Si cambian las
+        regiones o las fechas anteriores se recalcula todo.
+        """
+        if anterior is None or cambios is None or not cambios.misma_estructura \
+                or len(anterior.fechas) != cubo.valores.shape[2] - len(cambios.fechas_nuevas):
+            return cls.calcula(cubo)
+        inicio = len(anterior.fechas)
+        nuevos, media7, letalidad, crecimiento = calcula_dias(cubo.valores, inicio)
+        metricas = cls(cubo, np.concatenate([anterior.nuevos, nuevos], axis=2),
+                       np.concatenate([anterior.media7, media7], axis=2),
+                       np.concatenate([anterior.letalidad, letalidad], axis=1),
+                       np.concatenate([anterior.crecimiento, crecimiento], axis=1),
+                       dias_calculados=len(cubo.fechas) - inicio)
+        filas = cambios.filas_cubo_revisadas
+        if len(filas):
+            # Las métricas de un día dependen de los 7 anteriores: se recalcula desde el
+            # primer día revisado hasta el final
+            desde = cambios.primer_dia_revisado
+            nuevos, media7, letalidad, crecimiento = calcula_dias(cubo.valores[:, filas], desde)
+            metricas.nuevos[:, filas, desde:] = nuevos
+            metricas.media7[:, filas, desde:] = media7
+            metricas.letalidad[filas, desde:] = letalidad
+            metricas.crecimiento[filas, desde:] = crecimiento
+            metricas.filas_recalculadas = len(filas)
+        return metricas
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.nuevos, self.media7, self.letalidad, self.crecimiento])
+
+    def serie(self, metrica, fila):
+        """
+        Serie de una métrica derivada para una fila del cubo: (métrica, día) para
+        'nuevos' y 'media7', (día,) para el resto
+        """
+        if metrica == 'duplicacion':
+            return tiempo_duplicacion(self.crecimiento[fila])
+        if metrica in ('nuevos', 'media7'):
+            return getattr(self, metrica)[:, fila]
+        return getattr(self, metrica)[fila]
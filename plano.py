@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Plano de datos compartido entre los procesos de gunicorn.
+
+El cubo de cada versión de los datos se escribe una única vez como una generación (un
+directorio con un .npy por array) y cada proceso la mapea en memoria de sólo lectura:
+todos los trabajadores comparten las mismas páginas de la caché del sistema en lugar
+de tener cada uno su propia copia. El fichero ACTUAL apunta a la última generación.
+
+Sólo el proceso que tiene el cerrojo del directorio (el líder) descarga los datos y
+publica generaciones nuevas; el resto se limita a mapear la generación actual.
+"""
+import json
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError: # Sin fcntl (Windows) no hay varios trabajadores: el proceso siempre es líder
+    fcntl = None
+
+from cubo import CuboSeries
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+FICHERO_ACTUAL = 'ACTUAL'
+FICHERO_CERROJO = 'lider.lock'
+GENERACIONES_CONSERVADAS = 3
+
+
+# *********************************************************************************************************
+# --------------------------- PLANO COMPARTIDO ------------------------------------------------------------
+# *********************************************************************************************************
+class PlanoCompartido(object):
+    """
+    Directorio de generaciones del cubo con un puntero a la actual y un cerrojo de líder
+    """
+    def __init__(self, directorio, generaciones_conservadas=GENERACIONES_CONSERVADAS):
+        self.directorio = directorio
+        self.generaciones_conservadas = generaciones_conservadas
+        self._fichero_cerrojo = None
+        self._pid_cerrojo = None
+
+    def _ruta(self, *partes):
+        return os.path.join(self.directorio, *partes)
+
+    @property
+    def lider(self):
+        """Si este proceso tiene el cerrojo (sin intentar conseguirlo)"""
+        return self._fichero_cerrojo is not None and self._pid_cerrojo == os.getpid()
+
+    def es_lider(self):
+        """
+        Intenta conseguir el cerrojo del directorio sin bloquear. Un cerrojo heredado de
+        otro proceso tras un fork no cuenta: el proceso tiene que conseguir el suyo.
+        """
+        if self.lider or fcntl is None:
+            return True
+        os.makedirs(self.directorio, exist_ok=True)
+        fichero = open(self._ruta(FICHERO_CERROJO), 'a')
+        try:
+            fcntl.flock(fichero.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            fichero.close()
+            return False
+        self._fichero_cerrojo, self._pid_cerrojo = fichero, os.getpid()
+        return True
+
+    def suelta_liderazgo(self):
+        """
+        Libera el cerrojo. El proceso maestro de gunicorn debe soltarlo antes de crear
+        los trabajadores para que uno de ellos pueda conseguirlo.
+        """
+        if self._fichero_cerrojo is not None:
+            self._fichero_cerrojo.close()
+        self._fichero_cerrojo, self._pid_cerrojo = None, None
+
+    def actual(self):
+        """Contenido del puntero a la generación actual o None si no hay ninguna"""
+        try:
+            with open(self._ruta(FICHERO_ACTUAL)) as fichero:
+                return json.load(fichero)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _escribe_actual(self, actual):
+        temporal = self._ruta('.{0}.{1}'.format(FICHERO_ACTUAL, os.getpid()))
+        with open(temporal, 'w') as fichero:
+            json.dump(actual, fichero, indent=1)
+        os.replace(temporal, self._ruta(FICHERO_ACTUAL))
+
+    def publica(self, cubo, version, metadatos=None):
+        """
+        Escribe el cubo como generación `version` (si no existía), la marca como actual
+        y devuelve el cubo mapeado desde disco, que es el que debe usar este proceso
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        destino = self._ruta(version)
+        if not os.path.isdir(destino):
+            temporal = self._ruta('.tmp-{0}-{1}'.format(os.getpid(), time.time()))
+            cubo.guarda(temporal)
+            try:
+                os.rename(temporal, destino)
+            except OSError:
+                # Otro proceso ha publicado la misma generación a la vez
+                shutil.rmtree(temporal, ignore_errors=True)
+                if not os.path.isdir(destino):
+                    raise
+        ahora = time.time()
+        actual = {'generacion': version, 'version': version, 'publicado': ahora, 'comprobado': ahora}
+        actual.update(metadatos or {})
+        self._escribe_actual(actual)
+        self._purga(version)
+        return self.carga(version)
+
+    def marca_comprobado(self, metadatos=None):
+        """Anota que el líder ha comprobado los datos sin encontrar una versión nueva"""
+        actual = self.actual()
+        if actual is not None:
+            actual.update(metadatos or {})
+            actual['comprobado'] = time.time()
+            self._escribe_actual(actual)
+        return actual
+
+    def carga(self, generacion):
+        return CuboSeries.carga(self._ruta(generacion), mmap=True)
+
+    def _purga(self, vigente):
+        # Los procesos que aún tengan mapeada una generación borrada la siguen leyendo:
+        # el sistema no libera los ficheros hasta que se desmapean
+        generaciones = []
+        for nombre in os.listdir(self.directorio):
+            ruta = self._ruta(nombre)
+            if os.path.isdir(ruta) and nombre != vigente and not nombre.startswith('.'):
+                generaciones.append((os.path.getmtime(ruta), nombre))
+        for _, nombre in sorted(generaciones, reverse=True)[self.generaciones_conservadas - 1:]:
+            shutil.rmtree(self._ruta(nombre), ignore_errors=True)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Consultas por rango de fechas sobre las filas del cubo en tiempo constante.
+
+Los valores del cubo son acumulados, es decir, la suma prefija de los casos diarios
+(métricas derivadas 'nuevos'), así que el índice no copia nada: los casos de una fila
+entre los días inicio y fin (ambos incluidos) son acumulado[fin] - acumulado[inicio - 1],
+con acumulado[-1] = 0. Cada consulta lee dos columnas del cubo sea cual sea la longitud
+del rango, y se puede hacer para una fila o para muchas a la vez (p. ej. las barras de
+todos los países).
+"""
+import numpy as np
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+MESES = ['ene', 'feb', 'mar', 'abr', 'may', 'jun', 'jul', 'ago', 'sep', 'oct', 'nov', 'dic']
+MAXIMO_MARCAS = 24 # Marcas mensuales como máximo en el deslizador; con más se marca cada varios meses
+
+
+# *********************************************************************************************************
+# --------------------------- ÍNDICE DE RANGOS DE FECHAS --------------------------------------------------
+# *********************************************************************************************************
+class IndiceRangos(object):
+    """
+    Índice de rangos de días de un cubo. Las posiciones son las de cubo.dias (y cubo.fechas)
+    y los rangos [inicio, fin] incluyen ambos extremos
+    """
+    def __init__(self, cubo):
+        self.valores = cubo.valores
+        self.dias = cubo.dias
+        self.ultimo = len(cubo.dias) - 1
+
+    def posiciones(self, desde=None, hasta=None):
+        """
+        (inicio, fin) de los días del cubo entre dos fechas (date, datetime, datetime64 o
+        'AAAA-MM-DD'), acotado a los días disponibles. Sin fecha se toma el extremo
+        """
+        inicio = 0 if desde is None else int(np.searchsorted(self.dias, np.datetime64(desde, 'D'), 'left'))
+        fin = self.ultimo if hasta is None else int(np.searchsorted(self.dias, np.datetime64(hasta, 'D'), 'right')) - 1
+        return self.acota((inicio, fin))
+
+    def acota(self, rango):
+        """(inicio, fin) de un par de posiciones (p. ej. del deslizador) dentro de los días del cubo"""
+        if not rango:
+            return 0, self.ultimo
+        inicio, fin = sorted(min(max(int(posicion), 0), self.ultimo) for posicion in rango)
+        return inicio, fin
+
+    def completo(self, inicio, fin):
+        return inicio == 0 and fin == self.ultimo
+
+    def acumulados(self, posicion, filas=slice(None)):
+        """int64 (métrica, fila) con los acumulados al final del día; 0 antes del primer día"""
+        if posicion < 0:
+            return np.zeros(self.valores[:, filas, 0].shape, dtype=np.int64)
+        return self.valores[:, filas, posicion].astype(np.int64)
+
+    def totales(self, inicio, fin, filas=slice(None)):
+        """int64 (métrica, fila) con los casos de los días [inicio, fin]"""
+        return self.acumulados(fin, filas) - self.acumulados(inicio - 1, filas)
+
+    def variacion(self, inicio, fin, filas=slice(None)):
+        """
+        int64 (métrica, fila) con los casos del rango menos los de los días inmediatamente
+        anteriores de la misma longitud (recortados al primer día)
+        """
+        anterior = max(inicio - (fin - inicio + 1), 0)
+        previos = self.totales(anterior, inicio - 1, filas) if inicio > 0 else 0
+        return self.totales(inicio, fin, filas) - previos
+
+    def kpis(self, fila, inicio, fin):
+        """Totales, media diaria, letalidad y variación de los confirmados de una fila en el rango"""
+        confirmados, fallecidos, recuperados = self.totales(inicio, fin, fila).tolist()
+        dias = fin - inicio + 1
+        return {'inicio': str(self.dias[inicio]), 'fin': str(self.dias[fin]), 'dias': dias,
+                'confirmados': confirmados, 'fallecidos': fallecidos, 'recuperados': recuperados,
+                'media_confirmados': confirmados / float(dias),
+                'letalidad': 100.0 * fallecidos / confirmados if confirmados > 0 else None,
+                'variacion_confirmados': int(self.variacion(inicio, fin, fila)[0])}
+
+    def marcas(self, maximo=MAXIMO_MARCAS):
+        """{posición: 'mes año'} del primer día de cada mes (o de cada varios meses) para el deslizador"""
+        meses = self.dias.astype('datetime64[M]')
+        posiciones = np.flatnonzero(np.r_[True, meses[1:] != meses[:-1]]) if len(meses) else np.array([], dtype=int)
+        paso = -(-len(posiciones) // maximo) if len(posiciones) else 1
+        marcas = {}
+        for posicion in posiciones[::paso].tolist():
+            mes = int(meses[posicion].astype(int)) # meses desde 1970-01
+            marcas[posicion] = '{0} {1}'.format(MESES[mes % 12], 1970 + mes // 12)
+        return marcas
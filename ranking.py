@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ranking de los N países con más casos de cada día y cada métrica.
+
+Se calcula una vez por refresco con una única ordenación parcial (np.argpartition) de la
+matriz país x día de cada métrica y se guarda como dos arrays compactos (métrica, día,
+puesto): el código del país y su valor. La carrera de barras animada se construye a
+partir de ese índice: cada fotograma es una fila de los arrays, sin agrupar los datos
+otra vez.
+"""
+import numpy as np
+
+from cubo import METRICAS
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+PUESTOS_RANKING = 10
+MAXIMO_FOTOGRAMAS = 80 # Fotogramas de la carrera de barras; con más días se toma uno de cada varios
+DURACION_FOTOGRAMA = 200 # Milisegundos por fotograma al reproducir la carrera
+COLORES = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f',
+           '#bcbd22', '#17becf']
+TITULOS_METRICAS = {'confirmados': 'Casos confirmados', 'fallecidos': 'Fallecidos', 'recuperados': 'Recuperados'}
+
+
+# *********************************************************************************************************
+# --------------------------- RANKING DE PAÍSES -----------------------------------------------------------
+# *********************************************************************************************************
+def top_por_dia(matriz, puestos):
+    """
+    Índices y valores (métrica, día, puesto) de las `puestos` filas mayores de cada día
+    de una matriz (métrica, fila, día), de mayor a menor
+    """
+    puestos = min(puestos, matriz.shape[1])
+    if puestos == 0:
+        vacio = matriz.shape[:1] + matriz.shape[2:] + (0,)
+        return np.zeros(vacio, dtype=np.intp), np.zeros(vacio, dtype=matriz.dtype)
+    dias = np.moveaxis(matriz, 1, 2)
+    # Ordenación parcial: las `puestos` mayores de cada día, sin ordenar entre sí
+    candidatos = np.argpartition(dias, dias.shape[2] - puestos, axis=2)[:, :, -puestos:]
+    valores = np.take_along_axis(dias, candidatos, axis=2)
+    orden = np.argsort(-valores.astype(np.int64), axis=2, kind='stable')
+    return np.take_along_axis(candidatos, orden, axis=2), np.take_along_axis(valores, orden, axis=2)
+
+
+class RankingPaises(object):
+    """
+    Atributos:
+      - codigos: uint16 (métrica, día, puesto) con el código de país de cada puesto
+      - valores: (métrica, día, puesto) con su valor (el tipo de los valores del cubo)
+      - paises, fechas: nombres de país por código y fechas del cubo
+    """
+    def __init__(self, codigos, valores, paises, fechas):
+        self.codigos = codigos
+        self.valores = valores
+        self.paises = paises
+        self.fechas = fechas
+
+    @classmethod
+    def calcula(cls, cubo, puestos=PUESTOS_RANKING):
+        codigos, valores = top_por_dia(cubo.por_pais, puestos)
+        tipo = np.uint16 if len(cubo.paises) <= np.iinfo(np.uint16).max + 1 else np.int32
+        return cls(codigos.astype(tipo), valores, cubo.paises.tolist(), list(cubo.fechas))
+
+    @property
+    def nbytes(self):
+        return self.codigos.nbytes + self.valores.nbytes
+
+    def top(self, metrica, dia=-1):
+        """[(país, valor)] de un día en orden, sin los países con 0 casos"""
+        posicion = METRICAS.index(metrica)
+        return [(self.paises[codigo], valor) for codigo, valor
+                in zip(self.codigos[posicion, dia].tolist(), self.valores[posicion, dia].tolist()) if valor > 0]
+
+    def dias_fotogramas(self, maximo=MAXIMO_FOTOGRAMAS):
+        """Días de la carrera: como mucho `maximo`, repartidos por igual y siempre con el último"""
+        paso = max(-(-len(self.fechas) // maximo), 1)
+        return list(range(len(self.fechas) - 1, -1, -paso))[::-1]
+
+    def _traza(self, metrica, dia):
+        top = self.top(metrica, dia)
+        posicion = METRICAS.index(metrica)
+        return {'type': 'bar', 'orientation': 'h', 'x': [valor for _, valor in top],
+                'y': [pais for pais, _ in top], 'text': [valor for _, valor in top], 'textposition': 'auto',
+                'marker': {'color': [COLORES[codigo % len(COLORES)]
+                                     for codigo in self.codigos[posicion, dia, :len(top)].tolist()]}}
+
+    def figura_carrera(self, metrica='confirmados', plantilla=None, maximo=MAXIMO_FOTOGRAMAS):
+        """
+        Carrera de barras animada (diccionario de figura de plotly) de una métrica: un
+        fotograma por día elegido, con el eje x de cada fotograma ajustado a su máximo.
+        Se muestra el último día y al reproducir se recorren todos desde el primero
+        """
+        dias = self.dias_fotogramas(maximo)
+        posicion = METRICAS.index(metrica)
+        fotogramas = [{'name': self.fechas[dia], 'data': [self._traza(metrica, dia)],
+                       'layout': {'xaxis': {'range': [0, 1.1 * max(int(self.valores[posicion, dia].max(initial=0)), 1)]}}}
+                      for dia in dias]
+        reproduce = {'frame': {'duration': DURACION_FOTOGRAMA, 'redraw': True}, 'mode': 'immediate',
+                     'transition': {'duration': 0}}
+        para = {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate', 'transition': {'duration': 0}}
+        pasos = [{'label': self.fechas[dia], 'method': 'animate',
+                  'args': [[self.fechas[dia]], dict(para, frame={'duration': 0, 'redraw': True})]} for dia in dias]
+        ultimo = fotogramas[-1] if fotogramas else {'data': [], 'layout': {}}
+        return {'data': ultimo['data'], 'frames': fotogramas,
+                'layout': {'height': 600, 'margin': {'t': 10, 'l': 150}, 'template': plantilla,
+                           'xaxis': dict(ultimo['layout'].get('xaxis', {}), title={'text': TITULOS_METRICAS[metrica]}),
+                           'yaxis': {'autorange': 'reversed'},
+                           'updatemenus': [{'type': 'buttons', 'showactive': False, 'x': 0, 'y': -0.15,
+                                            'xanchor': 'left', 'direction': 'left',
+                                            'buttons': [{'label': 'Reproducir', 'method': 'animate',
+                                                         'args': [[fotograma['name'] for fotograma in fotogramas],
+                                                                  reproduce]},
+                                                        {'label': 'Pausa', 'method': 'animate',
+                                                         'args': [[None], para]}]}],
+                           'sliders': [{'active': len(pasos) - 1, 'steps': pasos, 'x': 0.15, 'len': 0.85,
+                                        'y': -0.05, 'currentvalue': {'prefix': 'Día: '}}]}}
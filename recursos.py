@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Paquetes propios de CSS y JS del dashboard, sin CDNs de terceros.
+
+Las hojas de estilo externas se descargan una vez a assets/vendor (vendoriza) y se
+versionan con el repositorio. Al arrancar, esas hojas y los CSS y JS propios de assets/
+se minifican (rcssmin y rjsmin, si están instalados), se concatenan en un paquete por
+tipo y se publican con huella en el nombre (PublicadorEstaticos: caché inmutable y
+variantes .gz/.br). Dash no los incluye por su cuenta (IGNORA_ASSETS); la página sólo
+pide los dos paquetes. Mientras falte algún fichero vendorizado la app sigue pidiendo
+la hoja de estilo a su CDN (vendorizados).
+
+    $ python recursos.py vendoriza
+    $ python recursos.py paquetes --salida /tmp/paquetes
+"""
+import argparse
+import os
+import re
+import urllib.request
+
+try:
+    import rcssmin
+except ImportError: # Dependencia opcional: sin ella los CSS se concatenan tal cual
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError: # Dependencia opcional: sin ella los JS se concatenan tal cual
+    rjsmin = None
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+DIR_RAIZ = os.path.dirname(os.path.abspath(__file__))
+DIR_ASSETS = os.path.join(DIR_RAIZ, 'assets')
+DIR_VENDOR = os.path.join(DIR_ASSETS, 'vendor')
+# Ficheros de terceros: nombre en assets/vendor -> URL de origen
+RECURSOS_EXTERNOS = {'estilo_dashboard.css': 'https://codepen.io/chriddyp/pen/bWLwgP.css'}
+NOMBRES_PAQUETES = {'css': 'dashboard.css', 'js': 'dashboard.js'}
+# Expresiones para assets_ignore de Dash: con los paquetes, los CSS y JS de assets/ sólo
+# llegan en ellos; sin los paquetes, los ficheros vendorizados no se sirven además de su URL
+IGNORA_ASSETS = r'\.(css|js)$'
+IGNORA_VENDOR = '^({0})$'.format('|'.join(re.escape(nombre) for nombre in sorted(RECURSOS_EXTERNOS)))
+TIMEOUT_DESCARGA = 30
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+class ErrorRecursos(Exception):
+    """Falta un fichero de terceros en assets/vendor"""
+
+
+def ficheros_assets(extension, directorio=DIR_ASSETS):
+    """Ficheros propios de assets/ (sin vendor/) con la extensión dada, en orden alfabético como Dash"""
+    if not os.path.isdir(directorio):
+        return []
+    return [os.path.join(directorio, nombre) for nombre in sorted(os.listdir(directorio))
+            if nombre.endswith('.' + extension) and os.path.isfile(os.path.join(directorio, nombre))]
+
+def vendorizados(dir_vendor=DIR_VENDOR):
+    """True si están en assets/vendor todos los ficheros de terceros"""
+    return all(os.path.isfile(os.path.join(dir_vendor, nombre)) for nombre in RECURSOS_EXTERNOS)
+
+def lee(ruta):
+    with open(ruta, encoding='utf-8') as fichero:
+        return fichero.read()
+
+def minifica(tipo, contenido):
+    """Quita comentarios y espacios de un CSS o JS (sin cambios si falta su minificador)"""
+    if tipo == 'css' and rcssmin is not None:
+        return rcssmin.cssmin(contenido)
+    if tipo == 'js' and rjsmin is not None:
+        return rjsmin.jsmin(contenido)
+    return contenido
+
+def genera_paquetes(directorio=DIR_ASSETS, dir_vendor=DIR_VENDOR):
+    """
+    Contenido de los paquetes: {'css': bytes, 'js': bytes}. Primero los ficheros de
+    terceros y después los propios, cada uno minificado; los JS se separan con ';' por
+    si alguno no lo lleva al final
+    """
+    partes = {'css': [], 'js': []}
+    for nombre, url in sorted(RECURSOS_EXTERNOS.items()):
+        ruta = os.path.join(dir_vendor, nombre)
+        if not os.path.isfile(ruta):
+            raise ErrorRecursos('Falta {0} (de {1}): ejecute "python recursos.py vendoriza" o arranque con '
+                                'COVID_RECURSOS_EXTERNOS=1'.format(ruta, url))
+        partes[nombre.rsplit('.', 1)[-1]].append(lee(ruta))
+    partes['css'] += [lee(ruta) for ruta in ficheros_assets('css', directorio)]
+    partes['js'] += [lee(ruta) for ruta in ficheros_assets('js', directorio)]
+    paquetes = {'css': '\n'.join(minifica('css', parte) for parte in partes['css']),
+                'js': ';\n'.join(minifica('js', parte) for parte in partes['js'])}
+    return {tipo: contenido.encode('utf-8') for tipo, contenido in paquetes.items() if contenido}
+
+def publica_paquetes(publicador, directorio=DIR_ASSETS, dir_vendor=DIR_VENDOR):
+    """
+    Publica los paquetes con huella y devuelve las hojas de estilo y los scripts de la
+    página: {'css': [url], 'js': [url]}
+    """
+    urls = {'css': [], 'js': []}
+    for tipo, contenido in sorted(genera_paquetes(directorio, dir_vendor).items()):
+        urls[tipo].append(publicador.publica_contenido(NOMBRES_PAQUETES[tipo], contenido))
+    return urls
+
+def vendoriza(destino=DIR_VENDOR, timeout=TIMEOUT_DESCARGA):
+    """Descarga los ficheros de terceros a assets/vendor"""
+    os.makedirs(destino, exist_ok=True)
+    for nombre, url in RECURSOS_EXTERNOS.items():
+        with urllib.request.urlopen(url, timeout=timeout) as respuesta:
+            contenido = respuesta.read()
+        with open(os.path.join(destino, nombre), 'wb') as fichero:
+            fichero.write(contenido)
+        print('{0}: {1} bytes desde {2}'.format(nombre, len(contenido), url))
+
+
+# *********************************************************************************************************
+# ---------------------- MAIN -----------------------------------------------------------------------------
+# *********************************************************************************************************
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='orden')
+    subparsers.add_parser('vendoriza', help='Descarga los ficheros de terceros a assets/vendor')
+    paquetes = subparsers.add_parser('paquetes', help='Genera los paquetes con huella en un directorio')
+    paquetes.add_argument('--salida', default='estaticos')
+    args = parser.parse_args()
+
+    if args.orden == 'vendoriza':
+        vendoriza()
+    elif args.orden == 'paquetes':
+        from estaticos import PublicadorEstaticos
+        urls = publica_paquetes(PublicadorEstaticos(args.salida))
+        for tipo, lista in sorted(urls.items()):
+            for url in lista:
+                print('{0}: {1}'.format(tipo, url))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
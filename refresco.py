@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Refresco periódico del estado precalculado del dashboard.
+
+El estado se reconstruye completo en un hilo en segundo plano y se publica cambiando
+una única referencia, de modo que una petición que lee el estado al empezar trabaja
+siempre con un estado completo (el anterior o el nuevo, nunca uno a medio construir).
+"""
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+REINTENTO_INICIAL = 10 # Segundos entre intentos de la función inicial mientras falle
+
+
+class RefrescoPeriodico(object):
+    """
+    Mantiene el estado publicado y lo reconstruye cada `intervalo` segundos llamando a
+    construye(anterior). Si construye devuelve el mismo objeto no hay cambio que publicar.
+    """
+    def __init__(self, construye, intervalo, al_refrescar=None):
+        self._construye = construye
+        self.intervalo = intervalo
+        # al_refrescar(segundos, publicado) tras cada refresco correcto (p. ej. para métricas)
+        self._al_refrescar = al_refrescar
+        self._estado = None
+        self._cerrojo = threading.Lock()
+        self._parada = threading.Event()
+        self._hilo = None
+        self._suscriptores = []
+        self.ultimo_refresco = None
+        self.duracion_refresco = None
+        self.ultimo_error = None
+        self.errores = 0
+        self.primera_publicacion = None
+        # Fin de los suscriptores del primer estado (p. ej. cachés de pestañas calientes)
+        self.primer_calentamiento = None
+
+    @property
+    def estado(self):
+        return self._estado
+
+    def suscribe(self, funcion):
+        """Registra funcion(estado) para ejecutarla cada vez que se publica un estado nuevo"""
+        self._suscriptores.append(funcion)
+        return funcion
+
+    def refresca(self, **kwargs):
+        """
+        Reconstruye el estado y lo publica. Las reconstrucciones concurrentes se serializan.
+        Los suscriptores se ejecutan antes de publicar, salvo con el primer estado: sin
+        estado anterior es mejor servir cuanto antes uno con las cachés aún frías.
+        """
+        with self._cerrojo:
+            inicio = time.time()
+            anterior = self._estado
+            nuevo = self._construye(anterior, **kwargs)
+            if anterior is None:
+                self._estado = nuevo
+                self.primera_publicacion = time.time()
+            if nuevo is not anterior:
+                for funcion in self._suscriptores:
+                    funcion(nuevo)
+                self._estado = nuevo
+                if self.primer_calentamiento is None:
+                    self.primer_calentamiento = time.time()
+            self.ultimo_refresco = time.time()
+            self.duracion_refresco = self.ultimo_refresco - inicio
+            self.ultimo_error = None
+            if self._al_refrescar is not None:
+                self._al_refrescar(self.duracion_refresco, nuevo is not anterior)
+            return nuevo
+
+    def _intenta(self, funcion):
+        try:
+            funcion()
+            return True
+        except Exception as error:
+            # Se sigue sirviendo el último estado bueno hasta el siguiente intento
+            self.ultimo_error = error
+            self.errores += 1
+            logger.exception('Error refrescando los datos del dashboard')
+            return False
+
+    def _bucle(self, inicial=None):
+        if inicial is not None:
+            while not self._intenta(inicial) and not self._parada.wait(REINTENTO_INICIAL):
+                pass
+        if self.intervalo <= 0:
+            return
+        while not self._parada.wait(self.intervalo):
+            self._intenta(self.refresca)
+
+    def inicia(self, inicial=None):
+        """
+        Arranca el hilo de refresco (si el intervalo es positivo y no estaba arrancado).
+        `inicial` se ejecuta en el hilo nada más arrancar, reintentándose mientras falle
+        (p. ej. el primer refresco en el arranque rápido).
+        """
+        if (self.intervalo <= 0 and inicial is None) or (self._hilo is not None and self._hilo.is_alive()):
+            return
+        self._parada.clear()
+        self._hilo = threading.Thread(target=self._bucle, args=(inicial,), name='refresco-datos')
+        self._hilo.daemon = True
+        self._hilo.start()
+
+    def detiene(self):
+        self._parada.set()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Submuestreo de series temporales para las gráficas de tendencia.
+
+Cada traza se envía con un número acotado de puntos elegidos con LTTB
+(Largest-Triangle-Three-Buckets), que conserva la forma visual de la serie. Al hacer
+zoom se envía además la resolución completa de la ventana visible.
+"""
+import numpy as np
+import pandas as pd
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE CONSTANTES ----------------------------------------------------
+# *********************************************************************************************************
+PUNTOS_TRAZA = 200 # Puntos por traza en la vista general y dentro de la ventana visible
+
+
+# *********************************************************************************************************
+# --------------------------- DEFINICIÓN DE FUNCIONES -----------------------------------------------------
+# *********************************************************************************************************
+def indices_lttb(x, y, umbral=PUNTOS_TRAZA):
+    """
+    Índices de los `umbral` puntos de (x, y) elegidos con LTTB. Siempre incluye el
+    primero y el último; si la serie ya tiene `umbral` puntos o menos se devuelven todos.
+    """
+    n = len(y)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Cubetas para los puntos intermedios: [limites[i], limites[i + 1])
+    limites = np.floor(np.linspace(1, n - 1, umbral - 1)).astype(np.intp)
+    # Media de cada cubeta (la siguiente a la que se elige) con sumas acumuladas
+    suma_x = np.concatenate([[0.0], np.cumsum(x)])
+    suma_y = np.concatenate([[0.0], np.cumsum(y)])
+    tamanios = np.diff(limites)
+    medias_x = (suma_x[limites[1:]] - suma_x[limites[:-1]]) / tamanios
+    medias_y = (suma_y[limites[1:]] - suma_y[limites[:-1]]) / tamanios
+    medias_x = np.append(medias_x[1:], x[-1])
+    medias_y = np.append(medias_y[1:], y[-1])
+
+    elegidos = np.empty(umbral, dtype=np.intp)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    anterior = 0
+    for cubeta in range(umbral - 2):
+        inicio, fin = limites[cubeta], limites[cubeta + 1]
+        ax, ay = x[anterior], y[anterior]
+        # Doble del área del triángulo (anterior, candidato, media de la cubeta siguiente)
+        areas = np.abs((ax - medias_x[cubeta]) * (y[inicio:fin] - ay) -
+                       (ax - x[inicio:fin]) * (medias_y[cubeta] - ay))
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[cubeta + 1] = anterior
+    return elegidos
+
+def indices_traza(x, y, ventana=None, umbral=PUNTOS_TRAZA):
+    """
+    Índices a enviar de una traza: LTTB de la serie completa y, si se indica una
+    ventana (posiciones [inicio, fin) de la serie), también los puntos de la ventana a
+    resolución completa (o submuestreados a `umbral` si son más)
+    """
+    indices = indices_lttb(x, y, umbral)
+    if ventana is not None:
+        inicio, fin = ventana
+        detalle = inicio + indices_lttb(x[inicio:fin], y[inicio:fin], umbral)
+        indices = np.union1d(indices, detalle)
+    return indices
+
+def ventana_relayout_fechas(relayout, dias):
+    """
+    Traduce relayoutData de una gráfica con fechas en el eje x a una ventana de
+    posiciones [inicio, fin) sobre `dias` (datetime64[D] ordenados). Devuelve None si
+    el evento no cambia el eje x y 'completa' si se vuelve a la vista general.
+    """
+    if not relayout:
+        return None
+    if relayout.get('xaxis.autorange'):
+        return 'completa'
+    rango = relayout.get('xaxis.range')
+    if rango is None and 'xaxis.range[0]' in relayout:
+        rango = [relayout['xaxis.range[0]'], relayout.get('xaxis.range[1]')]
+    if not rango or rango[1] is None:
+        return None
+    desde, hasta = [pd.Timestamp(extremo).to_datetime64().astype('datetime64[D]') for extremo in rango]
+    # Un día de margen a cada lado para que las líneas lleguen al borde de la ventana
+    inicio = max(int(np.searchsorted(dias, desde, side='left')) - 1, 0)
+    fin = min(int(np.searchsorted(dias, hasta, side='right')) + 1, len(dias))
+    if inicio == 0 and fin == len(dias):
+        return 'completa'
+    return inicio, fin
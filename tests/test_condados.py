@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Ingesta por bloques de los CSV por condado frente a la lectura completa con
+pd.read_csv y CuboSeries.desde_series (como las series globales).
+
+    $ python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condados import BYTES_CELDA, lee_condados
+from cubo import CuboSeries
+
+
+METADATOS = 'UID,iso2,iso3,code3,FIPS,Admin2,Province_State,Country_Region,Lat,Long_,Combined_Key'
+FECHAS = '1/22/20,1/23/20,1/24/20'
+# Combined_Key entre comillas con comas, una celda vacía, otra no entera, un condado
+# repetido (Autauga) y una fila sin condado ni FIPS
+FILAS = [
+    ('84001001,US,USA,840,1001.0,Autauga,Alabama,US,32.53,-86.64,"Autauga, Alabama, US"', '1,2,3', '0,1,1', 55869),
+    ('84001003,US,USA,840,1003.0,Baldwin,Alabama,US,30.72,-87.72,"Baldwin, Alabama, US"', '4,,6', '0,0,1', 223234),
+    ('84004001,US,USA,840,4001.0,Apache,Arizona,US,35.39,-109.48,"Apache, Arizona, US"', '0,1.5,7', '0,0,0', 71887),
+    ('84001001,US,USA,840,1001.0,Autauga,Alabama,US,32.53,-86.64,"Autauga, Alabama, US"', '10,20,30', '1,1,2', 55869),
+    ('84080006,US,USA,840,,,Wyoming,US,0.0,0.0,"Wyoming, US"', '2,2,2', '0,0,0', 0),
+    ('84006037,US,USA,840,6037.0,Los Angeles,California,US,34.31,-118.23,"Los Angeles, California, US"',
+     '5,8,13', '0,1,1', 10039107),
+]
+
+
+class TestCondados(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp(prefix='condados-')
+        self.rutas = {'confirmados': os.path.join(self.directorio, 'confirmados.csv'),
+                      'fallecidos': os.path.join(self.directorio, 'fallecidos.csv')}
+        with open(self.rutas['confirmados'], 'w') as fichero:
+            fichero.write('{0},{1}\n'.format(METADATOS, FECHAS))
+            fichero.writelines('{0},{1}\n'.format(cabeza, casos) for cabeza, casos, _, _ in FILAS)
+        with open(self.rutas['fallecidos'], 'w') as fichero:
+            fichero.write('{0},Population,{1}\n'.format(METADATOS, FECHAS))
+            fichero.writelines('{0},{1},{2}\n'.format(cabeza, poblacion, muertes)
+                               for cabeza, _, muertes, poblacion in FILAS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+    def completa(self):
+        series = {}
+        for metrica, ruta in self.rutas.items():
+            df = pd.read_csv(ruta).rename(columns={'Admin2': 'Province/State', 'Province_State': 'Country/Region',
+                                                   'Long_': 'Long'})
+            series[metrica] = df.drop(columns=[columna for columna in ['UID', 'iso2', 'iso3', 'code3', 'FIPS',
+                                               'Country_Region', 'Combined_Key', 'Population'] if columna in df])
+        series['recuperados'] = series['fallecidos'].iloc[:0]
+        return CuboSeries.desde_series(series)
+
+    def test_bloques_frente_a_pandas(self):
+        ingesta = lee_condados(self.rutas, memoria_bloque=BYTES_CELDA * 3 * 2)
+        referencia = self.completa()
+        cubo = ingesta.cubo
+
+        self.assertEqual(ingesta.filas_bloque, 2)
+        self.assertEqual(ingesta.bloques, 6)
+        self.assertEqual(list(cubo.fechas), FECHAS.split(','))
+        self.assertEqual(list(cubo.estados), list(referencia.estados))
+        self.assertEqual(list(cubo.paises), list(referencia.paises))
+        self.assertEqual(cubo.fila_total, referencia.fila_total)
+        np.testing.assert_array_equal(cubo.fila_pais, referencia.fila_pais)
+        np.testing.assert_array_equal(cubo.valores, referencia.valores[:2])
+
+        autauga = list(cubo.estados).index('Autauga')
+        np.testing.assert_array_equal(cubo.valores[:, autauga], [[11, 22, 33], [1, 2, 3]])
+        self.assertEqual(list(ingesta.fips), ['01001', '01003', '04001', '06037', ''])
+        poblacion = pd.read_csv(self.rutas['fallecidos']).groupby(['Province_State', 'Admin2'])['Population'].last()
+        self.assertEqual(list(ingesta.poblacion[:-1]), poblacion.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Ingesta de los feeds contra un servidor HTTP local que hace de JHU: descarga (200),
+revalidación con ETag (304) y, si el servidor falla, reintentos y copia obsoleta.
+
+    $ python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingesta import ErrorIngesta, descarga_feed, ingesta_concurrente
+
+
+CSV = b'Province/State,Country/Region,Lat,Long,1/22/20,1/23/20\n,Spain,40.0,-4.0,0,1\n'
+ETAG = '"v1"'
+
+
+class ServidorJHU(BaseHTTPRequestHandler):
+    """Responde el CSV con ETag, 304 si el ETag coincide y `fallo` si está definido"""
+    fallo = None
+    peticiones = []
+
+    def do_GET(self):
+        ServidorJHU.peticiones.append(self.headers.get('If-None-Match'))
+        if ServidorJHU.fallo is not None:
+            self.send_response(ServidorJHU.fallo)
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Length', str(len(CSV)))
+            self.end_headers()
+            self.wfile.write(CSV)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestIngesta(unittest.TestCase):
+    def setUp(self):
+        ServidorJHU.fallo = None
+        ServidorJHU.peticiones = []
+        self.servidor = HTTPServer(('127.0.0.1', 0), ServidorJHU)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/confirmados.csv'.format(self.servidor.server_port)
+        self.directorio = tempfile.mkdtemp(prefix='ingesta-')
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+    def descarga(self):
+        return descarga_feed('confirmados', self.url, self.directorio, timeout=5, reintentos=2, espera=0.01)
+
+    def test_descarga_revalidacion_y_copia_obsoleta(self):
+        resultado = self.descarga()
+        self.assertEqual(resultado.estado, 'descargado')
+        with open(resultado.ruta, 'rb') as fichero:
+            self.assertEqual(fichero.read(), CSV)
+
+        resultado = self.descarga()
+        self.assertEqual(resultado.estado, 'sin_cambios')
+        self.assertEqual(ServidorJHU.peticiones, [None, ETAG])
+
+        ServidorJHU.fallo = 503
+        resultado = self.descarga()
+        self.assertTrue(resultado.obsoleto)
+        self.assertEqual(resultado.intentos, 3)
+        self.assertEqual(len(ServidorJHU.peticiones), 5)
+        with open(resultado.ruta, 'rb') as fichero:
+            self.assertEqual(fichero.read(), CSV)
+
+    def test_error_no_reintentable(self):
+        self.descarga()
+        ServidorJHU.fallo = 404
+        resultado = self.descarga()
+        self.assertEqual((resultado.estado, resultado.intentos), ('obsoleto', 1))
+
+    def test_sin_copia_local(self):
+        ServidorJHU.fallo = 503
+        with self.assertRaises(ErrorIngesta):
+            self.descarga()
+        with self.assertRaises(ErrorIngesta):
+            ingesta_concurrente({'confirmados': self.url}, self.directorio, timeout=5, reintentos=0, espera=0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()